@@ -5,6 +5,7 @@ import os
 from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 import logging
+from config import Config
 
 # Load environment variables
 load_dotenv()
@@ -13,20 +14,26 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Frontends allowed to call the API (shared with the ASGI app in asgi.py)
+CORS_ORIGINS = ["http://localhost:8081", "http://localhost:5173"]
+
+def health_payload():
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "message": "Ready for database integration"
+    }
+
 def create_app():
     app = Flask(__name__)
     
     # Initialize CORS
-    CORS(app, origins=["http://localhost:8081", "http://localhost:5173"])
+    CORS(app, origins=CORS_ORIGINS)
     
     # Health check endpoint
     @app.route('/health')
     def health_check():
-        return jsonify({
-            "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "message": "Ready for database integration"
-        })
+        return jsonify(health_payload())
     
     # Get posts endpoint (placeholder until database is integrated)
     @app.route('/api/posts')
@@ -36,18 +43,79 @@ def create_app():
             "timestamp": datetime.utcnow().isoformat()
         })
     
-    # Get stats endpoint (placeholder until database is integrated)
+    # Get stats endpoint (same counters as /stats)
     @app.route('/api/stats')
     def get_stats():
-        return jsonify({
-            "message": "Endpoint ready for database integration",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        from routes.posts import get_stats as get_post_stats
+        return get_post_stats()
     
     # Register posts blueprint
-    from routes.posts import posts_bp
+    from routes.posts import posts_bp, engine
     app.register_blueprint(posts_bp)
     
+    # Register live stream blueprint
+    from routes.stream import stream_bp
+    app.register_blueprint(stream_bp)
+    
+    # Register dashboard snapshot blueprint
+    from routes.dashboard import dashboard_bp, dashboard_snapshot
+    app.register_blueprint(dashboard_bp)
+    
+    # Register bulk export blueprint
+    from routes.export import export_bp
+    app.register_blueprint(export_bp)
+    
+    # Register decayed sentiment index blueprint
+    from routes.sentiment_index import index_bp, sentiment_index
+    app.register_blueprint(index_bp)
+    
+    # Register anomaly signals blueprint
+    from routes.signals import signals_bp, anomaly_detector
+    app.register_blueprint(signals_bp)
+    
+    # Register alert rules blueprint
+    from routes.alerts import alerts_bp, alert_engine, webhook_dispatcher
+    app.register_blueprint(alerts_bp)
+    
+    # Register trending blueprint
+    from routes.trending import trending_bp, trending_tracker
+    app.register_blueprint(trending_bp)
+    
+    # Create missing tables and search indexes
+    from models.models import init_db
+    try:
+        init_db(engine)
+    except Exception as e:
+        logger.error(f"Error initializing database schema: {e}")
+    
+    # Pick up posts written by a collector running in another process
+    if Config.INGEST_TAIL_INTERVAL_SECONDS > 0:
+        from routes.posts import Session
+        from tasks.ingest_tailer import IngestTailer
+        app.extensions['ingest_tailer'] = IngestTailer(Session, interval_seconds=Config.INGEST_TAIL_INTERVAL_SECONDS)
+        app.extensions['ingest_tailer'].start()
+    
+    # Load recent posts, rolling windows, the decayed index and anomaly baselines;
+    # started after the tailer so they overlap
+    from routes.posts import Session, hot_store, window_aggregator
+    if hot_store is not None:
+        hot_store.start(Session)
+    if window_aggregator is not None:
+        window_aggregator.start(Session)
+    sentiment_index.start(Session, checkpoint_seconds=Config.SENTIMENT_INDEX_CHECKPOINT_SECONDS,
+                          catch_up_seconds=Config.SENTIMENT_INDEX_CATCH_UP_SECONDS)
+    anomaly_detector.start(Session)
+    
+    # Deliver alert webhooks and keep the rules in sync with other processes
+    webhook_dispatcher.start()
+    alert_engine.start(Session, refresh_seconds=Config.ALERT_RULES_REFRESH_SECONDS)
+    
+    # Re-merge the ingest workers' trending sketches in the background
+    trending_tracker.start(Session, refresh_seconds=Config.TRENDING_REFRESH_SECONDS)
+    
+    # Rebuild the dashboard snapshot in the background
+    dashboard_snapshot.start()
+    
     return app
 
 if __name__ == '__main__':
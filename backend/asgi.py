@@ -0,0 +1,238 @@
+"""
+ASGI serving mode: uvicorn asgi:app
+
+The hot read endpoints are served natively on the event loop, with queries
+running through an async driver and pool (asyncpg for PostgreSQL, aiosqlite
+for SQLite), so slow clients and long-lived SSE connections cost a coroutine
+each instead of a worker thread. URLs and JSON bodies match the Flask app,
+because both call the same session-level handlers in routes.posts.
+
+Everything else (other endpoints, POST bodies, projected or binary formats)
+falls through to the Flask app mounted underneath, which also owns schema
+setup, the ingest tailer and the dashboard snapshot thread.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import CORS_ORIGINS, create_app, health_payload
+from routes import posts as post_routes
+from routes.stream import broadcaster
+from services.admission import AsyncAdmissionController, BudgetExceeded, Overloaded
+from services.live_stream import AsyncSubscription, format_sse
+from services.response_format import orjson
+from services.stats_service import get_ingest_stats
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_database_url(url: str) -> str:
+    """The same database addressed through its async driver"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _create_engine():
+    url = Config.ASYNC_DATABASE_URL or async_database_url(Config.SQLALCHEMY_DATABASE_URI)
+    options = {"pool_pre_ping": True}
+    if make_url(url).get_backend_name() == 'postgresql':
+        options.update(pool_size=Config.ASYNC_DB_POOL_SIZE, max_overflow=Config.ASYNC_DB_MAX_OVERFLOW)
+    return create_async_engine(url, **options)
+
+engine = _create_engine()
+AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+
+# Same endpoint classes and limits as the Flask views; statement timeouts
+# come from the hooks routes.posts installs on every Session
+admission = AsyncAdmissionController(
+    Config.ADMISSION_CLASSES,
+    queue_size=Config.ADMISSION_QUEUE_SIZE,
+    max_wait_seconds=Config.ADMISSION_MAX_WAIT_SECONDS
+)
+
+def _json(payload: Any, status_code: int = 200) -> Response:
+    body = orjson.dumps(payload) if orjson is not None else json.dumps(payload, separators=(',', ':'))
+    return Response(body, status_code=status_code, media_type='application/json')
+
+async def run_handler(handler: Callable, *args) -> Any:
+    """
+    Run a session-level handler from routes.posts on an async session
+
+    run_sync hands the handler an ordinary Session whose I/O goes through
+    the async driver, so the handlers and query builders are shared with
+    the Flask views unchanged.
+    """
+    async with AsyncSession() as session:
+        return await session.run_sync(handler, *args)
+
+# Handlers currently running, by path and normalized query
+_in_flight: Dict[Tuple, "asyncio.Task"] = {}
+
+async def coalesced(key: Tuple, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await the in-flight computation for key, starting it if there is none
+
+    Identical concurrent requests share one query. The task is shielded so
+    a client disconnecting doesn't cancel it for everyone else.
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+def _endpoint(description: str, handler: Callable[[Any, Request], Any], endpoint_class: Any = 'standard'):
+    """
+    Wrap a (session, request) handler with coalescing, admission and the Flask views' error responses
+
+    endpoint_class is an admission class name or a callable picking one from
+    the query parameters, as with AdmissionController.limit.
+    """
+    async def admitted(request: Request) -> Any:
+        name = endpoint_class(request.query_params) if callable(endpoint_class) else endpoint_class
+        async with admission.slot(name):
+            return await run_handler(handler, request)
+
+    async def endpoint(request: Request) -> Response:
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        try:
+            return _json(await coalesced(key, lambda: admitted(request)))
+        except Overloaded as e:
+            logger.warning(f"Shedding request: {e}")
+            response = _json({"error": "Server busy, retry later"}, 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except BudgetExceeded as e:
+            logger.warning(f"Request exceeded its statement budget: {e}")
+            return _json({"error": "Request took too long"}, 504)
+        except post_routes.ResourceNotFound as e:
+            return _json({"error": str(e)}, 404)
+        except ValueError as e:
+            logger.error(f"Invalid parameter in {description} request: {e}")
+            return _json({"error": "Invalid parameter provided"}, 400)
+        except Exception as e:
+            logger.error(f"Error in {description} endpoint: {e}")
+            return _json({"error": "Internal server error"}, 500)
+    return endpoint
+
+def _stats(session, request):
+    stats = get_ingest_stats(session)
+    stats["timestamp"] = datetime.utcnow().isoformat()
+    return stats
+
+async def health(request: Request) -> Response:
+    return _json(health_payload())
+
+async def stream_posts(request: Request) -> Response:
+    """Native /stream/posts; same events as routes.stream, one coroutine per client"""
+    args = request.query_params
+    subscription = broadcaster.subscribe(
+        subscription_class=lambda **kwargs: AsyncSubscription(asyncio.get_running_loop(), **kwargs),
+        tickers=post_routes.parse_list_arg('tickers', args),
+        industries=post_routes.parse_list_arg('industries', args),
+        sources=post_routes.parse_list_arg('sources', args),
+        sentiments=post_routes.parse_list_arg('sentiments', args)
+    )
+    if subscription is None:
+        response = _json({"error": "Too many live subscribers"}, 503)
+        response.headers['Retry-After'] = '30'
+        return response
+
+    heartbeat = Config.LIVE_STREAM_HEARTBEAT_SECONDS
+
+    async def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while not subscription.evicted:
+                try:
+                    yield await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+            yield format_sse('evicted', {"reason": "slow consumer"})
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+def _wants_flask(scope) -> bool:
+    """Requests the native routes don't produce: projections and non-JSON formats"""
+    # Parsed as Flask reads request.args: decoded keys, and the first value of each wins
+    args = {}
+    for key, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+        args.setdefault(key, value)
+    if args.get('fields') or args.get('format', 'json') not in ('', 'json'):
+        return True
+    accept = dict(scope.get('headers') or []).get(b'accept', b'')
+    return bool(accept) and not any(m in accept for m in (b'application/json', b'*/*', b'application/*', b'text/event-stream'))
+
+class FlaskFallback:
+    """Send requests the native routes can't answer identically straight to the Flask app"""
+
+    def __init__(self, app, flask_app):
+        self.app = app
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and _wants_flask(scope):
+            await self.flask_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+def create_asgi_app(flask_app: Optional[Any] = None) -> Starlette:
+    flask_asgi = WSGIMiddleware(flask_app or create_app())
+    routes = [
+        Route('/health', health, methods=['GET']),
+        Route('/posts', _endpoint('posts', lambda session, request: post_routes.posts_page(session, request.query_params), post_routes.posts_class), methods=['GET']),
+        Route('/posts/changes', _endpoint('post changes', lambda session, request: post_routes.post_changes(session, request.query_params), 'standard'), methods=['GET']),
+        Route('/sentiment/market', _endpoint('market sentiment', lambda session, request: post_routes.sentiment_summary(session, request.query_params), post_routes.sentiment_class), methods=['GET']),
+        Route('/sentiment/company/{ticker}', _endpoint('company sentiment', lambda session, request: post_routes.company_sentiment(session, request.path_params['ticker'], request.query_params), post_routes.sentiment_class), methods=['GET']),
+        Route('/sentiment/industry/{industry}', _endpoint('industry sentiment', lambda session, request: post_routes.industry_sentiment(session, request.path_params['industry'], request.query_params), post_routes.sentiment_class), methods=['GET']),
+        Route('/sentiment/companies', _endpoint('batch company sentiment', lambda session, request: post_routes.companies_sentiment(session, post_routes.batch_params(request.query_params)), post_routes.sentiment_class), methods=['GET']),
+        Route('/sentiment/timeseries', _endpoint('timeseries', lambda session, request: post_routes.sentiment_timeseries(session, request.query_params), 'standard'), methods=['GET']),
+        Route('/stats', _endpoint('stats', _stats, 'light'), methods=['GET']),
+        Route('/api/stats', _endpoint('stats', _stats, 'light'), methods=['GET']),
+        Route('/stream/posts', stream_posts, methods=['GET']),
+        # Everything else, and other methods on the paths above
+        Mount('/', app=flask_asgi),
+    ]
+    return Starlette(
+        routes=routes,
+        middleware=[
+            Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS),
+            Middleware(FlaskFallback, flask_app=flask_asgi),
+        ],
+        lifespan=lifespan
+    )
+
+app = create_asgi_app()
@@ -23,6 +23,110 @@ class Config:
     # Data Retention (days)
     DATA_RETENTION_DAYS = int(os.environ.get('DATA_RETENTION_DAYS', 7))
     
+    # Live stream (SSE)
+    LIVE_STREAM_BUFFER_SIZE = int(os.environ.get('LIVE_STREAM_BUFFER_SIZE', 256))
+    LIVE_STREAM_MAX_CLIENTS = int(os.environ.get('LIVE_STREAM_MAX_CLIENTS', 1000))
+    LIVE_STREAM_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_STREAM_HEARTBEAT_SECONDS', 15))
+    # Streams a process may hold when its server runs one request at a time per
+    # worker (e.g. Gunicorn sync workers), where each stream pins a whole worker.
+    # The ASGI app serves /stream/posts without this limit
+    LIVE_STREAM_MAX_SYNC_CLIENTS = int(os.environ.get('LIVE_STREAM_MAX_SYNC_CLIENTS', 0))
+    
+    # Poll interval for picking up posts stored by an out-of-process collector
+    # (e.g. 2). 0, the default, leaves the bus to an in-process collector
+    INGEST_TAIL_INTERVAL_SECONDS = float(os.environ.get('INGEST_TAIL_INTERVAL_SECONDS', 0))
+    # In-memory views fed by the bus stop trusting it once it hasn't been fed (a
+    # publish or a tailer poll) for this long, e.g. when nothing tails an
+    # out-of-process collector
+    INGEST_MAX_FEED_AGE_SECONDS = float(os.environ.get('INGEST_MAX_FEED_AGE_SECONDS', max(5 * INGEST_TAIL_INTERVAL_SECONDS, 10)))
+    
+    # Read-endpoint response cache, invalidated by ingest. Max age 0 disables it
+    RESPONSE_CACHE_MAX_AGE_SECONDS = float(os.environ.get('RESPONSE_CACHE_MAX_AGE_SECONDS', 30))
+    RESPONSE_CACHE_STALE_SECONDS = float(os.environ.get('RESPONSE_CACHE_STALE_SECONDS', 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    # Directory for per-key file locks so identical requests coalesce across
+    # workers too (Unix only). Unset coalesces within each process only
+    RESPONSE_COALESCE_DIR = os.environ.get('RESPONSE_COALESCE_DIR')
+    
+    # Dashboard snapshot, rebuilt after each ingest batch and at least this often
+    DASHBOARD_REFRESH_SECONDS = float(os.environ.get('DASHBOARD_REFRESH_SECONDS', 60))
+    DASHBOARD_LATEST_POSTS = int(os.environ.get('DASHBOARD_LATEST_POSTS', 50))
+    
+    # Rows fetched per server-side cursor round trip by /export/posts
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    
+    # In-memory hot tier of recent posts. It is fed by the ingest bus, so it
+    # needs the ingest tailer or an in-process collector to stay current; on
+    # by default only when the tailer is
+    HOT_STORE_ENABLED = os.environ.get('HOT_STORE_ENABLED', str(INGEST_TAIL_INTERVAL_SECONDS > 0)).lower() == 'true'
+    HOT_STORE_WINDOW_HOURS = int(os.environ.get('HOT_STORE_WINDOW_HOURS', 24))
+    HOT_STORE_COMPANY_CAPACITY = int(os.environ.get('HOT_STORE_COMPANY_CAPACITY', 50000))
+    # The hot store falls back to the database once the bus hasn't been fed for this long
+    HOT_STORE_MAX_FEED_AGE_SECONDS = float(os.environ.get('HOT_STORE_MAX_FEED_AGE_SECONDS', INGEST_MAX_FEED_AGE_SECONDS))
+    
+    # Rolling 5m/1h/24h/7d sentiment per company, industry and source. Fed by the
+    # ingest bus like the hot store, so on by default only when the tailer is
+    WINDOW_AGGREGATOR_ENABLED = os.environ.get('WINDOW_AGGREGATOR_ENABLED', str(INGEST_TAIL_INTERVAL_SECONDS > 0)).lower() == 'true'
+    
+    # Time-decayed sentiment index: weight half-life, how often its state is
+    # checkpointed, and how often it reads new posts itself while the bus is quiet
+    SENTIMENT_INDEX_HALF_LIFE_HOURS = float(os.environ.get('SENTIMENT_INDEX_HALF_LIFE_HOURS', 6))
+    SENTIMENT_INDEX_CHECKPOINT_SECONDS = float(os.environ.get('SENTIMENT_INDEX_CHECKPOINT_SECONDS', 60))
+    SENTIMENT_INDEX_CATCH_UP_SECONDS = float(os.environ.get('SENTIMENT_INDEX_CATCH_UP_SECONDS', 2))
+    
+    # Streaming anomaly detection: bucket size, EWMA smoothing, z-score alarm
+    # threshold, buckets before a series may alarm, and how late posts may arrive
+    SIGNAL_BUCKET_MINUTES = int(os.environ.get('SIGNAL_BUCKET_MINUTES', 5))
+    SIGNAL_EWMA_ALPHA = float(os.environ.get('SIGNAL_EWMA_ALPHA', 0.1))
+    SIGNAL_Z_THRESHOLD = float(os.environ.get('SIGNAL_Z_THRESHOLD', 3.0))
+    SIGNAL_WARMUP_BUCKETS = int(os.environ.get('SIGNAL_WARMUP_BUCKETS', 12))
+    SIGNAL_LATENESS_SECONDS = float(os.environ.get('SIGNAL_LATENESS_SECONDS', 120))
+    SIGNAL_MIN_SENTIMENT_POSTS = int(os.environ.get('SIGNAL_MIN_SENTIMENT_POSTS', 5))
+    
+    # Alert rules: webhook worker threads, attempts per delivery, request timeout,
+    # deliveries queued before new ones are dropped, and how often rules are reloaded
+    ALERT_WEBHOOK_WORKERS = int(os.environ.get('ALERT_WEBHOOK_WORKERS', 4))
+    ALERT_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('ALERT_WEBHOOK_MAX_ATTEMPTS', 5))
+    ALERT_WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get('ALERT_WEBHOOK_TIMEOUT_SECONDS', 5))
+    ALERT_WEBHOOK_QUEUE_SIZE = int(os.environ.get('ALERT_WEBHOOK_QUEUE_SIZE', 10000))
+    ALERT_RULES_REFRESH_SECONDS = float(os.environ.get('ALERT_RULES_REFRESH_SECONDS', 30))
+    # Comma-separated webhook domains (subdomains included). When set, only these
+    # hosts are accepted, wherever they resolve; otherwise hosts must resolve to public addresses
+    ALERT_WEBHOOK_ALLOWED_HOSTS = [h.strip() for h in os.environ.get('ALERT_WEBHOOK_ALLOWED_HOSTS', '').split(',') if h.strip()]
+    
+    # Trending cashtags, authors and terms: how often each API process re-merges the ingest workers' slices
+    TRENDING_REFRESH_SECONDS = float(os.environ.get('TRENDING_REFRESH_SECONDS', 10))
+    
+    # Admission control: concurrent requests and PostgreSQL statement_timeout
+    # per endpoint class. Requests wait up to ADMISSION_MAX_WAIT_SECONDS for a
+    # slot (at most ADMISSION_QUEUE_SIZE waiting per class), then get 503
+    ADMISSION_CLASSES = {
+        'light': {
+            'concurrency': int(os.environ.get('ADMISSION_LIGHT_CONCURRENCY', 32)),
+            'statement_timeout_ms': int(os.environ.get('ADMISSION_LIGHT_TIMEOUT_MS', 2000)),
+        },
+        'standard': {
+            'concurrency': int(os.environ.get('ADMISSION_STANDARD_CONCURRENCY', 16)),
+            'statement_timeout_ms': int(os.environ.get('ADMISSION_STANDARD_TIMEOUT_MS', 5000)),
+        },
+        'heavy': {
+            'concurrency': int(os.environ.get('ADMISSION_HEAVY_CONCURRENCY', 4)),
+            'statement_timeout_ms': int(os.environ.get('ADMISSION_HEAVY_TIMEOUT_MS', 15000)),
+        },
+        'export': {
+            'concurrency': int(os.environ.get('ADMISSION_EXPORT_CONCURRENCY', 2)),
+            'statement_timeout_ms': int(os.environ.get('ADMISSION_EXPORT_TIMEOUT_MS', 60000)),
+        },
+    }
+    ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 64))
+    ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', 2))
+    
+    # ASGI serving mode (asgi.py). The async URL defaults to DATABASE_URL with
+    # an async driver (asyncpg for PostgreSQL, aiosqlite for SQLite)
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+    ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 10))
+    
     # Companies to monitor
     COMPANIES = {
         "technology": [
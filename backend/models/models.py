@@ -1,11 +1,15 @@
 from datetime import datetime, timedelta
+import json
+import logging
 from typing import Dict, Any, Optional, List
 import uuid
-from sqlalchemy import Column, String, DateTime, Float, Integer, Text, ForeignKey, Index, create_engine
+from sqlalchemy import Boolean, Column, String, DateTime, Float, Integer, BigInteger, LargeBinary, Text, ForeignKey, Index, PrimaryKeyConstraint, Sequence, create_engine, inspect, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 class IndustryModel(Base):
@@ -78,6 +82,8 @@ class SentimentPostModel(Base):
     engagement = Column(Integer, default=0)
     original_url = Column(String(500))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Monotonically increasing ingest position, used by delta sync and the ingest tailer
+    ingest_seq = Column(BigInteger, Sequence('sentiment_posts_ingest_seq'), index=True)
     
     # Relationships
     company = relationship("CompanyModel", backref="sentiment_posts")
@@ -86,6 +92,8 @@ class SentimentPostModel(Base):
         Index('idx_timestamp_desc', timestamp.desc()),
         Index('idx_company_timestamp', company_id, timestamp.desc()),
         Index('idx_source_timestamp', source, timestamp.desc()),
+        # Keyset pagination order for /posts
+        Index('idx_timestamp_id_desc', timestamp.desc(), id.desc()),
     )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -120,12 +128,413 @@ class SentimentPostModel(Base):
             created_at=datetime.fromisoformat(data['created_at']) if isinstance(data.get('created_at'), str) else data.get('created_at')
         )
 
+class SentimentRollupModel(Base):
+    """SQLAlchemy model for per-company, per-source sentiment rollups.
+
+    One row per (company, source, granularity, bucket_start). Buckets are keyed
+    by the post timestamp, so late-arriving posts land in the bucket they belong
+    to rather than the one that was open when they were ingested.
+    """
+    __tablename__ = 'sentiment_rollups'
+
+    company_id = Column(UUID(as_uuid=True), ForeignKey('companies.id'), nullable=False)
+    source = Column(String(50), nullable=False)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    post_count = Column(BigInteger, nullable=False, default=0)
+    positive_count = Column(BigInteger, nullable=False, default=0)
+    neutral_count = Column(BigInteger, nullable=False, default=0)
+    negative_count = Column(BigInteger, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    engagement_sum = Column(BigInteger, nullable=False, default=0)
+    # Signed (score * weight) sums so weighted averages can be served from rollups
+    score_confidence_sum = Column(Float, nullable=False, default=0.0)
+    score_engagement_sum = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('company_id', 'source', 'granularity', 'bucket_start'),
+        Index('idx_rollup_granularity_bucket', granularity, bucket_start),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "company_id": str(self.company_id),
+            "source": self.source,
+            "granularity": self.granularity,
+            "bucket_start": self.bucket_start.isoformat() if self.bucket_start else None,
+            "post_count": self.post_count,
+            "positive_count": self.positive_count,
+            "neutral_count": self.neutral_count,
+            "negative_count": self.negative_count,
+            "confidence_sum": self.confidence_sum,
+            "engagement_sum": self.engagement_sum,
+            "score_confidence_sum": self.score_confidence_sum,
+            "score_engagement_sum": self.score_engagement_sum
+        }
+
+class SentimentSketchModel(Base):
+    """SQLAlchemy model for hourly per-company sketches stored next to the rollups.
+
+    confidence_sketch and engagement_sketch are serialized DDSketches for
+    percentiles; author_sketch is a HyperLogLog of (source, author) for
+    unique-author counts. Any window is answered by merging its hours.
+    """
+    __tablename__ = 'sentiment_sketches'
+
+    company_id = Column(UUID(as_uuid=True), ForeignKey('companies.id'), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    post_count = Column(Integer, nullable=False, default=0)
+    confidence_sketch = Column(LargeBinary, nullable=False)
+    engagement_sketch = Column(LargeBinary, nullable=False)
+    author_sketch = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('company_id', 'bucket_start'),
+        Index('idx_sketches_bucket', 'bucket_start'),
+    )
+
+class TrendingSketchModel(Base):
+    """SQLAlchemy model for trending cashtag, author and term counts per time slice.
+
+    Each ingest worker writes its own row per (dimension, granularity,
+    slice_start): a Count-Min Sketch of item counts and a Space-Saving
+    summary of its top items. Readers merge every worker's rows.
+    """
+    __tablename__ = 'trending_sketches'
+
+    dimension = Column(String(20), nullable=False)
+    granularity = Column(String(10), nullable=False)
+    slice_start = Column(DateTime, nullable=False)
+    worker = Column(String(100), nullable=False)
+    post_count = Column(Integer, nullable=False, default=0)
+    count_sketch = Column(LargeBinary, nullable=False)
+    top_items = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('dimension', 'granularity', 'slice_start', 'worker'),
+        Index('idx_trending_granularity_slice', 'granularity', 'slice_start'),
+    )
+
+class IngestCounterModel(Base):
+    """SQLAlchemy model for overall post counters maintained at ingest time.
+
+    One row per (dimension, key), e.g. ('source', 'reddit') or ('all', '').
+    The 'authors' dimension counts distinct authors in post_authors.
+    """
+    __tablename__ = 'ingest_counters'
+
+    dimension = Column(String(20), nullable=False)
+    key = Column(String(100), nullable=False, default='')
+    post_count = Column(BigInteger, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('dimension', 'key'),
+    )
+
+class PostAuthorModel(Base):
+    """SQLAlchemy model for the distinct authors among retained posts"""
+    __tablename__ = 'post_authors'
+
+    source = Column(String(50), nullable=False)
+    author = Column(String(200), nullable=False)
+    post_count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('source', 'author'),
+    )
+
+class SentimentIndexCheckpointModel(Base):
+    """SQLAlchemy model for checkpoints of the time-decayed sentiment index.
+
+    One row per series, e.g. ('market', ''), ('company', <id>) or
+    ('industry', 'technology'). Sums are decayed to as_of and include every
+    post up to ingest_seq.
+    """
+    __tablename__ = 'sentiment_index_checkpoints'
+
+    kind = Column(String(20), nullable=False)
+    key = Column(String(100), nullable=False, default='')
+    half_life_hours = Column(Float, nullable=False)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    weight_sum = Column(Float, nullable=False, default=0.0)
+    post_sum = Column(Float, nullable=False, default=0.0)
+    as_of = Column(DateTime, nullable=False)
+    ingest_seq = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('kind', 'key'),
+    )
+
+class AlertRuleModel(Base):
+    """SQLAlchemy model for alert rules.
+
+    A rule is scoped by any of ticker, industry and source (none means every
+    post) and holds its condition as JSON, e.g. {"type": "post", "field":
+    "engagement", "op": ">", "value": 5000} or {"type": "window", "metric":
+    "negative_share", "window": "1h", "op": ">", "value": 0.6}.
+    """
+    __tablename__ = 'alert_rules'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String(200), nullable=False)
+    ticker = Column(String(10), index=True)
+    industry = Column(String(50), index=True)
+    source = Column(String(50))
+    condition = Column(Text, nullable=False)
+    webhook_url = Column(String(500), nullable=False)
+    cooldown_seconds = Column(Integer, nullable=False, default=3600)
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "ticker": self.ticker,
+            "industry": self.industry,
+            "source": self.source,
+            "condition": json.loads(self.condition),
+            "webhook_url": self.webhook_url,
+            "cooldown_seconds": self.cooldown_seconds,
+            "enabled": bool(self.enabled),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class AlertDeliveryModel(Base):
+    """SQLAlchemy model for webhook deliveries of fired alerts.
+
+    dedup_key identifies one firing (a rule and a post, or a rule, subject and
+    firing time); the worker that inserts it first delivers it.
+    """
+    __tablename__ = 'alert_deliveries'
+
+    dedup_key = Column(String(200), primary_key=True)
+    rule_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(500))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    delivered_at = Column(DateTime)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dedup_key": self.dedup_key,
+            "rule_id": str(self.rule_id),
+            "payload": json.loads(self.payload),
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "delivered_at": self.delivered_at.isoformat() if self.delivered_at else None
+        }
+
+class AlertCooldownModel(Base):
+    """SQLAlchemy model for when a window rule last fired for a subject.
+
+    Claimed with a conditional upsert that only succeeds once the cooldown
+    has passed, so processes racing on the same transition fire it once.
+    """
+    __tablename__ = 'alert_cooldowns'
+
+    rule_id = Column(UUID(as_uuid=True), primary_key=True)
+    subject = Column(String(100), primary_key=True)
+    last_fired_at = Column(DateTime, nullable=False)
+
+class AnomalySignalModel(Base):
+    """SQLAlchemy model for volume and sentiment anomaly signals.
+
+    Every API process runs the same detector over the same posts, so a
+    signal is unique per (company, source, metric, kind, bucket) and the
+    first process to insert it wins. id is assigned by the database and is
+    the /signals/anomalies feed position.
+    """
+    __tablename__ = 'anomaly_signals'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    company_id = Column(UUID(as_uuid=True), nullable=False)
+    ticker = Column(String(10), index=True)
+    industry = Column(String(50))
+    source = Column(String(50), nullable=False)
+    metric = Column(String(20), nullable=False)
+    kind = Column(String(20), nullable=False)
+    direction = Column(String(10), nullable=False)
+    value = Column(Float, nullable=False)
+    baseline = Column(Float, nullable=False)
+    std = Column(Float, nullable=False)
+    z = Column(Float, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    bucket_minutes = Column(Integer, nullable=False)
+    detected_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index('idx_anomaly_signal_unique', company_id, source, metric, kind, bucket_start, unique=True),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "company_id": str(self.company_id),
+            "ticker": self.ticker,
+            "industry": self.industry,
+            "source": self.source,
+            "metric": self.metric,
+            "kind": self.kind,
+            "direction": self.direction,
+            "value": self.value,
+            "baseline": self.baseline,
+            "std": self.std,
+            "z": self.z,
+            "bucket_start": self.bucket_start.isoformat(),
+            "bucket_minutes": self.bucket_minutes,
+            "detected_at": self.detected_at.isoformat(),
+        }
+
+# Full-text search objects that live outside the ORM metadata. On PostgreSQL
+# they rewrite or index the whole table, so only migrate_search_schema builds them
+POSTGRES_SEARCH_COLUMN_DDL = (
+    "ALTER TABLE sentiment_posts ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED"
+)
+POSTGRES_SEARCH_INDEX_DDL = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_search_vector ON sentiment_posts USING GIN (search_vector)"
+)
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_content_trgm ON sentiment_posts USING GIN (content gin_trgm_ops)",
+]
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sentiment_posts_fts USING fts5("
+    "content, content='sentiment_posts', content_rowid='rowid', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS sentiment_posts_fts_ai AFTER INSERT ON sentiment_posts BEGIN "
+    "INSERT INTO sentiment_posts_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS sentiment_posts_fts_ad AFTER DELETE ON sentiment_posts BEGIN "
+    "INSERT INTO sentiment_posts_fts(sentiment_posts_fts, rowid, content) VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS sentiment_posts_fts_au AFTER UPDATE OF content ON sentiment_posts BEGIN "
+    "INSERT INTO sentiment_posts_fts(sentiment_posts_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    "INSERT INTO sentiment_posts_fts(rowid, content) VALUES (new.rowid, new.content); END",
+]
+
+def ensure_search_schema(engine) -> None:
+    """
+    Create SQLite's full-text search objects if missing, and note which PostgreSQL has
+
+    SQLite gets an FTS5 trigram table kept in sync by triggers. PostgreSQL
+    is only inspected: until migrate_search_schema has added the tsvector
+    column, search falls back to ILIKE. Safe to run repeatedly.
+    """
+    from services.search_service import set_search_vector_available
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        with engine.connect() as conn:
+            columns = {column['name'] for column in inspect(conn).get_columns('sentiment_posts')}
+        set_search_vector_available('search_vector' in columns)
+        if 'search_vector' not in columns:
+            logger.warning("sentiment_posts.search_vector is missing; search uses ILIKE until "
+                           "tasks/rebuild_rollups.py --search migrates it")
+    elif dialect == 'sqlite':
+        with engine.begin() as conn:
+            created = 'sentiment_posts_fts' not in inspect(conn).get_table_names()
+            for statement in SQLITE_SEARCH_DDL:
+                conn.execute(text(statement))
+            if created:
+                conn.execute(text("INSERT INTO sentiment_posts_fts(sentiment_posts_fts) VALUES ('rebuild')"))
+
+def migrate_search_schema(engine) -> None:
+    """
+    Build PostgreSQL's search column and indexes; elsewhere same as ensure_search_schema
+
+    Adding the stored tsvector column rewrites sentiment_posts under an
+    ACCESS EXCLUSIVE lock, so this runs from the rebuild task in a quiet
+    period, never at app startup. The GIN indexes are built CONCURRENTLY.
+    pg_trgm is optional: without the privilege to create it, the trigram
+    index is skipped and substring matches fall back to a scan.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            conn.execute(text(POSTGRES_SEARCH_COLUMN_DDL))
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(POSTGRES_SEARCH_INDEX_DDL))
+            try:
+                for statement in POSTGRES_TRGM_DDL:
+                    conn.execute(text(statement))
+            except Exception as e:
+                logger.warning(f"Skipping the pg_trgm substring index: {e}")
+    ensure_search_schema(engine)
+
+def ensure_ingest_seq_schema(engine) -> None:
+    """
+    Add and backfill sentiment_posts.ingest_seq on databases created before it existed
+
+    PostgreSQL fills the column from the sentiment_posts_ingest_seq sequence.
+    SQLite has no sequences, so a trigger copies the rowid, which only grows
+    because retention deletes the oldest rows.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        columns = {column['name'] for column in inspect(conn).get_columns('sentiment_posts')}
+        if dialect == 'postgresql':
+            conn.execute(text("CREATE SEQUENCE IF NOT EXISTS sentiment_posts_ingest_seq"))
+            if 'ingest_seq' not in columns:
+                conn.execute(text(
+                    "ALTER TABLE sentiment_posts ADD COLUMN ingest_seq BIGINT "
+                    "DEFAULT nextval('sentiment_posts_ingest_seq')"
+                ))
+        elif dialect == 'sqlite':
+            if 'ingest_seq' not in columns:
+                conn.execute(text("ALTER TABLE sentiment_posts ADD COLUMN ingest_seq BIGINT"))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS sentiment_posts_ingest_seq_ai AFTER INSERT ON sentiment_posts "
+                "WHEN new.ingest_seq IS NULL BEGIN "
+                "UPDATE sentiment_posts SET ingest_seq = new.rowid WHERE rowid = new.rowid; END"
+            ))
+            conn.execute(text("UPDATE sentiment_posts SET ingest_seq = rowid WHERE ingest_seq IS NULL"))
+
+# Keys of the transaction-level advisory locks that serialize ingest and
+# anomaly signal inserts on PostgreSQL
+INGEST_LOCK_KEY = 7301945120
+SIGNAL_LOCK_KEY = 7301945121
+
+def lock_ingest(session) -> None:
+    """
+    Hold off other ingest transactions until this one commits or rolls back
+
+    ingest_seq is drawn at insert, not at commit, so two concurrent writers
+    could commit N+1 while N is still in flight, and anything resuming from
+    the newest visible position (the ingest tailer, /posts/changes, the
+    in-memory consumers) would step over N for good. Call this before the
+    first insert of every transaction that stores posts: committed positions
+    then always sit below uncommitted ones. SQLite already allows a single
+    writer, holding its lock from the first insert until commit.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': INGEST_LOCK_KEY})
+
+def init_db(engine) -> None:
+    """Create all tables plus the schema objects the ORM metadata can't express"""
+    Base.metadata.create_all(engine)
+    ensure_ingest_seq_schema(engine)
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    ensure_search_schema(engine)
+
 class SentimentPost:
     """Data access layer for sentiment posts"""
     
     def __init__(self, db_uri: str):
         self.engine = create_engine(db_uri)
-        Base.metadata.create_all(self.engine)
+        init_db(self.engine)
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
     
@@ -139,6 +548,7 @@ class SentimentPost:
                    engagement: int,
                    timestamp: Optional[datetime] = None,
                    original_url: Optional[str] = None) -> str:
+        lock_ingest(self.session)
         post = SentimentPostModel(
             company_id=uuid.UUID(company_id),
             content=content,
@@ -151,6 +561,14 @@ class SentimentPost:
             original_url=original_url
         )
         self.session.add(post)
+        from services.rollup_service import apply_posts_to_rollups
+        from services.stats_service import apply_posts_to_stats
+        from services.sketch_service import apply_posts_to_sketches
+        from services.trending_service import apply_posts_to_trending
+        apply_posts_to_rollups(self.session, [post])
+        apply_posts_to_stats(self.session, [post])
+        apply_posts_to_sketches(self.session, [post])
+        apply_posts_to_trending(self.session, [post])
         self.session.commit()
         return str(post.id)
     
@@ -162,24 +580,14 @@ class SentimentPost:
                   company_ids: Optional[List[str]] = None,
                   search_query: Optional[str] = None,
                   hours_back: int = 24) -> List[Dict]:
-        query = self.session.query(SentimentPostModel).join(SentimentPostModel.company)
-        if hours_back:
-            time_cutoff = datetime.utcnow() - timedelta(hours=hours_back)
-            query = query.filter(SentimentPostModel.timestamp >= time_cutoff)
-        if sources:
-            query = query.filter(SentimentPostModel.source.in_(sources))
-        if sentiments:
-            query = query.filter(SentimentPostModel.sentiment.in_(sentiments))
-        if company_ids:
-            query = query.filter(SentimentPostModel.company_id.in_([uuid.UUID(id) for id in company_ids]))
-        if search_query:
-            search_term = f"%{search_query}%"
-            query = query.filter(SentimentPostModel.content.ilike(search_term))
-        posts = query.order_by(SentimentPostModel.timestamp.desc())\
-                    .offset(offset)\
-                    .limit(limit)\
-                    .all()
-        return [post.to_dict() for post in posts]
+        from services.post_query_service import post_projection_query, apply_post_filters, fetch_post_rows, KEYSET_ORDER
+        stmt = apply_post_filters(
+            post_projection_query(), self.engine.dialect.name,
+            sources=sources, sentiments=sentiments, company_ids=company_ids,
+            search_query=search_query, hours_back=hours_back
+        )
+        stmt = stmt.order_by(*KEYSET_ORDER).offset(offset).limit(limit)
+        return fetch_post_rows(self.session, stmt)
     
     def get_post_by_id(self, post_id: str) -> Optional[Dict[str, Any]]:
         try:
@@ -197,9 +605,21 @@ class SentimentPost:
         deleted_count = self.session.query(SentimentPostModel)\
                                    .filter(SentimentPostModel.timestamp < cutoff_date)\
                                    .count()
+        from services.stats_service import remove_expired_from_stats
+        remove_expired_from_stats(self.session, cutoff_date)
         self.session.query(SentimentPostModel)\
                    .filter(SentimentPostModel.timestamp < cutoff_date)\
                    .delete()
+        from services.rollup_service import prune_rollups
+        prune_rollups(self.session, cutoff_date)
+        from services.sketch_service import prune_sketches
+        prune_sketches(self.session, cutoff_date)
+        from services.trending_service import prune_trending
+        prune_trending(self.session)
+        from services.webhook_dispatcher import prune_alert_deliveries
+        prune_alert_deliveries(self.session, cutoff_date)
+        from services.anomaly_detector import prune_signals
+        prune_signals(self.session, cutoff_date)
         self.session.commit()
         return deleted_count
     
@@ -220,8 +640,8 @@ class SentimentPost:
         if company_ids:
             query = query.filter(SentimentPostModel.company_id.in_([uuid.UUID(id) for id in company_ids]))
         if search_query:
-            search_term = f"%{search_query}%"
-            query = query.filter(SentimentPostModel.content.ilike(search_term))
+            from services.search_service import search_filter
+            query = query.filter(search_filter(search_query, self.engine.dialect.name))
         return query.count()
     
     def check_duplicate(self, content: str, source: str, author: str, timestamp_window_minutes: int = 60) -> bool:
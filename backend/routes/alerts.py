@@ -0,0 +1,196 @@
+from flask import Blueprint, jsonify, request
+import json
+import logging
+import uuid
+
+from models.models import AlertCooldownModel, AlertDeliveryModel, AlertRuleModel
+from routes.posts import Session, admission, parse_list_arg, window_aggregator
+from services.alert_engine import AlertEngine, AlertRule
+from services.ingest_bus import ingest_bus
+from services.webhook_dispatcher import WebhookDispatcher
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+alerts_bp = Blueprint('alerts', __name__)
+
+webhook_dispatcher = WebhookDispatcher(
+    session_factory=Session,
+    workers=Config.ALERT_WEBHOOK_WORKERS,
+    max_attempts=Config.ALERT_WEBHOOK_MAX_ATTEMPTS,
+    timeout_seconds=Config.ALERT_WEBHOOK_TIMEOUT_SECONDS,
+    queue_size=Config.ALERT_WEBHOOK_QUEUE_SIZE,
+    allowed_hosts=Config.ALERT_WEBHOOK_ALLOWED_HOSTS
+)
+# Subscribed after the window aggregator (routes.posts), so window rules see each batch
+alert_engine = AlertEngine(webhook_dispatcher, window_aggregator=window_aggregator)
+ingest_bus.subscribe(alert_engine.add_posts)
+
+def _limit_offset():
+    limit = int(request.args.get('limit', 100))
+    offset = int(request.args.get('offset', 0))
+    if limit < 1 or limit > 1000 or offset < 0:
+        raise ValueError(f"limit/offset out of range: {limit}/{offset}")
+    return limit, offset
+
+@alerts_bp.route('/alerts/rules', methods=['GET'])
+@admission.limit('light')
+def list_alert_rules():
+    """
+    List alert rules, newest first
+
+    Query parameters (all optional):
+        tickers, industries: Comma-separated scope filters
+        limit: Maximum rules (default 100, max 1000)
+        offset: Rules to skip
+    """
+    try:
+        limit, offset = _limit_offset()
+        tickers = [t.upper() for t in parse_list_arg('tickers')]
+        industries = [i.lower() for i in parse_list_arg('industries')]
+        session = Session()
+        try:
+            query = session.query(AlertRuleModel)
+            if tickers:
+                query = query.filter(AlertRuleModel.ticker.in_(tickers))
+            if industries:
+                query = query.filter(AlertRuleModel.industry.in_(industries))
+            total = query.count()
+            rules = query.order_by(AlertRuleModel.created_at.desc(), AlertRuleModel.id).offset(offset).limit(limit).all()
+            return jsonify({"rules": [rule.to_dict() for rule in rules], "total": total})
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in alert rules request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error listing alert rules: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@alerts_bp.route('/alerts/rules', methods=['POST'])
+@admission.limit('light')
+def create_alert_rule():
+    """
+    Create an alert rule from a JSON body
+
+    Fields: name, webhook_url, condition, and optionally ticker, industry,
+    source and cooldown_seconds (default 3600). Conditions are either
+    {"type": "post", "field": "engagement"|"confidence", "op", "value",
+    "sentiment"?} or {"type": "window", "metric": "negative_share"|
+    "positive_share"|"neutral_share"|"sentiment"|"post_count"|
+    "avg_confidence", "window": "5m"|"1h"|"24h"|"7d", "op", "value",
+    "min_posts"? (default 10)}; op is one of >, >=, <, <=. webhook_url
+    must resolve to a public address, or be on ALERT_WEBHOOK_ALLOWED_HOSTS.
+    """
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object body")
+        rule = AlertRule(
+            id=uuid.uuid4(),
+            name=body.get('name'),
+            webhook_url=body.get('webhook_url'),
+            condition=body.get('condition'),
+            ticker=body.get('ticker'),
+            industry=body.get('industry'),
+            source=body.get('source'),
+            cooldown_seconds=body.get('cooldown_seconds', 3600)
+        )
+        try:
+            webhook_dispatcher.check_url(rule.webhook_url)
+        except OSError as e:
+            raise ValueError(f"Cannot resolve webhook host: {e}") from e
+        model = AlertRuleModel(
+            id=rule.id, name=rule.name, ticker=rule.ticker, industry=rule.industry, source=rule.source,
+            condition=json.dumps(rule.condition), webhook_url=rule.webhook_url,
+            cooldown_seconds=rule.cooldown_seconds, enabled=True
+        )
+        session = Session()
+        try:
+            session.add(model)
+            session.commit()
+            alert_engine.add_rule(rule)
+            return jsonify(model.to_dict()), 201
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid alert rule: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error creating alert rule: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@alerts_bp.route('/alerts/rules/<rule_id>', methods=['GET', 'DELETE'])
+@admission.limit('light')
+def alert_rule(rule_id):
+    """Get or delete one alert rule"""
+    try:
+        rule_uuid = uuid.UUID(rule_id)
+        session = Session()
+        try:
+            model = session.get(AlertRuleModel, rule_uuid)
+            if model is None:
+                return jsonify({"error": "Alert rule not found"}), 404
+            result = model.to_dict()
+            if request.method == 'DELETE':
+                session.delete(model)
+                session.query(AlertCooldownModel).filter(AlertCooldownModel.rule_id == rule_uuid).delete()
+                session.commit()
+                alert_engine.remove_rule(rule_uuid)
+            return jsonify(result)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid alert rule id {rule_id}: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error handling alert rule {rule_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@alerts_bp.route('/alerts/deliveries', methods=['GET'])
+@admission.limit('light')
+def list_alert_deliveries():
+    """
+    List webhook deliveries, newest first, with this process's queue stats
+
+    Query parameters (all optional):
+        rule_id: Only deliveries of this rule
+        status: pending, delivered or failed
+        limit: Maximum deliveries (default 100, max 1000)
+        offset: Deliveries to skip
+    """
+    try:
+        limit, offset = _limit_offset()
+        status = request.args.get('status')
+        if status is not None and status not in ('pending', 'delivered', 'failed'):
+            raise ValueError(f"Unknown status: {status}")
+        session = Session()
+        try:
+            query = session.query(AlertDeliveryModel)
+            if 'rule_id' in request.args:
+                query = query.filter(AlertDeliveryModel.rule_id == uuid.UUID(request.args['rule_id']))
+            if status:
+                query = query.filter(AlertDeliveryModel.status == status)
+            deliveries = query.order_by(AlertDeliveryModel.created_at.desc()).offset(offset).limit(limit).all()
+            return jsonify({
+                "deliveries": [delivery.to_dict() for delivery in deliveries],
+                "queue": {
+                    **webhook_dispatcher.stats,
+                    "pending": webhook_dispatcher.pending(),
+                    "rules": alert_engine.rule_count()
+                }
+            })
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in alert deliveries request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error listing alert deliveries: {e}")
+        return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,41 @@
+from flask import Blueprint, Response, jsonify, request
+import functools
+import logging
+
+from routes.posts import Session
+from services.dashboard_service import DashboardSnapshot, build_dashboard_snapshot
+from services.ingest_bus import ingest_bus
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+dashboard_snapshot = DashboardSnapshot(
+    Session,
+    builder=functools.partial(build_dashboard_snapshot, latest_limit=Config.DASHBOARD_LATEST_POSTS),
+    refresh_seconds=Config.DASHBOARD_REFRESH_SECONDS
+)
+ingest_bus.subscribe(dashboard_snapshot.invalidate)
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """
+    Get the precomputed dashboard snapshot
+
+    One document with market, industry and company scores, counts by source
+    and sentiment, the latest posts and trending tickers. It is rebuilt in
+    the background after ingest, so this endpoint never touches the database
+    once the first snapshot exists. Send the ETag back in If-None-Match to
+    get 304 when nothing changed.
+    """
+    try:
+        body, etag, version = dashboard_snapshot.get()
+        response = Response(body, mimetype='application/json')
+        response.headers['X-Snapshot-Version'] = str(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    except Exception as e:
+        logger.error(f"Error serving dashboard snapshot: {e}")
+        return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,101 @@
+from flask import Blueprint, Response, jsonify, request
+import logging
+from datetime import datetime
+
+from models.models import CompanyModel
+from routes.posts import Session, parse_post_filters, admission
+from services.admission import Overloaded
+from services.export_service import stream_rows, iter_ndjson, iter_csv, gzip_stream
+from services.post_query_service import apply_post_filters, post_projection_query, industry_filter, KEYSET_ORDER
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+    'csv': ('text/csv', iter_csv),
+}
+
+@export_bp.route('/export/posts', methods=['GET'])
+def export_posts():
+    """
+    Stream every matching post as NDJSON or CSV
+
+    Query parameters:
+        format: ndjson (default) or csv
+        ticker / industry: Restrict to one company or industry
+        sources, sentiments, company_ids, search, hours_back: As for /posts
+            (hours_back=0 exports all retained data)
+
+    Rows are read through a server-side cursor and written as they arrive,
+    gzip-compressed when the client accepts it, so memory per request stays
+    constant whatever the result size. Exports hold an "export" admission
+    slot until the stream ends.
+    """
+    try:
+        admission.acquire('export')
+    except Overloaded as e:
+        logger.warning(f"Shedding export request: {e}")
+        return admission.overloaded_response(e)
+    
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        filters = parse_post_filters()
+        ticker = request.args.get('ticker')
+        industry = request.args.get('industry')
+
+        session = Session()
+        try:
+            dialect = session.get_bind().dialect.name
+            stmt = apply_post_filters(post_projection_query(), dialect, **filters)
+            if ticker:
+                stmt = stmt.where(CompanyModel.ticker == ticker.upper())
+            if industry:
+                stmt = stmt.where(industry_filter(industry))
+            stmt = stmt.order_by(*KEYSET_ORDER)
+        except Exception:
+            session.close()
+            raise
+    except ValueError as e:
+        admission.release('export')
+        logger.error(f"Invalid parameter in export request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        admission.release('export')
+        logger.error(f"Error preparing export: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    mimetype, encoder = EXPORT_FORMATS[export_format]
+
+    def generate():
+        try:
+            # The statement budget is set here because the body is streamed after the view returns
+            with admission.budget('export'):
+                yield from encoder(stream_rows(session, stmt, batch_size=Config.EXPORT_BATCH_SIZE))
+        except Exception as e:
+            # Headers are already sent. Re-raising makes the server drop the
+            # connection rather than end the chunked body cleanly, so clients
+            # can tell a truncated export from a complete one
+            logger.error(f"Error streaming export: {e}")
+            raise
+
+    def finish():
+        # Runs when the server closes the response, even if the body was never read
+        session.close()
+        admission.release('export')
+
+    headers = {
+        'Vary': 'Accept-Encoding',
+        'Content-Disposition': f'attachment; filename="posts-{datetime.utcnow():%Y%m%dT%H%M%S}.{export_format}"',
+    }
+    body = generate()
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    response = Response(body, mimetype=mimetype, headers=headers)
+    response.call_on_close(finish)
+    return response
@@ -1,9 +1,29 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, g, jsonify, request
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy import create_engine
+import uuid
+from sqlalchemy import create_engine, select, func
 from sqlalchemy.orm import sessionmaker
-from models.models import SentimentPostModel, CompanyModel
+from models.models import SentimentPostModel, CompanyModel, IndustryModel
+from services.aggregation_service import aggregate_sentiment
+from services.timeseries_service import build_timeseries, parse_bucket
+from services.ingest_bus import ingest_bus
+from services.response_cache import ResponseCache
+from services.admission import AdmissionController, install_statement_timeouts
+from services.hot_store import HotPostStore
+from services.window_aggregator import MARKET, SlidingWindowAggregator, empty_totals, rollup_window_totals, window_summaries
+from services.response_format import negotiated, parse_fields, project_posts, encode
+from services.search_service import search_rank_order
+from services.stats_service import get_ingest_stats
+from services.sketch_service import SketchSet, merge_sketches, sketch_accuracy
+from services.rollup_service import bucket_start
+from services.facet_service import facet_counts
+from services.post_query_service import (
+    apply_post_filters, keyset_filter, encode_cursor, estimate_post_count, KEYSET_ORDER,
+    post_projection_query, serialize_post_row, industry_filter,
+    CHANGE_FIELDS, change_query, serialize_change_row, current_ingest_seq,
+    encode_ingest_cursor, decode_ingest_cursor
+)
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -14,62 +34,262 @@ posts_bp = Blueprint('posts', __name__)
 engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
 Session = sessionmaker(bind=engine)
 
+def _ingest_marker():
+    """Newest ingest position; the response cache invalidates when it moves"""
+    session = Session()
+    try:
+        return current_ingest_seq(session)
+    finally:
+        session.close()
+
+response_cache = ResponseCache(
+    generation_loader=_ingest_marker,
+    max_age_seconds=Config.RESPONSE_CACHE_MAX_AGE_SECONDS,
+    stale_seconds=Config.RESPONSE_CACHE_STALE_SECONDS,
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    list_args=('sources', 'sentiments', 'company_ids', 'tickers'),
+    coalesce_dir=Config.RESPONSE_COALESCE_DIR
+)
+ingest_bus.subscribe(response_cache.bump)
+
+# Recent posts in memory; reads it can't answer exactly go to the database
+hot_store = None
+if Config.HOT_STORE_ENABLED:
+    hot_store = HotPostStore(
+        window_hours=Config.HOT_STORE_WINDOW_HOURS,
+        company_capacity=Config.HOT_STORE_COMPANY_CAPACITY,
+        bus=ingest_bus,
+        max_feed_age_seconds=Config.HOT_STORE_MAX_FEED_AGE_SECONDS
+    )
+    ingest_bus.subscribe(hot_store.add_posts, with_position=True)
+
+window_aggregator = None
+if Config.WINDOW_AGGREGATOR_ENABLED:
+    window_aggregator = SlidingWindowAggregator(bus=ingest_bus, max_feed_age_seconds=Config.INGEST_MAX_FEED_AGE_SECONDS)
+    ingest_bus.subscribe(window_aggregator.add_posts)
+
+# Per-class concurrency limits and statement timeouts; /health is exempt
+admission = AdmissionController(
+    Config.ADMISSION_CLASSES,
+    queue_size=Config.ADMISSION_QUEUE_SIZE,
+    max_wait_seconds=Config.ADMISSION_MAX_WAIT_SECONDS
+)
+install_statement_timeouts()
+
+def posts_class(args=None):
+    """Text search and exact totals are the expensive variants of the /posts family"""
+    args = request.args if args is None else args
+    if args.get('search', '').strip() or args.get('total') == 'exact':
+        return 'heavy'
+    return 'standard'
+
+def sentiment_class(args=None):
+    """Aggregating raw posts instead of rollups is the expensive sentiment variant"""
+    args = request.args if args is None else args
+    return 'heavy' if str(args.get('exact', 'false')).lower() == 'true' else 'standard'
+
+def companies_class():
+    """sentiment_class over the parameters /sentiment/companies reads, JSON body included"""
+    body = request.get_json(silent=True) if request.method == 'POST' else None
+    # A body the view will reject with 400 is classed by the query string alone
+    return sentiment_class(batch_params(request.args, body if isinstance(body, dict) else None))
+
+class ResourceNotFound(Exception):
+    """A ticker or industry named in the request does not exist; answered with 404"""
+
+def parse_list_arg(name, args=None):
+    """Accept both repeated (?x=a&x=b) and comma-separated (?x=a,b) list parameters"""
+    args = request.args if args is None else args
+    return [v.strip() for raw in args.getlist(name) for v in raw.split(',') if v.strip()]
+
+def parse_post_filters(args=None):
+    """Parse the filter parameters shared by the /posts family of endpoints"""
+    args = request.args if args is None else args
+    return {
+        "sources": parse_list_arg('sources', args),
+        "sentiments": parse_list_arg('sentiments', args),
+        "company_ids": parse_list_arg('company_ids', args),
+        "search_query": args.get('search', '').strip(),
+        "hours_back": int(args.get('hours_back', 24)),
+    }
+
+def parse_limit(args=None):
+    args = request.args if args is None else args
+    return min(int(args.get('limit', 100)), 500)
+
+def _fetch_page(session, stmt, limit):
+    """
+    Run an ordered projection query for one page
+
+    Fetches one extra row to learn whether another page exists.
+
+    Returns:
+        Tuple of (serialized posts, next keyset cursor or None)
+    """
+    rows = session.execute(stmt.limit(limit + 1)).mappings().all()
+    posts = [serialize_post_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last['timestamp'], last['id'])
+    return posts, next_cursor
+
+def _render_posts(posts, envelope=None, next_cursor=None):
+    """
+    Encode a page of posts in the negotiated format
+
+    With ?fields= or a binary format, posts are projected and each company
+    appears once in a "companies" map keyed by id. Otherwise the original
+    shape is kept: the envelope with nested companies, or a bare list.
+    """
+    fields = parse_fields(request.args.get('fields'))
+    response_format = g.get('response_format', 'json')
+    if fields is None and response_format == 'json':
+        payload = posts if envelope is None else {**envelope, "posts": posts}
+    else:
+        projected, companies = project_posts(posts, fields)
+        payload = {**(envelope or {"next_cursor": next_cursor}), "posts": projected, "companies": companies}
+    response = encode(payload, response_format)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def _hot_posts_page(limit, filters, cursor, total_mode):
+    """A /posts page from the hot store, or None if it can't answer exactly"""
+    hot = hot_store.latest(
+        limit,
+        company_ids=filters['company_ids'],
+        sources=filters['sources'],
+        sentiments=filters['sentiments'],
+        hours_back=filters['hours_back'],
+        cursor=cursor
+    )
+    if hot is None:
+        return None
+    posts, next_cursor, ingest_seq = hot
+    page = {
+        "limit": limit,
+        "offset": 0,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "ingest_cursor": encode_ingest_cursor(ingest_seq)
+    }
+    if total_mode:
+        # The hot store counts exactly, so estimates are exact too
+        total = hot_store.count(
+            company_ids=filters['company_ids'],
+            sources=filters['sources'],
+            sentiments=filters['sentiments'],
+            hours_back=filters['hours_back']
+        )
+        if total is None:
+            return None
+        page["total"] = total
+        page["total_is_estimate"] = False
+    page["posts"] = posts
+    return page
+
+def posts_page(session, args):
+    """
+    One page of /posts under the given query parameters
+
+    Shared by the Flask view and the ASGI app, so it takes the parameters
+    and an open session rather than reading the request.
+
+    Returns:
+        The /posts envelope with its "posts" list
+
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    limit = parse_limit(args)
+    offset = int(args.get('offset', 0))
+    cursor = args.get('cursor')
+    filters = parse_post_filters(args)
+    sort = args.get('sort', 'timestamp')
+    if sort not in ('timestamp', 'relevance'):
+        raise ValueError(f"Unknown sort: {sort}")
+    total_mode = args.get('total')
+    if total_mode not in (None, 'exact', 'estimate'):
+        raise ValueError(f"Unknown total mode: {total_mode}")
+    if cursor and sort == 'relevance':
+        raise ValueError("cursor pagination requires sort=timestamp")
+    
+    if hot_store is not None and not filters['search_query'] and not offset:
+        page = _hot_posts_page(limit, filters, cursor, total_mode)
+        if page is not None:
+            return page
+    
+    dialect = session.get_bind().dialect.name
+    # Read before the page so nothing ingested in between is missed
+    ingest_cursor = encode_ingest_cursor(current_ingest_seq(session))
+    
+    # Build projection query
+    stmt = apply_post_filters(post_projection_query(), dialect, **filters)
+    
+    order_by = []
+    if filters['search_query'] and sort == 'relevance':
+        order_by.extend(search_rank_order(filters['search_query'], dialect))
+    order_by.extend(KEYSET_ORDER)
+    
+    page_stmt = stmt.order_by(*order_by)
+    if cursor:
+        page_stmt = page_stmt.where(keyset_filter(cursor))
+    elif offset:
+        page_stmt = page_stmt.offset(offset)
+    
+    posts, next_cursor = _fetch_page(session, page_stmt, limit)
+    has_more = next_cursor is not None
+    if sort != 'timestamp':
+        # Relevance order has no keyset; page it with offset
+        next_cursor = None
+    
+    # Format response
+    response = {
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "ingest_cursor": ingest_cursor
+    }
+    
+    if total_mode == 'estimate':
+        estimate = estimate_post_count(session, **filters)
+        if estimate is not None:
+            response["total"] = estimate
+            response["total_is_estimate"] = True
+        else:
+            total_mode = 'exact'
+    if total_mode == 'exact':
+        count_stmt = apply_post_filters(select(func.count(SentimentPostModel.id)), dialect, **filters)
+        response["total"] = session.execute(count_stmt).scalar()
+        response["total_is_estimate"] = False
+    
+    response["posts"] = posts
+    return response
+
 @posts_bp.route('/posts', methods=['GET'])
+@response_cache.cached
+@admission.limit(posts_class)
+@negotiated
 def get_posts():
-    """Get posts with optional filtering"""
-    try:
-        # Get and validate query parameters
-        limit = min(int(request.args.get('limit', 100)), 500)
-        offset = int(request.args.get('offset', 0))
-        sources = request.args.getlist('sources') or request.args.get('sources', '').split(',')
-        sources = [s.strip() for s in sources if s.strip()]
-        sentiments = request.args.getlist('sentiments') or request.args.get('sentiments', '').split(',')
-        sentiments = [s.strip() for s in sentiments if s.strip()]
-        company_ids = request.args.getlist('company_ids') or request.args.get('company_ids', '').split(',')
-        company_ids = [s.strip() for s in company_ids if s.strip()]
-        search_query = request.args.get('search', '').strip()
-        hours_back = int(request.args.get('hours_back', 24))
-        
-        # Create database session
+    """
+    Get posts with optional filtering
+
+    Pages are addressed by an opaque `cursor` over (timestamp, id), so deep
+    pages cost the same as the first one. `offset` is still accepted for
+    older clients. Totals are opt-in via `total=exact|estimate`.
+    `ingest_cursor` marks the ingest position the page was read at; pass it
+    to /posts/changes as `since` to fetch only what arrived afterwards.
+    `fields` and the Accept header (or `format`) select a projected JSON,
+    MessagePack or Arrow response; see _render_posts.
+    """
+    try:
         session = Session()
-        
         try:
-            # Build query
-            query = session.query(SentimentPostModel).join(SentimentPostModel.company)
-            
-            # Apply filters
-            if hours_back:
-                time_cutoff = datetime.utcnow() - timedelta(hours=hours_back)
-                query = query.filter(SentimentPostModel.timestamp >= time_cutoff)
-            
-            if sources:
-                query = query.filter(SentimentPostModel.source.in_(sources))
-            
-            if sentiments:
-                query = query.filter(SentimentPostModel.sentiment.in_(sentiments))
-            
-            if company_ids:
-                query = query.filter(SentimentPostModel.company_id.in_(company_ids))
-            
-            if search_query:
-                search_term = f"%{search_query}%"
-                query = query.filter(SentimentPostModel.content.ilike(search_term))
-            
-            # Execute query with pagination
-            total_count = query.count()
-            posts = query.order_by(SentimentPostModel.timestamp.desc())\
-                        .offset(offset)\
-                        .limit(limit)\
-                        .all()
-            
-            # Format response
-            return jsonify({
-                "posts": [post.to_dict() for post in posts],
-                "total": total_count,
-                "limit": limit,
-                "offset": offset
-            })
-            
+            page = posts_page(session, request.args)
+            posts = page.pop("posts")
+            return _render_posts(posts, envelope=page)
         finally:
             session.close()
         
@@ -80,27 +300,113 @@ def get_posts():
         logger.error(f"Error in posts endpoint: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def post_changes(session, args):
+    """
+    Posts ingested after the `since` cursor, as /posts/changes returns them
+
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    limit = parse_limit(args)
+    since = args.get('since')
+    filters = parse_post_filters(args)
+    since_seq = decode_ingest_cursor(since) if since else None
+    
+    dialect = session.get_bind().dialect.name
+    head = current_ingest_seq(session)
+    rows = []
+    if since_seq is not None and since_seq < head:
+        stmt = change_query(since_seq).where(SentimentPostModel.ingest_seq <= head)
+        stmt = apply_post_filters(stmt, dialect, **filters)
+        rows = session.execute(stmt.limit(limit + 1)).mappings().all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # A drained window jumps straight to head so filtered-out posts aren't rescanned
+    position = rows[-1]['ingest_seq'] if has_more else head
+    
+    return {
+        "fields": list(CHANGE_FIELDS),
+        "rows": [serialize_change_row(row) for row in rows],
+        "next_cursor": encode_ingest_cursor(position),
+        "has_more": has_more
+    }
+
+@posts_bp.route('/posts/changes', methods=['GET'])
+@admission.limit('standard')
+def get_post_changes():
+    """
+    Get posts ingested after an ingest cursor, for incremental refresh
+
+    Accepts the same filters as /posts plus `since` (an ingest cursor from
+    /posts or a previous call) and `limit`. Rows are compact arrays ordered
+    as "fields", oldest first. Without `since`, only the current cursor is
+    returned. When "has_more" is true, call again with "next_cursor" straight
+    away; otherwise poll with it later.
+    """
+    try:
+        session = Session()
+        try:
+            return jsonify(post_changes(session, request.args))
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in post changes request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting post changes: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@posts_bp.route('/posts/facets', methods=['GET'])
+@response_cache.cached
+@admission.limit(posts_class)
+def get_post_facets():
+    """
+    Get post counts per source, sentiment, industry and company
+
+    Takes the same filters as /posts; each facet is counted under all of
+    them except its own, and "total" under all of them. Served from the
+    rollups unless a text search is active.
+    """
+    try:
+        filters = parse_post_filters()
+        session = Session()
+        try:
+            return jsonify(facet_counts(session, **filters))
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in post facets request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting post facets: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @posts_bp.route('/posts/<post_id>', methods=['GET'])
+@admission.limit('light')
 def get_post(post_id):
     """Get a single post by ID"""
     try:
         session = Session()
         try:
-            post = session.query(SentimentPostModel)\
-                         .filter(SentimentPostModel.id == post_id)\
-                         .first()
+            stmt = post_projection_query().where(SentimentPostModel.id == uuid.UUID(post_id))
+            row = session.execute(stmt).mappings().first()
             
-            if not post:
+            if not row:
                 return jsonify({"error": "Post not found"}), 404
             
-            return jsonify(post.to_dict())
+            return jsonify(serialize_post_row(row))
         finally:
             session.close()
+    except ValueError:
+        return jsonify({"error": "Post not found"}), 404
     except Exception as e:
         logger.error(f"Error getting post {post_id}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/companies', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
 def get_companies():
     """Get all companies"""
     try:
@@ -115,19 +421,32 @@ def get_companies():
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/stats', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
 def get_stats():
-    """Get overall statistics (placeholder until database integration)"""
+    """
+    Get overall statistics
+
+    Totals by source, sentiment and industry, average confidence and unique
+    authors come from counters maintained at ingest time; posts per hour
+    for the last 24 hours come from the hour rollups. No post rows are read.
+    """
     try:
-        return jsonify({
-            "message": "Stats endpoint ready for database integration",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        session = Session()
+        try:
+            stats = get_ingest_stats(session)
+            stats["timestamp"] = datetime.utcnow().isoformat()
+            return jsonify(stats)
+        finally:
+            session.close()
         
     except Exception as e:
         logger.error(f"Error in stats endpoint: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/companies/<industry>', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
 def get_companies_by_industry(industry):
     """Get companies for a specific industry"""
     try:
@@ -141,105 +460,474 @@ def get_companies_by_industry(industry):
         logger.error(f"Error getting companies for industry {industry}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def sentiment_windows(session, series, weighting='none', company_ids=None, sources=None):
+    """
+    5m/1h/24h/7d summaries with deltas for one series
+
+    Read from the window aggregator when it tracks the series; otherwise
+    (source filters on a company or industry, while it rebuilds, or once
+    the ingest bus goes quiet) summed from the rollups.
+    """
+    if sources and series == MARKET and len(sources) == 1:
+        series = ('source', sources[0])
+    elif sources:
+        series = None
+    totals = None
+    if window_aggregator is not None and series is not None:
+        totals = window_aggregator.window_totals(*series)
+    if totals is None:
+        totals = rollup_window_totals(session, company_ids=company_ids, sources=sources)
+    return window_summaries(totals, weighting)
+
+def sentiment_summary(session, args, company_ids=None, series=MARKET):
+    """
+    Aggregate sentiment for the sentiment endpoints
+
+    Query parameters:
+        hours_back: Window size in hours (default: all retained data)
+        sources: Restrict to these sources
+        weighting: none (default), confidence or engagement
+        breakdown: 'source' to add a per-source breakdown
+        exact: 'true' to aggregate raw posts instead of rollups
+        windows: 'true' to add rolling 5m/1h/24h/7d windows with deltas
+    """
+    hours_back = int(args['hours_back']) if args.get('hours_back') else None
+    weighting = args.get('weighting', 'none')
+    breakdown = args.get('breakdown')
+    if breakdown not in (None, 'source'):
+        raise ValueError(f"Unknown breakdown: {breakdown}")
+    options = {
+        "company_ids": company_ids,
+        "sources": parse_list_arg('sources', args),
+        "hours_back": hours_back,
+        "weighting": weighting,
+        "exact": args.get('exact', 'false').lower() == 'true',
+    }
+    result = aggregate_sentiment(session, hot_store=hot_store, **options)[0]
+    if breakdown == 'source':
+        result["by_source"] = {
+            row.pop('source'): row for row in aggregate_sentiment(session, group_by=['source'], hot_store=hot_store, **options)
+        }
+    if args.get('windows', 'false').lower() == 'true':
+        result["windows"] = sentiment_windows(session, series, weighting, company_ids=company_ids, sources=options["sources"])
+    return result
+
+def company_sentiment(session, ticker, args):
+    """
+    Sentiment for one company
+
+    Raises:
+        ResourceNotFound: If the ticker is unknown
+    """
+    company = session.query(CompanyModel).filter_by(ticker=ticker.upper()).first()
+    if not company:
+        raise ResourceNotFound("Company not found")
+    return sentiment_summary(session, args, company_ids=[company.id], series=('company', company.id))
+
+def industry_sentiment(session, industry, args):
+    """Sentiment for every company in an industry; an empty summary if it has none"""
+    companies = session.query(CompanyModel.id).filter(CompanyModel.industry.has(name=industry.capitalize())).all()
+    if not companies:
+        return {"sentiment": None, "count": 0}
+    return sentiment_summary(session, args, company_ids=[c.id for c in companies], series=('industry', industry))
+
 @posts_bp.route('/sentiment/company/<ticker>', methods=['GET'])
+@response_cache.cached
+@admission.limit(sentiment_class)
 def get_company_sentiment(ticker):
     """Get average sentiment for a company by ticker"""
     try:
         session = Session()
         try:
-            company = session.query(CompanyModel).filter_by(ticker=ticker.upper()).first()
-            if not company:
-                return jsonify({"error": "Company not found"}), 404
-            posts = session.query(SentimentPostModel).filter_by(company_id=company.id).all()
-            if not posts:
-                return jsonify({"sentiment": None, "count": 0})
-            sentiments = [post.sentiment for post in posts]
-            # Map sentiment to score
-            sentiment_map = {"positive": 1, "neutral": 0, "negative": -1}
-            scores = [sentiment_map.get(s, 0) for s in sentiments]
-            avg_score = sum(scores) / len(scores)
-            return jsonify({"sentiment": avg_score, "count": len(scores)})
+            return jsonify(company_sentiment(session, ticker, request.args))
         finally:
             session.close()
+    except ResourceNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        logger.error(f"Invalid parameter in company sentiment request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
     except Exception as e:
         logger.error(f"Error getting sentiment for company {ticker}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/sentiment/industry/<industry>', methods=['GET'])
+@response_cache.cached
+@admission.limit(sentiment_class)
 def get_industry_sentiment(industry):
     """Get average sentiment for an industry"""
     try:
         session = Session()
         try:
-            companies = session.query(CompanyModel).filter(CompanyModel.industry.has(name=industry.capitalize())).all()
-            if not companies:
-                return jsonify({"sentiment": None, "count": 0})
-            company_ids = [c.id for c in companies]
-            posts = session.query(SentimentPostModel).filter(SentimentPostModel.company_id.in_(company_ids)).all()
-            if not posts:
-                return jsonify({"sentiment": None, "count": 0})
-            sentiments = [post.sentiment for post in posts]
-            sentiment_map = {"positive": 1, "neutral": 0, "negative": -1}
-            scores = [sentiment_map.get(s, 0) for s in sentiments]
-            avg_score = sum(scores) / len(scores)
-            return jsonify({"sentiment": avg_score, "count": len(scores)})
+            return jsonify(industry_sentiment(session, industry, request.args))
         finally:
             session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in industry sentiment request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
     except Exception as e:
         logger.error(f"Error getting sentiment for industry {industry}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/sentiment/market', methods=['GET'])
+@response_cache.cached
+@admission.limit(sentiment_class)
 def get_market_sentiment():
     """Get average sentiment for the entire market"""
     try:
         session = Session()
         try:
-            posts = session.query(SentimentPostModel).all()
-            if not posts:
-                return jsonify({"sentiment": None, "count": 0})
-            sentiments = [post.sentiment for post in posts]
-            sentiment_map = {"positive": 1, "neutral": 0, "negative": -1}
-            scores = [sentiment_map.get(s, 0) for s in sentiments]
-            avg_score = sum(scores) / len(scores)
-            return jsonify({"sentiment": avg_score, "count": len(scores)})
+            return jsonify(sentiment_summary(session, request.args))
         finally:
             session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in market sentiment request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
     except Exception as e:
         logger.error(f"Error getting market sentiment: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def batch_params(args, body=None):
+    """
+    Parameters for /sentiment/companies from the query string and an optional JSON body
+
+    List values may be JSON arrays or comma-separated strings.
+    """
+    params = {key: ','.join(args.getlist(key)) for key in args}
+    if body is not None:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object body")
+        for key, value in body.items():
+            params[key] = ','.join(str(v) for v in value) if isinstance(value, list) else value
+    return params
+
+def _split_param(value):
+    return [v.strip() for v in str(value or '').split(',') if v.strip()]
+
+def _companies_windows(session, company_ids, sources):
+    """Window totals by company id, from the aggregator or four grouped rollup queries"""
+    if window_aggregator is not None and window_aggregator.current and not sources:
+        tracked = {str(cid): window_aggregator.window_totals('company', cid) for cid in company_ids}
+        if all(totals is not None for totals in tracked.values()):
+            return tracked.get
+    grouped = rollup_window_totals(session, company_ids=company_ids, sources=sources, group_by_company=True)
+    return lambda company_id: {name: rows.get(company_id) or empty_totals() for name, rows in grouped.items()}
+
+def companies_sentiment(session, params):
+    """
+    Sentiment for the companies named by batch_params
+
+    Raises:
+        ValueError: If neither tickers nor industry is given, or a value is invalid
+    """
+    tickers = [t.upper() for t in _split_param(params.get('tickers'))]
+    industry = params.get('industry')
+    if not tickers and not industry:
+        raise ValueError("tickers or industry is required")
+    hours_back = int(params['hours_back']) if params.get('hours_back') else None
+    weighting = params.get('weighting', 'none')
+    exact = str(params.get('exact', 'false')).lower() == 'true'
+    
+    stmt = select(CompanyModel.id, CompanyModel.ticker, CompanyModel.name, IndustryModel.name.label('industry'))\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)
+    if tickers:
+        stmt = stmt.where(CompanyModel.ticker.in_(tickers))
+    if industry:
+        stmt = stmt.where(IndustryModel.name == industry.capitalize())
+    companies = session.execute(stmt.order_by(IndustryModel.name, CompanyModel.ticker)).all()
+    if not companies:
+        return {"companies": [], "missing": tickers}
+    
+    sources = _split_param(params.get('sources'))
+    aggregates = {
+        row['company_id']: row for row in aggregate_sentiment(
+            session,
+            company_ids=[company.id for company in companies],
+            sources=sources,
+            hours_back=hours_back,
+            group_by=['company'],
+            weighting=weighting,
+            exact=exact,
+            hot_store=hot_store
+        )
+    }
+    
+    windows = _companies_windows(session, [company.id for company in companies], sources) if str(params.get('windows', 'false')).lower() == 'true' else None
+    
+    results = []
+    for company in companies:
+        summary = aggregates.get(str(company.id)) or {"company_id": str(company.id), "sentiment": None, "count": 0}
+        summary.update({"ticker": company.ticker, "name": company.name, "industry": company.industry.lower()})
+        if windows is not None:
+            summary["windows"] = window_summaries(windows(str(company.id)), weighting)
+        results.append(summary)
+    if tickers:
+        # Keep the caller's order
+        position = {ticker: i for i, ticker in enumerate(tickers)}
+        results.sort(key=lambda result: position[result["ticker"]])
+    
+    found = {company.ticker for company in companies}
+    return {
+        "companies": results,
+        "missing": [ticker for ticker in tickers if ticker not in found]
+    }
+
+@posts_bp.route('/sentiment/companies', methods=['GET', 'POST'])
+@response_cache.cached
+@admission.limit(companies_class)
+def get_companies_sentiment():
+    """
+    Get sentiment for many companies at once
+
+    Takes `tickers` (list) or `industry`, plus hours_back, sources, weighting
+    and exact as for /sentiment/company/<ticker>, from the query string or,
+    on POST, a JSON body. All companies are aggregated by one grouped query;
+    companies without posts in the window are returned with a count of 0 and
+    unknown tickers are listed in "missing".
+    """
+    try:
+        body = request.get_json(silent=True) if request.method == 'POST' else None
+        if request.method == 'POST' and body is None:
+            raise ValueError("Expected a JSON object body")
+        params = batch_params(request.args, body)
+        
+        session = Session()
+        try:
+            return jsonify(companies_sentiment(session, params))
+        finally:
+            session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in batch company sentiment request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting batch company sentiment: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def resolve_scope(session, ticker=None, industry=None):
+    """
+    Company ids and a "scope" description for a ticker, an industry or the market (None)
+
+    Raises:
+        ResourceNotFound: If the ticker or industry is unknown
+    """
+    if ticker:
+        company = session.query(CompanyModel.id).filter_by(ticker=ticker.upper()).first()
+        if not company:
+            raise ResourceNotFound("Company not found")
+        return [company.id], {"ticker": ticker.upper()}
+    if industry:
+        company_ids = [c.id for c in session.query(CompanyModel.id).filter(CompanyModel.industry.has(name=industry.capitalize())).all()]
+        if not company_ids:
+            raise ResourceNotFound("Industry not found")
+        return company_ids, {"industry": industry.lower()}
+    return None, {"market": True}
+
+def sentiment_timeseries(session, args):
+    """
+    Bucketed sentiment series as /sentiment/timeseries returns it
+
+    Raises:
+        ValueError: If a parameter is invalid
+        ResourceNotFound: If the ticker or industry is unknown
+    """
+    ticker = args.get('ticker')
+    industry = args.get('industry')
+    hours_back = int(args.get('hours_back', 24))
+    bucket = args.get('bucket', '1h')
+    bucket_seconds = parse_bucket(bucket)
+    moving_average = int(args.get('ma', 0))
+    max_points = min(int(args.get('max_points', 500)), 2000)
+    if hours_back <= 0 or moving_average < 0 or max_points < 3:
+        raise ValueError("hours_back, ma and max_points must be positive")
+    
+    company_ids, scope = resolve_scope(session, ticker, industry)
+    
+    series = build_timeseries(
+        session,
+        company_ids=company_ids,
+        sources=parse_list_arg('sources', args),
+        hours_back=hours_back,
+        bucket_seconds=bucket_seconds,
+        weighting=args.get('weighting', 'none'),
+        moving_average=moving_average,
+        max_points=max_points
+    )
+    return {
+        "scope": scope,
+        "hours_back": hours_back,
+        "bucket": bucket,
+        **series
+    }
+
+@posts_bp.route('/sentiment/timeseries', methods=['GET'])
+@response_cache.cached
+@admission.limit('standard')
+def get_sentiment_timeseries():
+    """
+    Get a bucketed sentiment time series for a ticker, an industry or the market
+
+    Query parameters:
+        ticker / industry: Scope (omit both for the whole market)
+        hours_back: Window size in hours (default: 24)
+        bucket: Bucket size such as 5m, 1h or 1d (default: 1h)
+        ma: Trailing moving average length in buckets (default: 0, off)
+        max_points: LTTB downsampling cap (default: 500, max: 2000)
+        weighting / sources: As for the other sentiment endpoints
+    """
+    try:
+        session = Session()
+        try:
+            return jsonify(sentiment_timeseries(session, request.args))
+        finally:
+            session.close()
+    except ResourceNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        logger.error(f"Invalid parameter in timeseries request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error building sentiment timeseries: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def sentiment_distribution(session, args):
+    """
+    Percentiles and unique authors as /sentiment/distribution returns them
+
+    Raises:
+        ValueError: If a parameter is invalid
+        ResourceNotFound: If the ticker or industry is unknown
+    """
+    hours_back = int(args.get('hours_back', 24))
+    if hours_back <= 0:
+        raise ValueError("hours_back must be positive")
+    percentiles = [float(p) for p in parse_list_arg('percentiles', args)] or [50, 90, 99]
+    if any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError(f"Percentiles out of range: {percentiles}")
+    by_company = args.get('by_company', 'false').lower() == 'true'
+    company_ids, scope = resolve_scope(session, args.get('ticker'), args.get('industry'))
+    
+    since = bucket_start(datetime.utcnow() - timedelta(hours=hours_back), 'hour')
+    result = {
+        "scope": scope,
+        "hours_back": hours_back,
+        "since": since.isoformat(),
+        **merge_sketches(session, company_ids=company_ids, since=since).summary(percentiles),
+        "accuracy": sketch_accuracy()
+    }
+    if by_company:
+        merged = merge_sketches(session, company_ids=company_ids, since=since, group_by_company=True)
+        query = session.query(CompanyModel.id, CompanyModel.ticker)
+        if company_ids:
+            query = query.filter(CompanyModel.id.in_(company_ids))
+        result["companies"] = [
+            {"ticker": company.ticker, "company_id": str(company.id),
+             **merged.get(str(company.id), SketchSet()).summary(percentiles)}
+            for company in query.order_by(CompanyModel.ticker)
+        ]
+    return result
+
+@posts_bp.route('/sentiment/distribution', methods=['GET'])
+@response_cache.cached
+@admission.limit('standard')
+def get_sentiment_distribution():
+    """
+    Get confidence and engagement percentiles and unique authors for a ticker, an industry or the market
+
+    Answered by merging hourly sketches, so the window starts at the top of
+    the hour hours_back ago.
+
+    Query parameters:
+        ticker / industry: Scope (omit both for the whole market)
+        hours_back: Window size in hours (default: 24)
+        percentiles: Comma-separated percentiles (default: 50,90,99)
+        by_company: Also break the figures down per company (default: false)
+    """
+    try:
+        session = Session()
+        try:
+            return jsonify(sentiment_distribution(session, request.args))
+        finally:
+            session.close()
+    except ResourceNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        logger.error(f"Invalid parameter in distribution request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error building sentiment distribution: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @posts_bp.route('/posts/company/<ticker>', methods=['GET'])
+@response_cache.cached
+@admission.limit('standard')
+@negotiated
 def get_posts_by_company(ticker):
-    """Get posts for a specific company by ticker"""
+    """
+    Get posts for a specific company by ticker
+
+    Returns at most `limit` posts (default 100, max 500); pass the
+    X-Next-Cursor response header back as `cursor` for the next page.
+    """
     try:
+        limit = parse_limit()
+        cursor = request.args.get('cursor')
+        hot = hot_store.latest(limit, ticker=ticker, cursor=cursor) if hot_store is not None else None
+        if hot is not None:
+            posts, next_cursor, _ = hot
+            return _render_posts(posts, next_cursor=next_cursor)
+        
         session = Session()
         try:
-            company = session.query(CompanyModel).filter_by(ticker=ticker.upper()).first()
-            if not company:
+            stmt = post_projection_query()\
+                .where(CompanyModel.ticker == ticker.upper())\
+                .order_by(*KEYSET_ORDER)
+            if cursor:
+                stmt = stmt.where(keyset_filter(cursor))
+            posts, next_cursor = _fetch_page(session, stmt, limit)
+            if not posts and not session.query(CompanyModel.id).filter_by(ticker=ticker.upper()).first():
                 return jsonify({"error": "Company not found"}), 404
-            posts = session.query(SentimentPostModel).filter_by(company_id=company.id).order_by(SentimentPostModel.timestamp.desc()).all()
-            return jsonify([post.to_dict() for post in posts])
+            return _render_posts(posts, next_cursor=next_cursor)
         finally:
             session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in company posts request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
     except Exception as e:
         logger.error(f"Error getting posts for company {ticker}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @posts_bp.route('/posts/industry/<industry>', methods=['GET'])
+@response_cache.cached
+@admission.limit('standard')
+@negotiated
 def get_posts_by_industry(industry):
-    """Get posts for a specific industry"""
+    """
+    Get posts for a specific industry
+
+    Paged the same way as /posts/company/<ticker>.
+    """
     try:
+        limit = parse_limit()
+        cursor = request.args.get('cursor')
+        hot = hot_store.latest(limit, industry=industry, cursor=cursor) if hot_store is not None else None
+        if hot is not None:
+            posts, next_cursor, _ = hot
+            return _render_posts(posts, next_cursor=next_cursor)
+        
         session = Session()
         try:
-            companies = session.query(CompanyModel).filter(CompanyModel.industry.has(name=industry.capitalize())).all()
-            if not companies:
-                return jsonify([])
-            company_ids = [c.id for c in companies]
-            posts = session.query(SentimentPostModel).filter(SentimentPostModel.company_id.in_(company_ids)).order_by(SentimentPostModel.timestamp.desc()).all()
-            return jsonify([post.to_dict() for post in posts])
+            stmt = post_projection_query()\
+                .where(industry_filter(industry))\
+                .order_by(*KEYSET_ORDER)
+            if cursor:
+                stmt = stmt.where(keyset_filter(cursor))
+            posts, next_cursor = _fetch_page(session, stmt, limit)
+            return _render_posts(posts, next_cursor=next_cursor)
         finally:
             session.close()
+    except ValueError as e:
+        logger.error(f"Invalid parameter in industry posts request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
     except Exception as e:
         logger.error(f"Error getting posts for industry {industry}: {e}")
-        return jsonify({"error": "Internal server error"}), 500 
\ No newline at end of file
+        return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,122 @@
+from flask import Blueprint, jsonify, request
+import logging
+
+from models.models import CompanyModel
+from routes.posts import Session, admission, parse_list_arg, response_cache
+from services.ingest_bus import ingest_bus
+from services.sentiment_index import DecayedSentimentIndex
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+index_bp = Blueprint('sentiment_index', __name__)
+
+sentiment_index = DecayedSentimentIndex(
+    half_life_hours=Config.SENTIMENT_INDEX_HALF_LIFE_HOURS,
+    bus=ingest_bus,
+    max_feed_age_seconds=Config.INGEST_MAX_FEED_AGE_SECONDS
+)
+ingest_bus.subscribe(sentiment_index.add_posts)
+
+def _loading():
+    response = jsonify({"error": "Sentiment index is loading or catching up"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@index_bp.route('/sentiment/index', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
+def get_market_index():
+    """
+    Get the time-decayed sentiment index for the whole market
+
+    Posts count in proportion to confidence and (1 + engagement), and their
+    weight halves every SENTIMENT_INDEX_HALF_LIFE_HOURS.
+    """
+    try:
+        result = sentiment_index.get('market')
+        return _loading() if result is None else jsonify(result)
+    except Exception as e:
+        logger.error(f"Error getting market sentiment index: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@index_bp.route('/sentiment/index/company/<ticker>', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
+def get_company_index(ticker):
+    """Get the time-decayed sentiment index for a company by ticker"""
+    try:
+        session = Session()
+        try:
+            company = session.query(CompanyModel).filter_by(ticker=ticker.upper()).first()
+        finally:
+            session.close()
+        if not company:
+            return jsonify({"error": "Company not found"}), 404
+        result = sentiment_index.get('company', company.id)
+        if result is None:
+            return _loading()
+        result.update({"ticker": company.ticker, "company_id": str(company.id)})
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error getting sentiment index for company {ticker}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@index_bp.route('/sentiment/index/industry/<industry>', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
+def get_industry_index(industry):
+    """Get the time-decayed sentiment index for an industry"""
+    try:
+        result = sentiment_index.get('industry', industry)
+        if result is None:
+            return _loading()
+        result["industry"] = industry.lower()
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error getting sentiment index for industry {industry}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@index_bp.route('/sentiment/index/companies', methods=['GET'])
+@response_cache.cached
+@admission.limit('light')
+def get_companies_index():
+    """
+    Get the time-decayed sentiment index for many companies
+
+    Query parameters:
+        tickers: Comma-separated tickers (default: every company)
+        sort: 'ticker' (default) or 'index' (highest first; companies without posts last)
+    """
+    try:
+        tickers = [t.upper() for t in parse_list_arg('tickers')]
+        sort = request.args.get('sort', 'ticker')
+        if sort not in ('ticker', 'index'):
+            raise ValueError(f"Unknown sort: {sort}")
+        session = Session()
+        try:
+            query = session.query(CompanyModel.id, CompanyModel.ticker)
+            if tickers:
+                query = query.filter(CompanyModel.ticker.in_(tickers))
+            companies = query.order_by(CompanyModel.ticker).all()
+        finally:
+            session.close()
+
+        indexes = sentiment_index.get_many('company', [company.id for company in companies])
+        if indexes is None:
+            return _loading()
+        results = [{"ticker": company.ticker, "company_id": str(company.id), **indexes[str(company.id)]} for company in companies]
+        if sort == 'index':
+            results.sort(key=lambda result: (result["index"] is None, -(result["index"] or 0)))
+        found = {company.ticker for company in companies}
+        return jsonify({
+            "companies": results,
+            "missing": [ticker for ticker in tickers if ticker not in found]
+        })
+    except ValueError as e:
+        logger.error(f"Invalid parameter in companies sentiment index request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting companies sentiment index: {e}")
+        return jsonify({"error": "Internal server error"}), 500
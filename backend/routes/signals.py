@@ -0,0 +1,78 @@
+from flask import Blueprint, jsonify, request
+import logging
+
+from routes.posts import Session, admission, parse_list_arg
+from routes.stream import broadcaster
+from services.anomaly_detector import AnomalyDetector, last_signal_id, query_signals
+from services.ingest_bus import ingest_bus
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+signals_bp = Blueprint('signals', __name__)
+
+anomaly_detector = AnomalyDetector(
+    bucket_minutes=Config.SIGNAL_BUCKET_MINUTES,
+    alpha=Config.SIGNAL_EWMA_ALPHA,
+    z_threshold=Config.SIGNAL_Z_THRESHOLD,
+    warmup_buckets=Config.SIGNAL_WARMUP_BUCKETS,
+    lateness_seconds=Config.SIGNAL_LATENESS_SECONDS,
+    min_sentiment_posts=Config.SIGNAL_MIN_SENTIMENT_POSTS,
+    bus=ingest_bus,
+    max_feed_age_seconds=Config.INGEST_MAX_FEED_AGE_SECONDS
+)
+ingest_bus.subscribe(anomaly_detector.add_posts)
+anomaly_detector.listeners.append(broadcaster.publish_signals)
+
+@signals_bp.route('/signals/anomalies', methods=['GET'])
+@admission.limit('light')
+def get_anomalies():
+    """
+    Get recent volume and sentiment anomalies
+
+    Query parameters (all optional):
+        tickers, sources, metrics (volume, sentiment), kinds (spike, shift): comma-separated filters
+        since_id: Only signals after this id, oldest first; pass back last_id to poll as a feed
+        limit: Maximum signals (default 100, max 1000)
+
+    Without since_id, the newest signals come first. Signals are read from
+    anomaly_signals, so every worker serves the same feed.
+    """
+    try:
+        feed = 'since_id' in request.args
+        since_id = int(request.args.get('since_id', 0))
+        limit = int(request.args.get('limit', 100))
+        if limit < 1 or limit > 1000:
+            raise ValueError(f"limit out of range: {limit}")
+        session = Session()
+        try:
+            # Read before the signals so a poll from last_id never skips one
+            last_id = last_signal_id(session)
+            signals = query_signals(
+                session,
+                since_id=since_id,
+                tickers=[t.upper() for t in parse_list_arg('tickers')],
+                sources=parse_list_arg('sources'),
+                metrics=parse_list_arg('metrics'),
+                kinds=parse_list_arg('kinds'),
+                limit=limit,
+                oldest_first=feed
+            )
+        finally:
+            session.close()
+        if feed and len(signals) == limit:
+            # Truncated page: resume right after the last signal returned
+            last_id = signals[-1]["id"]
+        else:
+            last_id = max([last_id, since_id] + [signal["id"] for signal in signals])
+        return jsonify({
+            "signals": signals,
+            "last_id": last_id,
+            "warming_up": not anomaly_detector.ready
+        })
+    except ValueError as e:
+        logger.error(f"Invalid parameter in anomalies request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting anomalies: {e}")
+        return jsonify({"error": "Internal server error"}), 500
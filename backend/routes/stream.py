@@ -0,0 +1,81 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import logging
+import queue
+from typing import List, Dict, Any
+
+from routes.posts import Session, parse_list_arg, hot_store
+from services.aggregation_service import aggregate_sentiment
+from services.ingest_bus import ingest_bus
+from services.live_stream import LiveStreamBroadcaster, format_sse
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+stream_bp = Blueprint('stream', __name__)
+
+def _load_company_aggregates(company_ids: List[str]) -> List[Dict[str, Any]]:
+    """Last-24h aggregates for the companies touched by an ingest batch"""
+    session = Session()
+    try:
+        return aggregate_sentiment(session, company_ids=company_ids, group_by=['company', 'industry'], hours_back=24, hot_store=hot_store)
+    finally:
+        session.close()
+
+broadcaster = LiveStreamBroadcaster(
+    buffer_size=Config.LIVE_STREAM_BUFFER_SIZE,
+    max_subscribers=Config.LIVE_STREAM_MAX_CLIENTS,
+    aggregate_loader=_load_company_aggregates
+)
+ingest_bus.subscribe(broadcaster.publish_posts)
+
+@stream_bp.route('/stream/posts', methods=['GET'])
+def stream_posts():
+    """
+    Server-Sent Events stream of newly ingested posts and refreshed aggregates
+
+    Query parameters (all optional, comma-separated):
+        tickers, industries, sources, sentiments
+
+    Events:
+        post: One newly stored post (same shape as /posts entries plus "industry" and "ingest_seq")
+        aggregates: Last-24h sentiment for the companies touched by a batch
+        anomaly: A volume or sentiment signal from /signals/anomalies
+        evicted: Sent before closing when the client fell too far behind
+    """
+    # A server that isn't multithreaded (e.g. Gunicorn sync workers) gives each
+    # stream a whole worker for as long as the client stays connected
+    limit = None if request.environ.get('wsgi.multithread') else Config.LIVE_STREAM_MAX_SYNC_CLIENTS
+    subscription = broadcaster.subscribe(
+        limit=limit,
+        tickers=parse_list_arg('tickers'),
+        industries=parse_list_arg('industries'),
+        sources=parse_list_arg('sources'),
+        sentiments=parse_list_arg('sentiments')
+    )
+    if subscription is None:
+        if limit is not None:
+            logger.warning("Refused live stream on a single-threaded worker; serve /stream/posts through asgi:app")
+        response = jsonify({"error": "Too many live subscribers"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    heartbeat = Config.LIVE_STREAM_HEARTBEAT_SECONDS
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while not subscription.evicted:
+                try:
+                    yield subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+            yield format_sse('evicted', {"reason": "slow consumer"})
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
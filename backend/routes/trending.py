@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify, request
+import logging
+
+from routes.posts import admission, parse_list_arg
+from services.trending_service import TRENDING_DIMENSIONS, TRENDING_WINDOWS, TrendingTracker
+
+logger = logging.getLogger(__name__)
+
+trending_bp = Blueprint('trending', __name__)
+
+trending_tracker = TrendingTracker()
+
+@trending_bp.route('/trending', methods=['GET'])
+@admission.limit('light')
+def get_trending():
+    """
+    Get the most mentioned cashtags, most active authors and most used terms
+
+    Served from a snapshot every API process rebuilds each
+    TRENDING_REFRESH_SECONDS from the ingest workers' sketches.
+
+    Query parameters (all optional):
+        window: '1h' (default) or '24h'
+        dimensions: Comma-separated subset of cashtags, authors, terms (default: all)
+        limit: Items per dimension (default 20, max 50)
+    """
+    try:
+        window = request.args.get('window', '1h')
+        if window not in TRENDING_WINDOWS:
+            raise ValueError(f"Unknown window: {window}")
+        dimensions = parse_list_arg('dimensions') or list(TRENDING_DIMENSIONS)
+        unknown = [dimension for dimension in dimensions if dimension not in TRENDING_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {unknown}")
+        limit = int(request.args.get('limit', 20))
+        if limit < 1 or limit > trending_tracker.limit:
+            raise ValueError(f"limit out of range: {limit}")
+
+        snapshot = trending_tracker.get(window)
+        if snapshot is None:
+            response = jsonify({"error": "Trending is loading"})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        result = {key: snapshot[key] for key in ('window', 'since', 'as_of')}
+        for dimension in dimensions:
+            result[dimension] = {**snapshot[dimension], "items": snapshot[dimension]["items"][:limit]}
+        return jsonify(result)
+    except ValueError as e:
+        logger.error(f"Invalid parameter in trending request: {e}")
+        return jsonify({"error": "Invalid parameter provided"}), 400
+    except Exception as e:
+        logger.error(f"Error getting trending: {e}")
+        return jsonify({"error": "Internal server error"}), 500
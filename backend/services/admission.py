@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import math
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL SQLSTATE for a statement cancelled by statement_timeout
+_QUERY_CANCELED = '57014'
+
+class Overloaded(Exception):
+    """An endpoint class has no free slot within the queueing deadline; answered with 503"""
+
+    def __init__(self, endpoint_class: str, retry_after: int):
+        super().__init__(f"{endpoint_class} endpoints overloaded")
+        self.endpoint_class = endpoint_class
+        self.retry_after = retry_after
+
+class BudgetExceeded(Exception):
+    """A query ran past the request's statement timeout; answered with 504"""
+
+class Budget:
+    """Statement timeout for the current request, and whether a query hit it"""
+    __slots__ = ('timeout_ms', 'exceeded')
+
+    def __init__(self, timeout_ms: int):
+        self.timeout_ms = timeout_ms
+        self.exceeded = False
+
+_current_budget: "contextvars.ContextVar[Optional[Budget]]" = contextvars.ContextVar('statement_budget', default=None)
+
+@contextlib.contextmanager
+def statement_budget(timeout_ms: int) -> Iterator[Budget]:
+    """Apply timeout_ms to every transaction begun in this context (thread or task)"""
+    budget = Budget(timeout_ms)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+def _apply_statement_timeout(session, transaction, connection) -> None:
+    budget = _current_budget.get()
+    if budget and budget.timeout_ms and connection.dialect.name == 'postgresql':
+        # SET LOCAL ends with the transaction, so pooled connections come back clean
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(budget.timeout_ms)}")
+
+def _note_query_canceled(context) -> None:
+    budget = _current_budget.get()
+    error = context.original_exception
+    if budget is not None and _QUERY_CANCELED in (getattr(error, 'pgcode', None), getattr(error, 'sqlstate', None)):
+        budget.exceeded = True
+
+_installed = False
+
+def install_statement_timeouts() -> None:
+    """Hook statement budgets into every Session and engine (idempotent)"""
+    global _installed
+    if not _installed:
+        event.listen(Session, 'after_begin', _apply_statement_timeout)
+        event.listen(Engine, 'handle_error', _note_query_canceled)
+        _installed = True
+
+class _EndpointClass:
+    def __init__(self, name: str, concurrency: int, statement_timeout_ms: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.statement_timeout_ms = statement_timeout_ms
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.waiting = 0
+        self.rejected = 0
+
+class AdmissionController:
+    """
+    Bounded concurrency per endpoint class, with load shedding
+
+    Each class (e.g. light, standard, heavy, export) has its own pool of
+    slots, so cheap requests never queue behind expensive ones. A request
+    waits at most max_wait_seconds for a slot, and only queue_size requests
+    may wait per class; beyond that it is shed with 503 and Retry-After
+    instead of piling up. Admitted requests run under the class's
+    PostgreSQL statement_timeout.
+
+    Args:
+        classes: Class name to {"concurrency": int, "statement_timeout_ms": int}
+    """
+
+    def __init__(self, classes: Dict[str, Dict[str, int]], queue_size: int = 64, max_wait_seconds: float = 2.0):
+        self.classes = {
+            name: _EndpointClass(name, options['concurrency'], options.get('statement_timeout_ms', 0))
+            for name, options in classes.items()
+        }
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.max_wait_seconds))
+
+    def acquire(self, name: str) -> None:
+        """
+        Take a slot in an endpoint class, waiting up to max_wait_seconds
+
+        Raises:
+            Overloaded: If the queue is full or no slot frees up in time
+        """
+        endpoint_class = self.classes[name]
+        if endpoint_class.semaphore.acquire(blocking=False):
+            return
+        with self._lock:
+            if endpoint_class.waiting >= self.queue_size:
+                endpoint_class.rejected += 1
+                raise Overloaded(name, self.retry_after)
+            endpoint_class.waiting += 1
+        try:
+            acquired = endpoint_class.semaphore.acquire(timeout=self.max_wait_seconds)
+        finally:
+            with self._lock:
+                endpoint_class.waiting -= 1
+        if not acquired:
+            with self._lock:
+                endpoint_class.rejected += 1
+            raise Overloaded(name, self.retry_after)
+
+    def release(self, name: str) -> None:
+        self.classes[name].semaphore.release()
+
+    def budget(self, name: str):
+        return statement_budget(self.classes[name].statement_timeout_ms)
+
+    def overloaded_response(self, error: Overloaded):
+        response = jsonify({"error": "Server busy, retry later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    def limit(self, endpoint_class: Union[str, Callable[[], str]]):
+        """
+        Decorator admitting a Flask view through an endpoint class
+
+        endpoint_class may be a callable that picks the class from the
+        request, for endpoints whose cost depends on their parameters.
+        """
+        def decorator(view: Callable) -> Callable:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                name = endpoint_class() if callable(endpoint_class) else endpoint_class
+                try:
+                    self.acquire(name)
+                except Overloaded as e:
+                    logger.warning(f"Shedding request: {e}")
+                    return self.overloaded_response(e)
+                try:
+                    with self.budget(name) as budget:
+                        response = view(*args, **kwargs)
+                    if budget.exceeded:
+                        logger.warning(f"Request exceeded its {budget.timeout_ms}ms statement budget")
+                        response = jsonify({"error": "Request took too long"})
+                        response.status_code = 504
+                    return response
+                finally:
+                    self.release(name)
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"concurrency": c.concurrency, "waiting": c.waiting, "rejected": c.rejected}
+            for name, c in self.classes.items()
+        }
+
+class AsyncAdmissionController(AdmissionController):
+    """AdmissionController for coroutines: the same classes and limits on asyncio semaphores"""
+
+    def __init__(self, classes: Dict[str, Dict[str, int]], queue_size: int = 64, max_wait_seconds: float = 2.0):
+        super().__init__(classes, queue_size=queue_size, max_wait_seconds=max_wait_seconds)
+        self._semaphores = {name: asyncio.Semaphore(c.concurrency) for name, c in self.classes.items()}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, name: str):
+        """
+        Hold a slot and the class's statement budget for the body
+
+        Raises:
+            Overloaded: If the queue is full or no slot frees up in time
+            BudgetExceeded: If a query in the body hit the statement timeout
+        """
+        endpoint_class = self.classes[name]
+        semaphore = self._semaphores[name]
+        if semaphore.locked():
+            if endpoint_class.waiting >= self.queue_size:
+                endpoint_class.rejected += 1
+                raise Overloaded(name, self.retry_after)
+            endpoint_class.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                endpoint_class.rejected += 1
+                raise Overloaded(name, self.retry_after)
+            finally:
+                endpoint_class.waiting -= 1
+        else:
+            await semaphore.acquire()
+        try:
+            with statement_budget(endpoint_class.statement_timeout_ms) as budget:
+                try:
+                    yield budget
+                except Exception as e:
+                    if budget.exceeded:
+                        raise BudgetExceeded(str(e)) from e
+                    raise
+        finally:
+            semaphore.release()
@@ -0,0 +1,181 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Iterator
+
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+from models.models import SentimentPostModel, SentimentRollupModel, CompanyModel, IndustryModel
+from services.rollup_service import rollup_totals_query, as_uuid
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY_OPTIONS = ('company', 'source', 'industry')
+WEIGHTING_OPTIONS = ('none', 'confidence', 'engagement')
+
+def _group_columns(group_by: List[str], company_column, source_column) -> List:
+    columns = []
+    for group in group_by:
+        if group == 'company':
+            columns.extend([company_column.label('company_id'), CompanyModel.ticker.label('ticker')])
+        elif group == 'source':
+            columns.append(source_column.label('source'))
+        elif group == 'industry':
+            columns.append(IndustryModel.name.label('industry'))
+        else:
+            raise ValueError(f"Unknown group_by: {group}")
+    return columns
+
+def _join_dimensions(stmt, group_by: List[str], company_column):
+    if 'company' in group_by or 'industry' in group_by:
+        stmt = stmt.join(CompanyModel, CompanyModel.id == company_column)
+    if 'industry' in group_by:
+        stmt = stmt.join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)
+    return stmt
+
+def posts_aggregate_query(company_ids: Optional[List] = None,
+                          sources: Optional[List[str]] = None,
+                          hours_back: Optional[int] = None,
+                          group_by: Optional[List[str]] = None):
+    """
+    GROUP BY over sentiment_posts computing the same sums the rollups hold
+
+    The database does the counting and summing; only one row per group comes
+    back to Python.
+    """
+    group_by = group_by or []
+    post = SentimentPostModel
+    score = case((post.sentiment == 'positive', 1), (post.sentiment == 'negative', -1), else_=0)
+    engagement = func.coalesce(post.engagement, 0)
+
+    group_columns = _group_columns(group_by, post.company_id, post.source)
+    stmt = select(
+        *group_columns,
+        func.count(post.id).label('post_count'),
+        func.coalesce(func.sum(case((post.sentiment == 'positive', 1), else_=0)), 0).label('positive_count'),
+        func.coalesce(func.sum(case((post.sentiment == 'neutral', 1), else_=0)), 0).label('neutral_count'),
+        func.coalesce(func.sum(case((post.sentiment == 'negative', 1), else_=0)), 0).label('negative_count'),
+        func.coalesce(func.sum(post.confidence), 0).label('confidence_sum'),
+        func.coalesce(func.sum(engagement), 0).label('engagement_sum'),
+        func.coalesce(func.sum(score * post.confidence), 0).label('score_confidence_sum'),
+        func.coalesce(func.sum(score * engagement), 0).label('score_engagement_sum'),
+    ).select_from(post)
+    stmt = _join_dimensions(stmt, group_by, post.company_id)
+
+    if company_ids:
+        stmt = stmt.where(post.company_id.in_([as_uuid(cid) for cid in company_ids]))
+    if sources:
+        stmt = stmt.where(post.source.in_(sources))
+    if hours_back:
+        stmt = stmt.where(post.timestamp >= datetime.utcnow() - timedelta(hours=hours_back))
+    if group_columns:
+        stmt = stmt.group_by(*group_columns)
+    return stmt
+
+def rollups_aggregate_query(company_ids: Optional[List] = None,
+                            sources: Optional[List[str]] = None,
+                            hours_back: Optional[int] = None,
+                            group_by: Optional[List[str]] = None):
+    """Same result shape as posts_aggregate_query, summed from the rollup tables"""
+    group_by = group_by or []
+    rollup = SentimentRollupModel
+    since = datetime.utcnow() - timedelta(hours=hours_back) if hours_back else None
+
+    stmt = rollup_totals_query(company_ids=company_ids, sources=sources, since=since)
+    group_columns = _group_columns(group_by, rollup.company_id, rollup.source)
+    if group_columns:
+        stmt = stmt.add_columns(*group_columns).group_by(*group_columns)
+        stmt = _join_dimensions(stmt.select_from(rollup), group_by, rollup.company_id)
+    return stmt
+
+def summarize(totals: Dict[str, Any], weighting: str = 'none') -> Dict[str, Any]:
+    """
+    Turn a row of sums into sentiment scores
+
+    Scores map positive/neutral/negative to +1/0/-1. Confidence weighting uses
+    each post's confidence; engagement weighting uses (1 + engagement) so posts
+    without likes or comments still count.
+    """
+    count = int(totals.get('post_count') or 0)
+    summary = {key: totals[key] for key in ('company_id', 'ticker', 'source', 'industry') if key in totals}
+    if 'company_id' in summary:
+        summary['company_id'] = str(summary['company_id'])
+
+    if not count:
+        summary.update({"sentiment": None, "count": 0})
+        return summary
+
+    positive = int(totals['positive_count'])
+    negative = int(totals['negative_count'])
+    confidence_sum = float(totals['confidence_sum'])
+    engagement_sum = int(totals['engagement_sum'])
+
+    scores = {
+        'none': (positive - negative) / count,
+        'confidence': float(totals['score_confidence_sum']) / confidence_sum if confidence_sum else None,
+        'engagement': (positive - negative + float(totals['score_engagement_sum'])) / (count + engagement_sum),
+    }
+    summary.update({
+        "sentiment": scores[weighting],
+        "count": count,
+        "mean_score": scores['none'],
+        "confidence_weighted_score": scores['confidence'],
+        "engagement_weighted_score": scores['engagement'],
+        "positive": positive,
+        "neutral": int(totals['neutral_count']),
+        "negative": negative,
+        "avg_confidence": confidence_sum / count,
+        "total_engagement": engagement_sum,
+    })
+    return summary
+
+def iter_aggregates(session: Session, stmt, stream: bool = False, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Execute an aggregate query, optionally through a server-side cursor
+
+    Streaming keeps memory flat for wide breakdowns (e.g. every company by
+    every source) instead of materializing the whole result.
+    """
+    if stream:
+        stmt = stmt.execution_options(stream_results=True, yield_per=batch_size)
+    for row in session.execute(stmt).mappings():
+        yield dict(row)
+
+def aggregate_sentiment(session: Session,
+                        company_ids: Optional[List] = None,
+                        sources: Optional[List[str]] = None,
+                        hours_back: Optional[int] = None,
+                        group_by: Optional[List[str]] = None,
+                        weighting: str = 'none',
+                        exact: bool = False,
+                        stream: bool = False,
+                        hot_store=None) -> List[Dict[str, Any]]:
+    """
+    Aggregate sentiment for a set of companies and sources
+
+    Args:
+        session: Database session
+        company_ids: Restrict to these companies (None for the whole market)
+        sources: Restrict to these sources
+        hours_back: Only include posts from the last N hours (None for all retained data)
+        group_by: Any of 'company', 'source', 'industry'
+        weighting: Which score fills "sentiment": 'none', 'confidence' or 'engagement'
+        exact: Aggregate raw posts instead of rollups (second- rather than minute-precise windows)
+        stream: Read results through a server-side cursor
+        hot_store: HotPostStore to answer from when it holds the whole window
+            (exact to the second either way)
+
+    Returns:
+        One summary dict per group (a single dict in a list when ungrouped)
+    """
+    if weighting not in WEIGHTING_OPTIONS:
+        raise ValueError(f"Unknown weighting: {weighting}")
+
+    if hot_store is not None and hours_back:
+        totals = hot_store.aggregate_totals(company_ids=company_ids, sources=sources, hours_back=hours_back, group_by=group_by)
+        if totals is not None:
+            return [summarize(row, weighting) for row in totals]
+
+    build_query = posts_aggregate_query if exact else rollups_aggregate_query
+    stmt = build_query(company_ids=company_ids, sources=sources, hours_back=hours_back, group_by=group_by)
+    return [summarize(row, weighting) for row in iter_aggregates(session, stmt, stream=stream)]
@@ -0,0 +1,372 @@
+import json
+import logging
+import operator
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.models import AlertRuleModel
+from services.window_aggregator import SLIDING_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+# Per-post fields a post rule may compare
+POST_FIELDS = ('engagement', 'confidence')
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+def _number(value, name: str, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+
+def _share(column: str):
+    return lambda totals: totals[column] / totals['post_count']
+
+# Window metrics computed from rollup-shaped totals with at least one post
+WINDOW_METRICS = {
+    'post_count': lambda totals: totals['post_count'],
+    'positive_share': _share('positive_count'),
+    'neutral_share': _share('neutral_count'),
+    'negative_share': _share('negative_count'),
+    'sentiment': lambda totals: (totals['positive_count'] - totals['negative_count']) / totals['post_count'],
+    'avg_confidence': lambda totals: totals['confidence_sum'] / totals['post_count'],
+}
+
+class AlertRule:
+    """
+    A validated alert rule
+
+    Post rules ({"type": "post", "field", "op", "value", optional
+    "sentiment"}) fire once per matching post. Window rules ({"type":
+    "window", "metric", "window", "op", "value", optional "min_posts"}) fire
+    when a sliding-window metric of their series starts meeting the
+    condition, at most once per cooldown, and re-arm once it stops. A window
+    rule is scoped to at most one of ticker, industry and source (none means
+    the whole market); post rules may combine them.
+
+    Raises:
+        ValueError: if any part of the rule is invalid
+    """
+
+    def __init__(self,
+                 id,
+                 name: str,
+                 webhook_url: str,
+                 condition: Dict[str, Any],
+                 ticker: Optional[str] = None,
+                 industry: Optional[str] = None,
+                 source: Optional[str] = None,
+                 cooldown_seconds: int = 3600):
+        if not name:
+            raise ValueError("name is required")
+        url = urlparse(webhook_url or '')
+        if url.scheme not in ('http', 'https') or not url.netloc:
+            raise ValueError(f"Invalid webhook_url: {webhook_url}")
+        if not isinstance(condition, dict):
+            raise ValueError("condition must be an object")
+        cooldown_seconds = _number(cooldown_seconds, 'cooldown_seconds', int)
+        if cooldown_seconds < 1:
+            raise ValueError("cooldown_seconds must be positive")
+
+        self.id = id
+        self.name = name
+        self.webhook_url = webhook_url
+        self.ticker = ticker.upper() if ticker else None
+        self.industry = industry.lower() if industry else None
+        self.source = source or None
+        self.cooldown_seconds = cooldown_seconds
+        self.type = condition.get('type')
+        if condition.get('op') not in OPERATORS:
+            raise ValueError(f"Unknown op: {condition.get('op')}")
+        self.op = condition['op']
+        self.value = _number(condition.get('value'), 'value')
+
+        if self.type == 'post':
+            self.field = condition.get('field')
+            if self.field not in POST_FIELDS:
+                raise ValueError(f"Unknown post field: {self.field}")
+            self.sentiment = condition.get('sentiment')
+            if self.sentiment is not None and self.sentiment not in SENTIMENTS:
+                raise ValueError(f"Unknown sentiment: {self.sentiment}")
+            self.condition = {'type': 'post', 'field': self.field, 'op': self.op, 'value': self.value}
+            if self.sentiment:
+                self.condition['sentiment'] = self.sentiment
+        elif self.type == 'window':
+            if sum(1 for scope in (self.ticker, self.industry, self.source) if scope) > 1:
+                raise ValueError("Window rules take at most one of ticker, industry and source")
+            self.metric = condition.get('metric')
+            if self.metric not in WINDOW_METRICS:
+                raise ValueError(f"Unknown window metric: {self.metric}")
+            self.window = condition.get('window')
+            if self.window not in SLIDING_WINDOWS:
+                raise ValueError(f"Unknown window: {self.window}")
+            self.min_posts = _number(condition.get('min_posts', 10), 'min_posts', int)
+            if self.min_posts < 1:
+                raise ValueError("min_posts must be positive")
+            self.condition = {
+                'type': 'window', 'metric': self.metric, 'window': self.window,
+                'op': self.op, 'value': self.value, 'min_posts': self.min_posts
+            }
+        else:
+            raise ValueError(f"Unknown condition type: {self.type}")
+
+    @classmethod
+    def from_model(cls, model: AlertRuleModel) -> 'AlertRule':
+        return cls(
+            id=model.id, name=model.name, webhook_url=model.webhook_url, condition=json.loads(model.condition),
+            ticker=model.ticker, industry=model.industry, source=model.source,
+            cooldown_seconds=model.cooldown_seconds
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "ticker": self.ticker,
+            "industry": self.industry,
+            "source": self.source,
+            "condition": self.condition,
+            "webhook_url": self.webhook_url,
+            "cooldown_seconds": self.cooldown_seconds,
+        }
+
+    @property
+    def subject(self) -> str:
+        """The series a window rule watches"""
+        return self.ticker or self.industry or self.source or 'market'
+
+    def matches_scope(self, ticker: Optional[str], industry: Optional[str], source: Optional[str]) -> bool:
+        return (self.ticker is None or self.ticker == ticker) \
+            and (self.industry is None or self.industry == industry) \
+            and (self.source is None or self.source == source)
+
+    def check_post(self, post: Dict[str, Any]) -> bool:
+        if self.sentiment and post.get('sentiment') != self.sentiment:
+            return False
+        return OPERATORS[self.op](float(post.get(self.field) or 0), self.value)
+
+    def window_value(self, totals: Dict[str, Any]) -> Optional[float]:
+        """The metric over the rule's window, or None below min_posts"""
+        window = totals[self.window]
+        if window['post_count'] < self.min_posts:
+            return None
+        return WINDOW_METRICS[self.metric](window)
+
+class _RuleIndex:
+    """
+    Rules filed under their most selective scope: ticker, else industry,
+    else source, else unscoped
+
+    Each rule sits in exactly one bucket, so candidates() yields it at most
+    once; rules filed under a ticker still check their other scopes.
+    """
+
+    def __init__(self):
+        self.by_ticker: Dict[str, Dict[Any, AlertRule]] = defaultdict(dict)
+        self.by_industry: Dict[str, Dict[Any, AlertRule]] = defaultdict(dict)
+        self.by_source: Dict[str, Dict[Any, AlertRule]] = defaultdict(dict)
+        self.unscoped: Dict[Any, AlertRule] = {}
+
+    def _bucket(self, rule: AlertRule) -> Dict[Any, AlertRule]:
+        if rule.ticker:
+            return self.by_ticker[rule.ticker]
+        if rule.industry:
+            return self.by_industry[rule.industry]
+        if rule.source:
+            return self.by_source[rule.source]
+        return self.unscoped
+
+    def add(self, rule: AlertRule) -> None:
+        self._bucket(rule)[rule.id] = rule
+
+    def remove(self, rule: AlertRule) -> None:
+        self._bucket(rule).pop(rule.id, None)
+
+    def candidates(self, ticker: Optional[str], industry: Optional[str], source: Optional[str]) -> Iterator[AlertRule]:
+        for index, key in ((self.by_ticker, ticker), (self.by_industry, industry), (self.by_source, source)):
+            rules = index.get(key) if key else None
+            if rules:
+                yield from rules.values()
+        yield from self.unscoped.values()
+
+class AlertEngine:
+    """
+    Matches ingested posts and sliding-window aggregates against alert rules
+
+    Rules are indexed by scope, so a post is only checked against the rules
+    for its ticker, industry and source plus the unscoped ones, and each
+    ingest batch re-evaluates only the window rules of the series it
+    touched; the cost of a batch doesn't grow with the number of rules for
+    other companies. Window metrics come from the SlidingWindowAggregator,
+    which must be subscribed to the ingest bus before this engine so it has
+    already counted the batch.
+
+    Fired alerts go to the WebhookDispatcher. Rules are reloaded from
+    alert_rules when another process changes them.
+    """
+
+    def __init__(self, dispatcher, window_aggregator=None):
+        self.dispatcher = dispatcher
+        self.window_aggregator = window_aggregator
+        self.stats = {'posts': 0, 'evaluated': 0, 'fired': 0}
+        self._rules: Dict[Any, AlertRule] = {}
+        self._post_index = _RuleIndex()
+        self._window_index = _RuleIndex()
+        # (rule id, subject) of window rules whose condition currently holds,
+        # and when each last fired from this process
+        self._firing = set()
+        self._last_fired: Dict[Tuple[Any, str], datetime] = {}
+        self._marker: Optional[Tuple] = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+    def _index(self, rule: AlertRule) -> _RuleIndex:
+        return self._post_index if rule.type == 'post' else self._window_index
+
+    def add_rule(self, rule: AlertRule) -> None:
+        with self._lock:
+            self.remove_rule(rule.id)
+            self._rules[rule.id] = rule
+            self._index(rule).add(rule)
+
+    def remove_rule(self, rule_id) -> None:
+        with self._lock:
+            rule = self._rules.pop(rule_id, None)
+            if rule is not None:
+                self._index(rule).remove(rule)
+                self._firing.discard((rule.id, rule.subject))
+                self._last_fired.pop((rule.id, rule.subject), None)
+
+    def set_rules(self, rules: List[AlertRule]) -> None:
+        """Replace every rule, keeping the firing state of rules that remain"""
+        with self._lock:
+            self._rules = {}
+            self._post_index = _RuleIndex()
+            self._window_index = _RuleIndex()
+            for rule in rules:
+                self._rules[rule.id] = rule
+                self._index(rule).add(rule)
+            self._firing = {key for key in self._firing if key[0] in self._rules}
+            self._last_fired = {key: at for key, at in self._last_fired.items() if key[0] in self._rules}
+
+    def rule_count(self) -> int:
+        with self._lock:
+            return len(self._rules)
+
+    def _fire(self, rule: AlertRule, dedup_key: str, details: Dict[str, Any], now: datetime,
+              cooldown: Optional[Tuple[str, int]] = None) -> None:
+        payload = {"rule": rule.to_dict(), "fired_at": now.isoformat(), **details}
+        if self.dispatcher.enqueue(dedup_key, rule.id, rule.webhook_url, payload, cooldown=cooldown, fired_at=now):
+            self.stats['fired'] += 1
+
+    def _evaluate_window_rules(self, rules: Dict[Any, AlertRule], kind: str, key, now: datetime) -> None:
+        totals = self.window_aggregator.window_totals(kind, key)
+        if totals is None:
+            return
+        for rule in rules.values():
+            self.stats['evaluated'] += 1
+            value = rule.window_value(totals)
+            state = (rule.id, rule.subject)
+            if value is None or not OPERATORS[rule.op](value, rule.value):
+                self._firing.discard(state)
+                continue
+            if state in self._firing:
+                continue
+            self._firing.add(state)
+            last_fired = self._last_fired.get(state)
+            if last_fired is not None and (now - last_fired).total_seconds() < rule.cooldown_seconds:
+                continue
+            self._last_fired[state] = now
+            # The dispatcher claims the cooldown in alert_cooldowns, so other
+            # processes firing on the same transition don't deliver it again
+            self._fire(rule, f"{rule.id}:{rule.subject}:{int(now.timestamp())}", {
+                "subject": rule.subject,
+                "metric": rule.metric,
+                "window": rule.window,
+                "value": value,
+                "post_count": int(totals[rule.window]['post_count']),
+            }, now, cooldown=(rule.subject, rule.cooldown_seconds))
+
+    def add_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Ingest bus listener for post events"""
+        now = datetime.utcnow()
+        companies, industries, sources = {}, set(), set()
+        with self._lock:
+            for post in posts:
+                ticker = (post.get('company') or {}).get('ticker')
+                industry = post.get('industry')
+                source = post.get('source')
+                self.stats['posts'] += 1
+                for rule in self._post_index.candidates(ticker, industry, source):
+                    self.stats['evaluated'] += 1
+                    if rule.matches_scope(ticker, industry, source) and rule.check_post(post):
+                        event = {k: v for k, v in post.items() if k != 'ingest_seq'}
+                        self._fire(rule, f"{rule.id}:{post['id']}", {"subject": ticker, "post": event}, now)
+                if ticker:
+                    companies[ticker] = post['company_id']
+                if industry:
+                    industries.add(industry)
+                sources.add(source)
+
+            if self.window_aggregator is None or not self._rules:
+                return
+            index = self._window_index
+            for ticker, company_id in companies.items():
+                if index.by_ticker.get(ticker):
+                    self._evaluate_window_rules(index.by_ticker[ticker], 'company', company_id, now)
+            for industry in industries:
+                if index.by_industry.get(industry):
+                    self._evaluate_window_rules(index.by_industry[industry], 'industry', industry, now)
+            for source in sources:
+                if index.by_source.get(source):
+                    self._evaluate_window_rules(index.by_source[source], 'source', source, now)
+            if posts and index.unscoped:
+                self._evaluate_window_rules(index.unscoped, 'market', None, now)
+
+    def refresh(self, session: Session) -> bool:
+        """Reload enabled rules if alert_rules changed since the last load; True if reloaded"""
+        marker = tuple(session.query(func.count(AlertRuleModel.id), func.max(AlertRuleModel.updated_at)).one())
+        if marker == self._marker:
+            return False
+        rules = []
+        for model in session.query(AlertRuleModel).filter(AlertRuleModel.enabled.is_(True)).yield_per(5000):
+            try:
+                rules.append(AlertRule.from_model(model))
+            except ValueError as e:
+                logger.error(f"Skipping invalid alert rule {model.id}: {e}")
+        self.set_rules(rules)
+        self._marker = marker
+        logger.info(f"Loaded {len(rules)} alert rules")
+        return True
+
+    def start(self, session_factory, refresh_seconds: float = 30.0) -> threading.Thread:
+        """Load the rules in a background thread, then reload them when they change"""
+        def run():
+            while True:
+                session = session_factory()
+                try:
+                    self.refresh(session)
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"Error loading alert rules: {e}")
+                finally:
+                    session.close()
+                if self._stop.wait(refresh_seconds):
+                    return
+
+        self._stop.clear()
+        thread = threading.Thread(target=run, name='alert-rules', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,463 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.orm import Session
+
+from models.models import SIGNAL_LOCK_KEY, AnomalySignalModel, CompanyModel, IndustryModel, SentimentRollupModel
+from services.ingest_bus import IngestBus
+from services.post_query_service import current_ingest_seq
+from services.rollup_service import SENTIMENT_SCORES
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Series of all sources combined are keyed with this source
+ALL_SOURCES = 'all'
+
+# Smallest standard deviation used for z-scores, so a flat baseline doesn't
+# turn one extra post into an infinite z-score
+_MIN_STD = {'volume': 1.0, 'sentiment': 0.1}
+
+# Columns identifying one signal, whichever process detected it
+_SIGNAL_KEY = ('company_id', 'source', 'metric', 'kind', 'bucket_start')
+
+def _poisson_z(value: float, mean: float) -> float:
+    """Anscombe-transformed deviation of a count: close to N(0, 1) for Poisson counts, even small ones"""
+    return 2 * (math.sqrt(value + 0.375) - math.sqrt(max(mean, 0.0) + 0.375))
+
+def _seconds(value: datetime) -> float:
+    return (value.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+class _Baseline:
+    """EWMA mean and variance of one metric, with a two-sided CUSUM over its z-scores"""
+    __slots__ = ('mean', 'var', 'count', 'cusum_up', 'cusum_down')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.cusum_up = 0.0
+        self.cusum_down = 0.0
+
+    def observe(self, value: float, alpha: float, min_std: float) -> Optional[Tuple[float, float, float]]:
+        """
+        Fold one bucket's value into the baseline
+
+        Returns:
+            (z-score, mean, std) of the value against the baseline before it,
+            or None for the first observation
+        """
+        if self.count == 0:
+            self.mean = value
+            self.count = 1
+            return None
+        mean, std = self.mean, max(math.sqrt(self.var), min_std)
+        diff = value - mean
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+        return diff / std, mean, std
+
+class _Series:
+    __slots__ = ('company_id', 'source', 'open', 'closed_through', 'baselines')
+
+    def __init__(self, company_id: str, source: str, closed_through: int):
+        self.company_id = company_id
+        self.source = source
+        # Bucket index to [post count, score sum] for buckets still accepting posts
+        self.open: Dict[int, List[float]] = {}
+        self.closed_through = closed_through
+        self.baselines = {'volume': _Baseline(), 'sentiment': _Baseline()}
+
+class AnomalyDetector:
+    """
+    Streaming volume and sentiment anomaly detection per company and source
+
+    Posts are counted into fixed event-time buckets per (company, source)
+    and per company across all sources. A bucket closes lateness_seconds
+    after it ends, so posts collected a little late still count. Closing a
+    bucket feeds its post count, and its mean score if it has at least
+    min_sentiment_posts posts, into an EWMA mean and variance for that
+    series. Nothing is read from the database after startup.
+
+    Each closed bucket is compared with the baseline before it:
+    - spike: |z| >= z_threshold, a sudden jump (e.g. an earnings surprise)
+    - shift: a CUSUM of z-scores passes cusum_threshold, a sustained move
+      that individual buckets don't show (a change point)
+    Series are silent until they have warmup_buckets observations.
+
+    With a bus and max_feed_age_seconds, buckets that close while neither
+    the load nor the bus has vouched for the feed within that long are
+    dropped without touching the baselines. Unfed, every series would
+    otherwise read as zero volume and alarm.
+
+    Once started, signals are stored in anomaly_signals, where the database
+    assigns their ids and the first process to store a signal wins, and
+    then go to the listeners. Without a database (before start()), they go
+    to a bounded in-memory feed instead. On startup the baselines are
+    warmed from the last warm_hours of minute rollups, without emitting
+    signals.
+    """
+
+    def __init__(self,
+                 bucket_minutes: int = 5,
+                 alpha: float = 0.1,
+                 z_threshold: float = 3.0,
+                 warmup_buckets: int = 12,
+                 lateness_seconds: float = 120.0,
+                 min_sentiment_posts: int = 5,
+                 cusum_drift: float = 0.5,
+                 cusum_threshold: float = 5.0,
+                 max_signals: int = 1000,
+                 warm_hours: float = 24.0,
+                 bus: Optional[IngestBus] = None,
+                 max_feed_age_seconds: Optional[float] = None):
+        self.bucket_seconds = bucket_minutes * 60
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup_buckets = warmup_buckets
+        self.lateness_seconds = lateness_seconds
+        self.min_sentiment_posts = min_sentiment_posts
+        self.cusum_drift = cusum_drift
+        self.cusum_threshold = cusum_threshold
+        self.warm_hours = warm_hours
+        self.bus = bus
+        self.max_feed_age_seconds = max_feed_age_seconds
+        self._loaded_at = 0.0
+        # Gaps longer than this (e.g. a stopped server) reset to zero-volume
+        # buckets only for the last day
+        self.max_gap_buckets = max(1, int(86400 // self.bucket_seconds))
+        self.ready = False
+        self.loaded_seq: Optional[int] = None
+        self.late_posts = 0
+        self.listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.session_factory = None
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._companies: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._signals: Deque[Dict[str, Any]] = deque(maxlen=max_signals)
+        self._next_id = 1
+        self._closed_through = self._closable(datetime.utcnow())
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+    @property
+    def current(self) -> bool:
+        """Fed recently enough that a closing bucket holds every post stored for it"""
+        if self.bus is None or self.max_feed_age_seconds is None:
+            return True
+        return self.bus.fed_within(self.max_feed_age_seconds, since=self._loaded_at)
+
+    def _bucket(self, timestamp: datetime) -> int:
+        return int(_seconds(timestamp) // self.bucket_seconds)
+
+    def _closable(self, now: datetime) -> int:
+        """Newest bucket that has ended at least lateness_seconds ago"""
+        return int((_seconds(now) - self.lateness_seconds) // self.bucket_seconds) - 1
+
+    def _count(self, company_id: str, source: str, bucket: int, score: float, posts: float = 1) -> None:
+        for key in ((company_id, source), (company_id, ALL_SOURCES)):
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(company_id, key[1], self._closed_through)
+            if bucket <= series.closed_through:
+                self.late_posts += posts if key[1] != ALL_SOURCES else 0
+                continue
+            counts = series.open.setdefault(bucket, [0.0, 0.0])
+            counts[0] += posts
+            counts[1] += score
+
+    def add_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Ingest bus listener for post events"""
+        with self._lock:
+            if not self.ready:
+                self._pending.extend(posts)
+                return
+            now = datetime.utcnow()
+            for post in posts:
+                if self.loaded_seq is not None and (post.get('ingest_seq') or 0) <= self.loaded_seq:
+                    continue
+                company_id = str(post['company_id'])
+                self._companies[company_id] = ((post.get('company') or {}).get('ticker'), post.get('industry'))
+                # Future-dated posts (clock skew) count as posted now
+                timestamp = min(datetime.fromisoformat(post['timestamp']), now)
+                self._count(company_id, post['source'], self._bucket(timestamp), SENTIMENT_SCORES.get(post.get('sentiment'), 0))
+
+    def _signal(self, series: _Series, metric: str, kind: str, direction: str, z: float, value: float,
+                mean: float, std: float, bucket: int, now: datetime) -> Dict[str, Any]:
+        ticker, industry = self._companies.get(series.company_id, (None, None))
+        return {
+            "id": None,
+            "company_id": series.company_id,
+            "ticker": ticker,
+            "industry": industry,
+            "source": series.source,
+            "metric": metric,
+            "kind": kind,
+            "direction": direction,
+            "value": value,
+            "baseline": mean,
+            "std": std,
+            "z": z,
+            "bucket_start": (_EPOCH + timedelta(seconds=bucket * self.bucket_seconds)).isoformat(),
+            "bucket_minutes": self.bucket_seconds // 60,
+            "detected_at": now.isoformat(),
+        }
+
+    def _observe(self, series: _Series, metric: str, value: float, bucket: int, now: datetime, emit: bool) -> List[Dict[str, Any]]:
+        baseline = series.baselines[metric]
+        observed = baseline.observe(value, self.alpha, _MIN_STD[metric])
+        if observed is None or baseline.count <= self.warmup_buckets:
+            return []
+        z, mean, std = observed
+        if metric == 'volume':
+            # Post counts are roughly Poisson: a quiet series' EWMA variance
+            # says a few extra posts are rare when they aren't
+            z = math.copysign(min(abs(z), abs(_poisson_z(value, mean))), z)
+        baseline.cusum_up = max(0.0, baseline.cusum_up + z - self.cusum_drift)
+        baseline.cusum_down = max(0.0, baseline.cusum_down - z - self.cusum_drift)
+        if not emit:
+            return []
+        signals = []
+        if abs(z) >= self.z_threshold:
+            signals.append(self._signal(series, metric, 'spike', 'up' if z > 0 else 'down', z, value, mean, std, bucket, now))
+        if baseline.cusum_up > self.cusum_threshold or baseline.cusum_down > self.cusum_threshold:
+            direction = 'up' if baseline.cusum_up > self.cusum_threshold else 'down'
+            signals.append(self._signal(series, metric, 'shift', direction, z, value, mean, std, bucket, now))
+            baseline.cusum_up = baseline.cusum_down = 0.0
+        return signals
+
+    def _close(self, series: _Series, through: int, now: datetime, emit: bool) -> List[Dict[str, Any]]:
+        signals = []
+        first = max(series.closed_through + 1, through - self.max_gap_buckets + 1)
+        for bucket in range(first, through + 1):
+            posts, score_sum = series.open.pop(bucket, (0.0, 0.0))
+            signals.extend(self._observe(series, 'volume', posts, bucket, now, emit))
+            if posts >= self.min_sentiment_posts:
+                signals.extend(self._observe(series, 'sentiment', score_sum / posts, bucket, now, emit))
+        for bucket in [b for b in series.open if b <= through]:
+            del series.open[bucket]
+        series.closed_through = through
+        return signals
+
+    def _skip(self, series: _Series, through: int) -> None:
+        """Drop buckets the feed can't vouch for, leaving the baselines as they were"""
+        for bucket in [b for b in series.open if b <= through]:
+            del series.open[bucket]
+        series.closed_through = through
+
+    def tick(self, now: Optional[datetime] = None, emit: bool = True) -> List[Dict[str, Any]]:
+        """Close every bucket past its lateness allowance; returns the new signals"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            through = self._closable(now)
+            if through <= self._closed_through:
+                return []
+            signals = []
+            # Warming (emit=False) reads the rollups, not the feed
+            fed = not emit or self.current
+            for series in self._series.values():
+                if fed:
+                    signals.extend(self._close(series, through, now, emit))
+                else:
+                    self._skip(series, through)
+            self._closed_through = through
+        if signals:
+            self._record(signals)
+            for listener in list(self.listeners):
+                try:
+                    listener(signals)
+                except Exception as e:
+                    logger.error(f"Error in anomaly listener {getattr(listener, '__name__', listener)}: {e}")
+        return signals
+
+    def _record(self, signals: List[Dict[str, Any]]) -> None:
+        """Give new signals their ids: from anomaly_signals once started, else in memory"""
+        if self.session_factory is not None:
+            session = self.session_factory()
+            try:
+                save_signals(session, signals)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error saving anomaly signals: {e}")
+            finally:
+                session.close()
+            return
+        with self._lock:
+            for signal in signals:
+                signal["id"] = self._next_id
+                self._next_id += 1
+                self._signals.append(signal)
+
+    def load(self, session: Session) -> int:
+        """
+        Warm the baselines from recent minute rollups and mark the detector ready
+
+        Returns:
+            Number of rollup rows read
+        """
+        if session.get_bind().dialect.name == 'postgresql':
+            # One snapshot for the ingest position and the rollups it covers
+            session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        now = datetime.utcnow()
+        loaded_at = time.monotonic()
+        seq = current_ingest_seq(session)
+        rollup = SentimentRollupModel
+        stmt = select(
+            rollup.company_id, rollup.source, rollup.bucket_start, rollup.post_count,
+            rollup.positive_count, rollup.negative_count,
+            CompanyModel.ticker, IndustryModel.name.label('industry')
+        ).join(CompanyModel, CompanyModel.id == rollup.company_id)\
+            .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+            .where(rollup.granularity == 'minute')\
+            .where(rollup.bucket_start >= now - timedelta(hours=self.warm_hours))\
+            .order_by(rollup.bucket_start)
+        rows = session.execute(stmt).all()
+
+        with self._lock:
+            self._closed_through = self._bucket(now - timedelta(hours=self.warm_hours)) - 1
+            for row in rows:
+                company_id = str(row.company_id)
+                self._companies[company_id] = (row.ticker, row.industry.lower() if row.industry else None)
+                self._count(company_id, row.source, self._bucket(row.bucket_start),
+                            float(row.positive_count - row.negative_count), posts=float(row.post_count))
+            self.late_posts = 0
+            self._loaded_at = loaded_at
+            self.tick(now, emit=False)
+            self.loaded_seq = seq
+            self.ready = True
+            pending, self._pending = self._pending, []
+            self.add_posts(pending)
+        logger.info(f"Anomaly baselines warmed from {len(rows)} rollup buckets")
+        return len(rows)
+
+    def start(self, session_factory, tick_seconds: float = 15.0) -> threading.Thread:
+        """
+        Warm up in a background thread, then close buckets every tick_seconds
+
+        From here on signals are stored in anomaly_signals.
+        """
+        self.session_factory = session_factory
+
+        def run():
+            session = session_factory()
+            try:
+                self.load(session)
+            except Exception as e:
+                logger.error(f"Error warming anomaly baselines: {e}")
+                with self._lock:
+                    # Start cold rather than not at all
+                    self.ready = True
+                    pending, self._pending = self._pending, []
+                    self.add_posts(pending)
+            finally:
+                session.close()
+            while not self._stop.wait(tick_seconds):
+                try:
+                    self.tick()
+                except Exception as e:
+                    logger.error(f"Error closing anomaly buckets: {e}")
+
+        self._stop.clear()
+        thread = threading.Thread(target=run, name='anomaly-detector', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def signals(self,
+                since_id: int = 0,
+                tickers: Optional[Iterable[str]] = None,
+                sources: Optional[Iterable[str]] = None,
+                metrics: Optional[Iterable[str]] = None,
+                kinds: Optional[Iterable[str]] = None,
+                limit: int = 100,
+                oldest_first: bool = False) -> List[Dict[str, Any]]:
+        """
+        In-memory signals with id > since_id matching every given filter
+
+        Newest first by default; oldest_first returns the first `limit` after
+        since_id instead, so a poller paging forward never skips any.
+        """
+        filters = [
+            (field, set(values)) for field, values in
+            (("ticker", tickers), ("source", sources), ("metric", metrics), ("kind", kinds)) if values
+        ]
+        with self._lock:
+            candidates = list(self._signals)
+        matched = [
+            signal for signal in candidates
+            if signal["id"] > since_id and all(signal[field] in allowed for field, allowed in filters)
+        ]
+        return matched[:limit] if oldest_first else matched[::-1][:limit]
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+def save_signals(session: Session, signals: List[Dict[str, Any]]) -> None:
+    """
+    Store signals in anomaly_signals and set each one's "id"
+
+    A signal another process stored first keeps the id it got there.
+    Inserts are serialized like ingest (see lock_ingest), so ids become
+    visible in order and a poller resuming from the last id never skips one.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': SIGNAL_LOCK_KEY})
+    table = AnomalySignalModel.__table__
+    for signal in signals:
+        row = {column: signal[column] for column in table.columns.keys() if column != 'id'}
+        row.update(
+            company_id=uuid.UUID(str(signal['company_id'])),
+            bucket_start=datetime.fromisoformat(signal['bucket_start']),
+            detected_at=datetime.fromisoformat(signal['detected_at'])
+        )
+        key = [table.c[column] == row[column] for column in _SIGNAL_KEY]
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            session.execute(insert(table).values(**row).on_conflict_do_nothing(index_elements=list(_SIGNAL_KEY)))
+        elif session.execute(select(table.c.id).where(*key)).first() is None:
+            session.execute(table.insert().values(**row))
+        signal["id"] = session.execute(select(table.c.id).where(*key)).scalar()
+    session.commit()
+
+def query_signals(session: Session,
+                  since_id: int = 0,
+                  tickers: Optional[Iterable[str]] = None,
+                  sources: Optional[Iterable[str]] = None,
+                  metrics: Optional[Iterable[str]] = None,
+                  kinds: Optional[Iterable[str]] = None,
+                  limit: int = 100,
+                  oldest_first: bool = False) -> List[Dict[str, Any]]:
+    """Stored signals with id > since_id matching every given filter, ordered like AnomalyDetector.signals"""
+    signal = AnomalySignalModel
+    stmt = select(signal).where(signal.id > since_id)
+    for column, values in ((signal.ticker, tickers), (signal.source, sources), (signal.metric, metrics), (signal.kind, kinds)):
+        if values:
+            stmt = stmt.where(column.in_(list(values)))
+    stmt = stmt.order_by(signal.id if oldest_first else signal.id.desc()).limit(limit)
+    return [row.to_dict() for row in session.execute(stmt).scalars()]
+
+def last_signal_id(session: Session) -> int:
+    """Newest stored signal id, or 0"""
+    return session.execute(select(func.max(AnomalySignalModel.id))).scalar() or 0
+
+def prune_signals(session: Session, cutoff: datetime) -> int:
+    """Delete signals detected before the retention cutoff"""
+    result = session.execute(delete(AnomalySignalModel).where(AnomalySignalModel.detected_at < cutoff))
+    return result.rowcount or 0
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import CompanyModel, IndustryModel
+from services.aggregation_service import aggregate_sentiment
+from services.post_query_service import post_projection_query, fetch_post_rows, KEYSET_ORDER
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_HOURS_BACK = 24
+
+def _trending(last_hour: List[Dict[str, Any]], last_day: List[Dict[str, Any]], limit: int, min_count: int) -> List[Dict[str, Any]]:
+    """Rank tickers by last-hour volume relative to their 24h hourly average"""
+    daily = {row['company_id']: row['count'] for row in last_day}
+    trending = []
+    for row in last_hour:
+        if row['count'] < min_count:
+            continue
+        hourly_average = daily.get(row['company_id'], 0) / SNAPSHOT_HOURS_BACK
+        trending.append({
+            "ticker": row['ticker'],
+            "count_1h": row['count'],
+            "count_24h": daily.get(row['company_id'], 0),
+            "velocity": row['count'] / max(hourly_average, 1.0),
+            "sentiment": row['sentiment'],
+        })
+    trending.sort(key=lambda item: (item['velocity'], item['count_1h']), reverse=True)
+    return trending[:limit]
+
+def build_dashboard_snapshot(session: Session,
+                             latest_limit: int = 50,
+                             trending_limit: int = 10,
+                             trending_min_count: int = 3) -> Dict[str, Any]:
+    """
+    Build the complete dashboard document
+
+    Everything comes from grouped rollup queries plus one projection query
+    for the latest posts, so the cost is fixed regardless of post volume.
+
+    Returns:
+        Dict with market, industries, companies, by_source, by_sentiment,
+        latest_posts and trending
+    """
+    hours_back = SNAPSHOT_HOURS_BACK
+    market = aggregate_sentiment(session, hours_back=hours_back)[0]
+    industries = aggregate_sentiment(session, hours_back=hours_back, group_by=['industry'])
+    by_source = aggregate_sentiment(session, hours_back=hours_back, group_by=['source'])
+    last_day = aggregate_sentiment(session, hours_back=hours_back, group_by=['company'])
+    last_hour = aggregate_sentiment(session, hours_back=1, group_by=['company'])
+
+    # Every company appears, including those without posts in the window
+    company_stmt = select(CompanyModel.id, CompanyModel.ticker, CompanyModel.name, IndustryModel.name.label('industry'))\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .order_by(IndustryModel.name, CompanyModel.ticker)
+    aggregates = {row['company_id']: row for row in last_day}
+    companies = []
+    for company in session.execute(company_stmt):
+        summary = dict(aggregates.get(str(company.id)) or {"company_id": str(company.id), "sentiment": None, "count": 0})
+        summary.update({"ticker": company.ticker, "name": company.name, "industry": company.industry.lower()})
+        companies.append(summary)
+
+    for industry in industries:
+        industry['industry'] = industry['industry'].lower()
+
+    latest_posts = fetch_post_rows(session, post_projection_query().order_by(*KEYSET_ORDER).limit(latest_limit))
+
+    return {
+        "hours_back": hours_back,
+        "market": market,
+        "industries": industries,
+        "companies": companies,
+        "by_source": {row.pop('source'): row for row in by_source},
+        "by_sentiment": {
+            "positive": market.get("positive", 0),
+            "neutral": market.get("neutral", 0),
+            "negative": market.get("negative", 0),
+        },
+        "latest_posts": latest_posts,
+        "trending": _trending(last_hour, last_day, trending_limit, trending_min_count),
+    }
+
+class DashboardSnapshot:
+    """
+    Dashboard document materialized in the background and served from memory
+
+    Ingest batches call invalidate(), which only wakes the builder thread;
+    several batches arriving close together produce one rebuild. The
+    snapshot is also rebuilt every refresh_seconds because its windows slide
+    with the clock. Readers get the pre-serialized body, so serving costs the
+    same whatever the data volume. A rebuild whose content matches the
+    current snapshot keeps it, version and generated_at included, so the
+    ETag (a hash of the body) changes only when the content does.
+    """
+
+    def __init__(self,
+                 session_factory,
+                 builder: Callable[[Session], Dict[str, Any]] = build_dashboard_snapshot,
+                 refresh_seconds: float = 60.0,
+                 debounce_seconds: float = 1.0):
+        self.session_factory = session_factory
+        self.builder = builder
+        self.refresh_seconds = refresh_seconds
+        self.debounce_seconds = debounce_seconds
+        self.version = 0
+        # (body, etag, version), swapped as one reference so readers never see a mix
+        self._current: Optional[Tuple[bytes, str, int]] = None
+        self._content_hash: Optional[str] = None
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._build_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def invalidate(self, *_args) -> None:
+        """Request a rebuild; usable directly as an ingest bus listener"""
+        self._dirty.set()
+
+    def rebuild(self) -> None:
+        """Build a new snapshot, swapping it in only if the content changed"""
+        with self._build_lock:
+            self._rebuild_locked()
+
+    def _rebuild_locked(self) -> None:
+        session = self.session_factory()
+        try:
+            document = self.builder(session)
+        finally:
+            session.close()
+        content_hash = hashlib.sha1(json.dumps(document, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        if self._current is not None and content_hash == self._content_hash:
+            return
+        version = self.version + 1
+        document["version"] = version
+        document["generated_at"] = datetime.utcnow().isoformat()
+        body = json.dumps(document, separators=(',', ':'), default=str).encode('utf-8')
+        # The ETag covers the exact bytes served; it only changes with the content
+        # because unchanged rebuilds keep the previous body
+        self._current = (body, hashlib.sha1(body).hexdigest(), version)
+        self._content_hash = content_hash
+        self.version = version
+
+    def get(self) -> Tuple[bytes, str, int]:
+        """Current (body, etag, version), building the first snapshot synchronously"""
+        current = self._current
+        if current is None:
+            with self._build_lock:
+                # Another request may have built it while we waited for the lock
+                if self._current is None:
+                    self._rebuild_locked()
+                current = self._current
+        return current
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dashboard-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._dirty.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait(self.refresh_seconds)
+            if self._stop.is_set():
+                break
+            # Let a burst of ingest batches settle into one rebuild
+            time.sleep(self.debounce_seconds)
+            self._dirty.clear()
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Error building dashboard snapshot: {e}")
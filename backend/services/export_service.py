@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Flat export columns, in CSV column order
+EXPORT_FIELDS = (
+    'id', 'company_id', 'ticker', 'content', 'sentiment', 'confidence', 'source',
+    'timestamp', 'author', 'engagement', 'original_url', 'created_at',
+)
+
+# Bytes buffered before a chunk is handed to the WSGI server
+_CHUNK_BYTES = 64 * 1024
+
+def export_row(row) -> Dict[str, Any]:
+    """Flatten a post_projection_query row to the export columns"""
+    return {
+        "id": str(row['id']),
+        "company_id": str(row['company_id']),
+        "ticker": row['company_ticker'],
+        "content": row['content'],
+        "sentiment": row['sentiment'],
+        "confidence": row['confidence'],
+        "source": row['source'],
+        "timestamp": row['timestamp'].isoformat() if row['timestamp'] else None,
+        "author": row['author'],
+        "engagement": row['engagement'],
+        "original_url": row['original_url'],
+        "created_at": row['created_at'].isoformat() if row['created_at'] else None,
+    }
+
+def stream_rows(session: Session, stmt, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Yield export rows through a server-side cursor
+
+    stream_results keeps the driver from buffering the whole result set
+    (a named cursor on PostgreSQL), and yield_per fetches batch_size rows
+    at a time, so memory stays flat however many rows match.
+    """
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for row in result.mappings():
+        yield export_row(row)
+
+def _chunked(pieces: Iterable[str]) -> Iterator[bytes]:
+    buffer: List[str] = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= _CHUNK_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """One JSON object per line"""
+    return _chunked(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """CSV with a header row, columns in EXPORT_FIELDS order"""
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow([row[field] for field in EXPORT_FIELDS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    return _chunked(lines())
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream incrementally into one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,171 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func, and_, literal, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from models.models import SentimentPostModel, SentimentRollupModel, CompanyModel, IndustryModel
+from services.post_query_service import apply_post_filters
+from services.rollup_service import as_uuid, rollup_totals_query
+
+logger = logging.getLogger(__name__)
+
+FACETS = ('source', 'sentiment', 'industry', 'company')
+
+_SENTIMENT_COLUMNS = {
+    'positive': 'positive_count',
+    'neutral': 'neutral_count',
+    'negative': 'negative_count',
+}
+
+def _facet_columns():
+    return {
+        'source': SentimentPostModel.source,
+        'sentiment': SentimentPostModel.sentiment,
+        'industry': IndustryModel.name,
+        'company': CompanyModel.ticker,
+    }
+
+# The /posts filter each facet ignores when it is counted (industry has none)
+_FACET_FILTERS = {
+    'source': 'sources',
+    'sentiment': 'sentiments',
+    'company': 'company_ids',
+}
+
+def _empty_facets() -> Dict[str, Dict[str, int]]:
+    return {facet: {} for facet in FACETS}
+
+def _rollup_facets(session: Session,
+                   sources: Optional[List[str]],
+                   sentiments: Optional[List[str]],
+                   company_ids: Optional[List[str]],
+                   hours_back: Optional[int]) -> Dict[str, Dict[str, int]]:
+    """
+    Fold one (company, source) rollup grouping into every facet
+
+    The grouping is read for every company and source in the window, so each
+    facet can leave out its own filter.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours_back) if hours_back else None
+    stmt = rollup_totals_query(since=since, group_by=['company_id', 'source'])
+    stmt = stmt.add_columns(CompanyModel.ticker, IndustryModel.name.label('industry'))\
+        .select_from(SentimentRollupModel)\
+        .join(CompanyModel, CompanyModel.id == SentimentRollupModel.company_id)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .group_by(CompanyModel.ticker, IndustryModel.name)
+
+    wanted_companies = {as_uuid(cid) for cid in company_ids} if company_ids else None
+    facets = {facet: defaultdict(int) for facet in FACETS}
+    for row in session.execute(stmt).mappings():
+        by_sentiment = {s: int(row[column] or 0) for s, column in _SENTIMENT_COLUMNS.items()}
+        source_ok = not sources or row['source'] in sources
+        company_ok = wanted_companies is None or as_uuid(row['company_id']) in wanted_companies
+        count = sum(c for s, c in by_sentiment.items() if not sentiments or s in sentiments)
+        if company_ok and count:
+            facets['source'][row['source']] += count
+        if source_ok and count:
+            facets['company'][row['ticker']] += count
+        if source_ok and company_ok:
+            if count:
+                facets['industry'][row['industry'].lower()] += count
+            for sentiment, sentiment_count in by_sentiment.items():
+                if sentiment_count:
+                    facets['sentiment'][sentiment] += sentiment_count
+    return {facet: dict(counts) for facet, counts in facets.items()}
+
+def _post_facets(session: Session, dialect: str, **filters) -> Dict[str, Dict[str, int]]:
+    """
+    Count every facet over the filtered posts
+
+    PostgreSQL computes all facets in one scan with GROUPING SETS, counting
+    each facet under its own FILTER clause; other databases run one query
+    per facet under UNION ALL.
+    """
+    columns = _facet_columns()
+    base = select().select_from(SentimentPostModel)\
+        .join(CompanyModel, CompanyModel.id == SentimentPostModel.company_id)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)
+
+    facets = _empty_facets()
+    if dialect == 'postgresql':
+        conditions = _dimension_conditions(filters)
+        counts = []
+        for facet in FACETS:
+            others = [condition for name, condition in conditions.items() if name != _FACET_FILTERS.get(facet)]
+            count = func.count().filter(and_(*others)) if others else func.count()
+            counts.append(count.label(f'{facet}_count'))
+        stmt = base.add_columns(*[column.label(facet) for facet, column in columns.items()], *counts)
+        # Only the filters every facet shares go in WHERE
+        stmt = apply_post_filters(stmt, dialect, search_query=filters.get('search_query'), hours_back=filters.get('hours_back'))\
+            .group_by(func.grouping_sets(*[tuple_(column) for column in columns.values()]))
+        for row in session.execute(stmt).mappings():
+            # Exactly one facet column is non-null per grouping set
+            for facet in FACETS:
+                if row[facet] is not None:
+                    if row[f'{facet}_count']:
+                        facets[facet][row[facet]] = row[f'{facet}_count']
+                    break
+    else:
+        selects = [
+            apply_post_filters(
+                base.add_columns(literal(facet).label('facet'), column.label('value'), func.count().label('count')),
+                dialect, **_without_own_filter(filters, facet)
+            ).group_by(column)
+            for facet, column in columns.items()
+        ]
+        for row in session.execute(union_all(*selects)).mappings():
+            facets[row['facet']][row['value']] = row['count']
+
+    facets['industry'] = {name.lower(): count for name, count in facets['industry'].items()}
+    return facets
+
+def _without_own_filter(filters: Dict[str, Any], facet: str) -> Dict[str, Any]:
+    own = _FACET_FILTERS.get(facet)
+    return {name: value for name, value in filters.items() if name != own}
+
+def _dimension_conditions(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """The facet-dimension filters as conditions, keyed by filter name"""
+    conditions = {}
+    if filters.get('sources'):
+        conditions['sources'] = SentimentPostModel.source.in_(filters['sources'])
+    if filters.get('sentiments'):
+        conditions['sentiments'] = SentimentPostModel.sentiment.in_(filters['sentiments'])
+    if filters.get('company_ids'):
+        conditions['company_ids'] = SentimentPostModel.company_id.in_([as_uuid(cid) for cid in filters['company_ids']])
+    return conditions
+
+def facet_counts(session: Session,
+                 sources: Optional[List[str]] = None,
+                 sentiments: Optional[List[str]] = None,
+                 company_ids: Optional[List[str]] = None,
+                 search_query: Optional[str] = None,
+                 hours_back: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Post counts per source, sentiment, industry and company under the /posts filters
+
+    Each facet is counted under every filter except its own (sources for
+    the source facet, sentiments for sentiment, company_ids for company), so
+    a client can show the other values it could switch to. "total" counts
+    the posts matching every filter. Without a text search the counts come
+    from the rollups (minute-precise windows); with one they come from the
+    posts themselves.
+
+    Returns:
+        Dict with "facets", "total" and "from_rollups"
+    """
+    if search_query:
+        dialect = session.get_bind().dialect.name
+        facets = _post_facets(session, dialect, sources=sources, sentiments=sentiments,
+                              company_ids=company_ids, search_query=search_query, hours_back=hours_back)
+    else:
+        facets = _rollup_facets(session, sources, sentiments, company_ids, hours_back)
+
+    return {
+        "facets": facets,
+        # Industry has no filter of its own, so it is counted under all of them
+        "total": sum(facets['industry'].values()),
+        "from_rollups": not search_query,
+    }
@@ -0,0 +1,496 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models.models import SentimentPostModel
+from services.ingest_bus import IngestBus
+from services.post_query_service import (
+    post_event_query, serialize_post_event, current_ingest_seq, decode_cursor, encode_cursor
+)
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MIN_TS = np.iinfo(np.int64).min
+_UINT64_MASK = (1 << 64) - 1
+
+SENTIMENT_CODES = {'negative': -1, 'neutral': 0, 'positive': 1}
+
+def to_micros(value: datetime) -> int:
+    """Naive UTC datetime to integer microseconds since the epoch"""
+    return (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+def _split_id(post_id: Any) -> Tuple[int, int]:
+    """A UUID as two uint64 halves; their order is the database's id order"""
+    value = post_id.int if isinstance(post_id, uuid.UUID) else uuid.UUID(str(post_id)).int
+    return value >> 64, value & _UINT64_MASK
+
+class _CompanyRing:
+    """
+    Columnar ring buffer of one company's recent posts
+
+    Columns grow by doubling up to capacity; after that the oldest inserted
+    post is overwritten. evicted_max records the newest timestamp ever
+    overwritten, since posts at or before it may be missing.
+    """
+
+    def __init__(self, company_id: str, ticker: str, industry: Optional[str], capacity: int, initial: int = 256):
+        self.company_id = company_id
+        self.ticker = ticker
+        self.industry = industry
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        self.evicted_max = _MIN_TS
+        self._allocate(min(initial, capacity))
+
+    def _allocate(self, length: int) -> None:
+        def resized(column, dtype):
+            new = np.empty(length, dtype=dtype)
+            if column is not None:
+                new[:self.size] = column[:self.size]
+            return new
+        self.ts = resized(getattr(self, 'ts', None), np.int64)
+        self.id_hi = resized(getattr(self, 'id_hi', None), np.uint64)
+        self.id_lo = resized(getattr(self, 'id_lo', None), np.uint64)
+        self.source = resized(getattr(self, 'source', None), np.int16)
+        self.sentiment = resized(getattr(self, 'sentiment', None), np.int8)
+        self.confidence = resized(getattr(self, 'confidence', None), np.float64)
+        self.engagement = resized(getattr(self, 'engagement', None), np.int64)
+        self.posts = resized(getattr(self, 'posts', None), object)
+
+    def append(self, ts: int, id_hi: int, id_lo: int, source: int, sentiment: int,
+               confidence: float, engagement: int, post: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Store one post; returns the post it overwrote, if any"""
+        evicted = None
+        if self.size == len(self.ts) and self.size < self.capacity:
+            self._allocate(min(self.capacity, self.size * 2))
+        if self.size < len(self.ts):
+            i = self.size
+            self.size += 1
+        else:
+            i = self.head
+            self.head = (self.head + 1) % self.capacity
+            evicted = self.posts[i]
+            self.evicted_max = max(self.evicted_max, int(self.ts[i]))
+        self.ts[i] = ts
+        self.id_hi[i] = id_hi
+        self.id_lo[i] = id_lo
+        self.source[i] = source
+        self.sentiment[i] = sentiment
+        self.confidence[i] = confidence
+        self.engagement[i] = engagement
+        self.posts[i] = post
+        return evicted
+
+    def expire(self, cutoff: int) -> List[Dict[str, Any]]:
+        """Drop posts older than cutoff, keeping insertion order; returns the dropped posts"""
+        n = self.size
+        keep = self.ts[:n] >= cutoff
+        if keep.all():
+            return []
+        dropped = list(self.posts[:n][~keep])
+        order = np.r_[self.head:n, 0:self.head] if self.head else np.arange(n)
+        order = order[keep[order]]
+        for name in ('ts', 'id_hi', 'id_lo', 'source', 'sentiment', 'confidence', 'engagement', 'posts'):
+            column = getattr(self, name)
+            column[:len(order)] = column[order]
+        # Release the dropped posts
+        self.posts[len(order):n] = None
+        self.size = len(order)
+        self.head = 0
+        return dropped
+
+class HotPostStore:
+    """
+    The last window_hours of posts in memory, as per-company NumPy columns
+
+    Fed by the ingest bus and loaded from the database at startup, it
+    answers latest-N pages, counts and sentiment aggregates for recent
+    windows without a database round trip. Every query method returns None
+    when the store can't answer exactly (not loaded yet, or the request
+    reaches past what it holds), and the caller falls back to the database.
+
+    Posts with a timestamp at or after `complete_since` are all present,
+    except in a company whose ring overflowed, where the bound moves up to
+    the newest overwritten timestamp.
+
+    With a bus and max_feed_age_seconds, the store also stops answering
+    once neither its load nor the bus (a publish or a tailer heartbeat)
+    has vouched for it within that long, e.g. when the tailer thread died
+    or posts are written by a process nothing tails.
+    """
+
+    def __init__(self,
+                 window_hours: int = 24,
+                 company_capacity: int = 50000,
+                 expire_interval_seconds: float = 60.0,
+                 bus: Optional[IngestBus] = None,
+                 max_feed_age_seconds: Optional[float] = None):
+        self.window_hours = window_hours
+        self.company_capacity = company_capacity
+        self.expire_interval_us = int(expire_interval_seconds * 1e6)
+        self.bus = bus
+        self.max_feed_age_seconds = max_feed_age_seconds
+        self._loaded_at = 0.0
+        self.ready = False
+        self.ingest_seq: Optional[int] = None
+        self.complete_since = _MIN_TS
+        self._rings: Dict[str, _CompanyRing] = {}
+        self._by_ticker: Dict[str, str] = {}
+        self._source_codes: Dict[str, int] = {}
+        self._source_names: List[str] = []
+        self._ids = set()
+        self._lock = threading.RLock()
+        self._expired_at = 0
+
+    @property
+    def post_count(self) -> int:
+        return len(self._ids)
+
+    @property
+    def current(self) -> bool:
+        """Loaded, and fed recently enough that nothing committed since can be missing"""
+        if not self.ready:
+            return False
+        if self.bus is None or self.max_feed_age_seconds is None:
+            return True
+        return self.bus.fed_within(self.max_feed_age_seconds, since=self._loaded_at)
+
+    def _window_start(self, now: Optional[datetime] = None) -> int:
+        return to_micros((now or datetime.utcnow()) - timedelta(hours=self.window_hours))
+
+    def _source_code(self, source: str) -> int:
+        code = self._source_codes.get(source)
+        if code is None:
+            code = self._source_codes[source] = len(self._source_names)
+            self._source_names.append(source)
+        return code
+
+    def _add(self, post: Dict[str, Any], window_start: int) -> None:
+        post_id = post['id']
+        if post_id in self._ids:
+            return
+        ts = to_micros(datetime.fromisoformat(post['timestamp']))
+        if ts < window_start:
+            return
+        company_id = post['company_id']
+        ring = self._rings.get(company_id)
+        if ring is None:
+            ticker = (post.get('company') or {}).get('ticker')
+            industry = post.get('industry')
+            ring = self._rings[company_id] = _CompanyRing(
+                company_id, ticker, industry.capitalize() if industry else None, self.company_capacity
+            )
+            if ticker:
+                self._by_ticker[ticker] = company_id
+        id_hi, id_lo = _split_id(post_id)
+        stored = {key: value for key, value in post.items() if key not in ('industry', 'ingest_seq')}
+        evicted = ring.append(
+            ts, id_hi, id_lo,
+            self._source_code(post['source']),
+            SENTIMENT_CODES.get(post['sentiment'], 0),
+            post.get('confidence') or 0.0,
+            post.get('engagement') or 0,
+            stored
+        )
+        if evicted is not None:
+            self._ids.discard(evicted['id'])
+        self._ids.add(post_id)
+
+    def add_posts(self, posts: List[Dict[str, Any]], ingest_seq: Optional[int] = None) -> None:
+        """Ingest bus listener (subscribe with_position) for post events"""
+        now = datetime.utcnow()
+        window_start = self._window_start(now)
+        with self._lock:
+            for post in posts:
+                self._add(post, window_start)
+            if ingest_seq is not None and (self.ingest_seq is None or ingest_seq > self.ingest_seq):
+                self.ingest_seq = ingest_seq
+            # Posts older than the window were skipped, so only the window is complete
+            self.complete_since = max(self.complete_since, window_start)
+            if window_start - self._expired_at >= self.expire_interval_us:
+                self._expire(window_start)
+
+    def _expire(self, cutoff: int) -> None:
+        for ring in self._rings.values():
+            for post in ring.expire(cutoff):
+                self._ids.discard(post['id'])
+        self._expired_at = cutoff
+
+    def load(self, session: Session, batch_size: int = 5000) -> int:
+        """
+        Load the window from the database and mark the store ready
+
+        Posts are read oldest first, so a company that overflows its ring
+        keeps its newest posts. Events published meanwhile are merged
+        (duplicates are skipped by id), so the ingest tailer should already
+        be running when this is called.
+        """
+        now = datetime.utcnow()
+        loaded_at = time.monotonic()
+        window_start = self._window_start(now)
+        seq = current_ingest_seq(session)
+        stmt = post_event_query()\
+            .where(SentimentPostModel.timestamp >= now - timedelta(hours=self.window_hours))\
+            .order_by(SentimentPostModel.timestamp)\
+            .execution_options(stream_results=True, yield_per=batch_size)
+        loaded = 0
+        batch = []
+        for row in session.execute(stmt).mappings():
+            batch.append(serialize_post_event(row))
+            if len(batch) >= batch_size:
+                loaded += self._load_batch(batch, window_start)
+                batch = []
+        loaded += self._load_batch(batch, window_start)
+
+        with self._lock:
+            if self.ingest_seq is None or seq > self.ingest_seq:
+                self.ingest_seq = seq
+            self.complete_since = max(self.complete_since, window_start)
+            self._loaded_at = loaded_at
+            self.ready = True
+        logger.info(f"Hot store loaded {loaded} posts from the last {self.window_hours}h")
+        return loaded
+
+    def _load_batch(self, posts: List[Dict[str, Any]], window_start: int) -> int:
+        with self._lock:
+            for post in posts:
+                self._add(post, window_start)
+        return len(posts)
+
+    def start(self, session_factory) -> threading.Thread:
+        """Load in a background thread; queries fall through to the database until it finishes"""
+        def run():
+            session = session_factory()
+            try:
+                self.load(session)
+            except Exception as e:
+                logger.error(f"Error loading hot store: {e}")
+            finally:
+                session.close()
+        thread = threading.Thread(target=run, name='hot-store-load', daemon=True)
+        thread.start()
+        return thread
+
+    def _select_rings(self,
+                      company_ids: Optional[Iterable] = None,
+                      ticker: Optional[str] = None,
+                      industry: Optional[str] = None) -> Optional[List[_CompanyRing]]:
+        """Rings for the requested companies, or None if a company can't be resolved here"""
+        rings = list(self._rings.values())
+        if company_ids:
+            wanted = {str(uuid.UUID(str(cid))) for cid in company_ids}
+            rings = [ring for ring in rings if ring.company_id in wanted]
+        if ticker:
+            company_id = self._by_ticker.get(ticker.upper())
+            if company_id is None:
+                return None
+            rings = [ring for ring in rings if ring.company_id == company_id]
+        if industry:
+            rings = [ring for ring in rings if ring.industry == industry.capitalize()]
+            if not rings:
+                return None
+        return rings
+
+    def _complete_since(self, rings: List[_CompanyRing]) -> int:
+        bound = self.complete_since
+        for ring in rings:
+            if ring.evicted_max != _MIN_TS:
+                bound = max(bound, ring.evicted_max + 1)
+        return bound
+
+    def _mask(self, ring: _CompanyRing, start: Optional[int], source_codes, sentiment_codes, cursor=None) -> np.ndarray:
+        n = ring.size
+        ts = ring.ts[:n]
+        mask = np.ones(n, dtype=bool) if start is None else ts >= start
+        if source_codes is not None:
+            mask &= np.isin(ring.source[:n], source_codes)
+        if sentiment_codes is not None:
+            mask &= np.isin(ring.sentiment[:n], sentiment_codes)
+        if cursor is not None:
+            c_ts, c_hi, c_lo = cursor
+            hi = ring.id_hi[:n]
+            mask &= (ts < c_ts) | ((ts == c_ts) & ((hi < c_hi) | ((hi == c_hi) & (ring.id_lo[:n] < c_lo))))
+        return mask
+
+    def _codes(self, sources: Optional[List[str]], sentiments: Optional[List[str]]):
+        source_codes = None
+        if sources:
+            source_codes = np.array([self._source_codes[s] for s in sources if s in self._source_codes], dtype=np.int16)
+        sentiment_codes = None
+        if sentiments:
+            sentiment_codes = np.array([SENTIMENT_CODES[s] for s in sentiments if s in SENTIMENT_CODES], dtype=np.int8)
+        return source_codes, sentiment_codes
+
+    def _start(self, hours_back: Optional[int]) -> Optional[int]:
+        if not hours_back:
+            return None
+        return to_micros(datetime.utcnow() - timedelta(hours=hours_back))
+
+    def latest(self,
+               limit: int,
+               company_ids: Optional[List] = None,
+               ticker: Optional[str] = None,
+               industry: Optional[str] = None,
+               sources: Optional[List[str]] = None,
+               sentiments: Optional[List[str]] = None,
+               hours_back: Optional[int] = None,
+               cursor: Optional[str] = None) -> Optional[Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]]:
+        """
+        Newest posts in (timestamp DESC, id DESC) order, as a /posts page
+
+        Also answers windows longer than the store holds when the page fills
+        up with posts newer than complete_since, since anything missing is
+        older than all of them.
+
+        Returns:
+            Tuple of (posts, next keyset cursor or None, ingest_seq), or None
+            to fall back to the database
+
+        Raises:
+            ValueError: If the cursor or a company id is malformed
+        """
+        position = None
+        if cursor:
+            c_time, c_id = decode_cursor(cursor)
+            position = (to_micros(c_time), *_split_id(c_id))
+        start = self._start(hours_back)
+        wanted = limit + 1
+
+        with self._lock:
+            if not self.current:
+                return None
+            rings = self._select_rings(company_ids, ticker, industry)
+            if rings is None:
+                return None
+            source_codes, sentiment_codes = self._codes(sources, sentiments)
+
+            candidates = []
+            for ring_index, ring in enumerate(rings):
+                rows = np.flatnonzero(self._mask(ring, start, source_codes, sentiment_codes, position))
+                if len(rows) > wanted:
+                    # Keep every row tied with the wanted-th newest timestamp for the id tie-break
+                    ts = ring.ts[rows]
+                    threshold = np.partition(ts, len(rows) - wanted)[len(rows) - wanted]
+                    rows = rows[ts >= threshold]
+                if len(rows):
+                    candidates.append((ring_index, rows))
+
+            if candidates:
+                ring_of = np.concatenate([np.full(len(rows), i, dtype=np.int32) for i, rows in candidates])
+                row_of = np.concatenate([rows for _, rows in candidates])
+                ts = np.concatenate([rings[i].ts[rows] for i, rows in candidates])
+                hi = np.concatenate([rings[i].id_hi[rows] for i, rows in candidates])
+                lo = np.concatenate([rings[i].id_lo[rows] for i, rows in candidates])
+                order = np.lexsort((lo, hi, ts))[::-1][:wanted]
+            else:
+                order = ts = np.empty(0, dtype=np.int64)
+
+            bound = self._complete_since(rings)
+            covered = start is not None and start >= bound
+            if not covered and not (len(order) > limit and ts[order[limit - 1]] >= bound):
+                return None
+
+            page = [dict(rings[ring_of[i]].posts[row_of[i]]) for i in order[:limit]]
+            seq = self.ingest_seq
+
+        next_cursor = None
+        if len(order) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(datetime.fromisoformat(last['timestamp']), last['id'])
+        return page, next_cursor, seq
+
+    def count(self,
+              company_ids: Optional[List] = None,
+              sources: Optional[List[str]] = None,
+              sentiments: Optional[List[str]] = None,
+              hours_back: Optional[int] = None) -> Optional[int]:
+        """Matching posts in the window, or None if the window isn't fully held"""
+        start = self._start(hours_back)
+        with self._lock:
+            if not self.current or start is None:
+                return None
+            rings = self._select_rings(company_ids)
+            if start < self._complete_since(rings):
+                return None
+            source_codes, sentiment_codes = self._codes(sources, sentiments)
+            return int(sum(np.count_nonzero(self._mask(ring, start, source_codes, sentiment_codes)) for ring in rings))
+
+    def aggregate_totals(self,
+                         company_ids: Optional[List] = None,
+                         sources: Optional[List[str]] = None,
+                         hours_back: Optional[int] = None,
+                         group_by: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Sums in the shape of posts_aggregate_query rows, for aggregation_service.summarize
+
+        Returns:
+            One row per non-empty group (always one row when ungrouped), or
+            None if the window isn't fully held
+        """
+        group_by = group_by or []
+        start = self._start(hours_back)
+        with self._lock:
+            if not self.current or start is None:
+                return None
+            rings = self._select_rings(company_ids)
+            if start < self._complete_since(rings):
+                return None
+            source_codes, _ = self._codes(sources, None)
+
+            groups: Dict[Tuple, Dict[str, Any]] = {}
+            for ring in rings:
+                mask = self._mask(ring, start, source_codes, None)
+                if not mask.any():
+                    continue
+                if 'source' in group_by:
+                    codes = ring.source[:ring.size]
+                    parts = [(self._source_names[code], mask & (codes == code)) for code in np.unique(codes[mask])]
+                else:
+                    parts = [(None, mask)]
+                for source, part in parts:
+                    key = []
+                    labels = {}
+                    if 'company' in group_by:
+                        key.append(ring.company_id)
+                        labels.update(company_id=ring.company_id, ticker=ring.ticker)
+                    if 'source' in group_by:
+                        key.append(source)
+                        labels['source'] = source
+                    if 'industry' in group_by:
+                        key.append(ring.industry)
+                        labels['industry'] = ring.industry
+                    totals = groups.setdefault(tuple(key), {**labels, **_empty_totals()})
+                    _add_totals(totals, ring, part)
+
+            if not group_by and not groups:
+                return [_empty_totals()]
+            return list(groups.values())
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "post_count": 0, "positive_count": 0, "neutral_count": 0, "negative_count": 0,
+        "confidence_sum": 0.0, "engagement_sum": 0, "score_confidence_sum": 0.0, "score_engagement_sum": 0,
+    }
+
+def _add_totals(totals: Dict[str, Any], ring: _CompanyRing, mask: np.ndarray) -> None:
+    n = ring.size
+    sentiment = ring.sentiment[:n][mask].astype(np.int64)
+    confidence = ring.confidence[:n][mask]
+    engagement = ring.engagement[:n][mask]
+    totals["post_count"] += len(sentiment)
+    totals["positive_count"] += int(np.count_nonzero(sentiment == 1))
+    totals["neutral_count"] += int(np.count_nonzero(sentiment == 0))
+    totals["negative_count"] += int(np.count_nonzero(sentiment == -1))
+    totals["confidence_sum"] += float(confidence.sum())
+    totals["engagement_sum"] += int(engagement.sum())
+    totals["score_confidence_sum"] += float((sentiment * confidence).sum())
+    totals["score_engagement_sum"] += int((sentiment * engagement).sum())
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IngestListener = Callable[[List[Dict[str, Any]]], None]
+
+class IngestBus:
+    """
+    In-process fan-out of newly stored posts
+
+    The collector (or the ingest tailer, when the collector runs in another
+    process) publishes each committed batch once; live views such as the SSE
+    stream subscribe here instead of polling the database themselves.
+
+    Publishers that know it pass the batch's ingest position (the newest
+    ingest_seq it covers); listeners subscribed with_position receive it as
+    a second argument.
+
+    fed_at is when the bus was last known to be caught up with the
+    database (time.monotonic()): the last publish, or the last heartbeat
+    from the tailer. In-memory views that are only current while fed
+    compare against it.
+    """
+
+    def __init__(self):
+        self._listeners: List[Tuple[Callable, bool]] = []
+        self._lock = threading.Lock()
+        self.fed_at: Optional[float] = None
+
+    def subscribe(self, listener: Callable, with_position: bool = False) -> None:
+        with self._lock:
+            if all(existing is not listener for existing, _ in self._listeners):
+                self._listeners.append((listener, with_position))
+
+    def unsubscribe(self, listener: Callable) -> None:
+        with self._lock:
+            self._listeners = [entry for entry in self._listeners if entry[0] is not listener]
+
+    def heartbeat(self) -> None:
+        """Record that everything committed so far has been published"""
+        self.fed_at = time.monotonic()
+
+    def fed_within(self, max_age_seconds: float, since: float = 0.0) -> bool:
+        """
+        Whether the bus was caught up within the last max_age_seconds
+
+        since is a time.monotonic() at which a view was current by other
+        means, e.g. its own load from the database.
+        """
+        return time.monotonic() - max(since, self.fed_at or 0.0) <= max_age_seconds
+
+    @property
+    def has_listeners(self) -> bool:
+        return bool(self._listeners)
+
+    def publish(self, posts: List[Dict[str, Any]], position: Optional[int] = None) -> None:
+        """
+        Deliver a batch of serialized posts to every listener
+
+        Args:
+            posts: Posts in the SentimentPostModel.to_dict shape plus an "industry" key
+            position: Ingest position after this batch, if the publisher knows it
+        """
+        if not posts:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        self.fed_at = time.monotonic()
+        for listener, with_position in listeners:
+            try:
+                if with_position:
+                    listener(posts, position)
+                else:
+                    listener(posts)
+            except Exception as e:
+                logger.error(f"Error in ingest listener {getattr(listener, '__name__', listener)}: {e}")
+
+# Shared bus for the process
+ingest_bus = IngestBus()
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Any, Callable, Set
+
+logger = logging.getLogger(__name__)
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+class Subscription:
+    """One connected live-stream client with its filters and bounded buffer"""
+
+    def __init__(self,
+                 tickers: Optional[List[str]] = None,
+                 industries: Optional[List[str]] = None,
+                 sources: Optional[List[str]] = None,
+                 sentiments: Optional[List[str]] = None,
+                 buffer_size: int = 256):
+        self.tickers: Set[str] = {t.upper() for t in tickers or []}
+        self.industries: Set[str] = {i.lower() for i in industries or []}
+        self.sources: Set[str] = set(sources or [])
+        self.sentiments: Set[str] = set(sentiments or [])
+        self.queue: "queue.Queue[str]" = queue.Queue(maxsize=buffer_size)
+        self.evicted = False
+
+    def matches_post(self, post: Dict[str, Any]) -> bool:
+        company = post.get('company') or {}
+        if self.tickers and company.get('ticker') not in self.tickers:
+            return False
+        if self.industries and post.get('industry') not in self.industries:
+            return False
+        if self.sources and post.get('source') not in self.sources:
+            return False
+        if self.sentiments and post.get('sentiment') not in self.sentiments:
+            return False
+        return True
+
+    def matches_company(self, ticker: str, industry: Optional[str]) -> bool:
+        if self.tickers and ticker not in self.tickers:
+            return False
+        if self.industries and (industry or '').lower() not in self.industries:
+            return False
+        return True
+
+    def offer(self, message: str) -> bool:
+        """Queue a message without blocking; returns False if the buffer is full"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription read by an asyncio event loop instead of a WSGI thread
+
+    Publishing still happens on ingest threads, so messages are handed to
+    the loop with call_soon_threadsafe. The buffer limit is enforced on a
+    pending count taken under a lock, which includes messages not yet
+    delivered to the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int = 256, **filters):
+        super().__init__(buffer_size=buffer_size, **filters)
+        self.loop = loop
+        self.buffer_size = buffer_size
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def offer(self, message: str) -> bool:
+        with self._lock:
+            if self._pending >= self.buffer_size:
+                return False
+            self._pending += 1
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        except RuntimeError:
+            # Event loop already closed
+            return False
+        return True
+
+    async def get(self) -> str:
+        message = await self.queue.get()
+        with self._lock:
+            self._pending -= 1
+        return message
+
+class LiveStreamBroadcaster:
+    """
+    Fan newly ingested posts and refreshed aggregates out to SSE subscribers
+
+    Each subscriber gets a bounded buffer. Publishing never blocks on a client:
+    a subscriber whose buffer is full is evicted and its stream is closed, so
+    one slow dashboard can't hold memory or delay everyone else.
+
+    Aggregates are computed once per ingest batch (not once per client) by the
+    optional aggregate_loader, which receives the touched company ids and
+    returns per-company summaries with "ticker" and "industry" keys.
+    """
+
+    def __init__(self,
+                 buffer_size: int = 256,
+                 max_subscribers: int = 1000,
+                 aggregate_loader: Optional[Callable[[List[str]], List[Dict[str, Any]]]] = None):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.aggregate_loader = aggregate_loader
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.evicted_count = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self,
+                  subscription_class: Callable[..., Subscription] = Subscription,
+                  limit: Optional[int] = None,
+                  **filters) -> Optional[Subscription]:
+        """
+        Register a client; returns None when the subscriber limit is reached
+
+        limit lowers max_subscribers for this call, e.g. for clients that each
+        hold a blocking worker.
+        """
+        with self._lock:
+            cap = self.max_subscribers if limit is None else min(limit, self.max_subscribers)
+            if len(self._subscribers) >= cap:
+                return None
+            subscription = subscription_class(buffer_size=self.buffer_size, **filters)
+            self._subscribers.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def _deliver(self, subscription: Subscription, message: str) -> None:
+        if subscription.evicted:
+            return
+        if not subscription.offer(message):
+            subscription.evicted = True
+            self.evicted_count += 1
+            self.unsubscribe(subscription)
+            logger.warning("Evicted slow live-stream subscriber (buffer full)")
+
+    def publish_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Ingest bus listener: push posts, then refreshed aggregates for the touched companies"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+
+        for post in posts:
+            message = format_sse('post', post, event_id=post.get('id'))
+            for subscription in subscribers:
+                if subscription.matches_post(post):
+                    self._deliver(subscription, message)
+
+        if not self.aggregate_loader:
+            return
+        company_ids = sorted({post['company_id'] for post in posts})
+        try:
+            aggregates = self.aggregate_loader(company_ids)
+        except Exception as e:
+            logger.error(f"Error loading live aggregates: {e}")
+            return
+
+        for subscription in subscribers:
+            matching = [a for a in aggregates if subscription.matches_company(a.get('ticker'), a.get('industry'))]
+            if matching:
+                self._deliver(subscription, format_sse('aggregates', matching))
+
+    def publish_signals(self, signals: List[Dict[str, Any]]) -> None:
+        """AnomalyDetector listener: push each signal to subscribers following its company"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for signal in signals:
+            message = format_sse('anomaly', signal, event_id=f"signal-{signal['id']}")
+            for subscription in subscribers:
+                if subscription.matches_company(signal.get('ticker'), signal.get('industry')):
+                    self._deliver(subscription, message)
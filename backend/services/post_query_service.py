@@ -0,0 +1,282 @@
+import base64
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Any
+
+from sqlalchemy import and_, or_, select, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from models.models import SentimentPostModel, CompanyModel, IndustryModel
+from services.rollup_service import query_rollup_totals, SENTIMENT_SCORES
+from services.search_service import search_filter
+
+logger = logging.getLogger(__name__)
+
+# Columns read by list endpoints; company fields are joined in and labelled
+POST_COLUMNS = (
+    SentimentPostModel.id,
+    SentimentPostModel.company_id,
+    SentimentPostModel.content,
+    SentimentPostModel.sentiment,
+    SentimentPostModel.confidence,
+    SentimentPostModel.source,
+    SentimentPostModel.timestamp,
+    SentimentPostModel.author,
+    SentimentPostModel.engagement,
+    SentimentPostModel.original_url,
+    SentimentPostModel.created_at,
+)
+
+COMPANY_COLUMNS = (
+    CompanyModel.ticker.label('company_ticker'),
+    CompanyModel.name.label('company_name'),
+    CompanyModel.industry_id.label('company_industry_id'),
+    CompanyModel.created_at.label('company_created_at'),
+)
+
+def post_projection_query():
+    """
+    SELECT of post columns with company fields joined in
+
+    Rows come back as plain tuples rather than ORM instances, so there is no
+    identity map, no lazy loading and one query per page regardless of size.
+    """
+    return select(*POST_COLUMNS, *COMPANY_COLUMNS)\
+        .join(CompanyModel, CompanyModel.id == SentimentPostModel.company_id)
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def serialize_post_row(row) -> Dict[str, Any]:
+    """Serialize a post_projection_query row to the SentimentPostModel.to_dict shape"""
+    company_id = str(row['company_id'])
+    return {
+        "id": str(row['id']),
+        "company_id": company_id,
+        "content": row['content'],
+        "sentiment": row['sentiment'],
+        "confidence": row['confidence'],
+        "source": row['source'],
+        "timestamp": _isoformat(row['timestamp']),
+        "author": row['author'],
+        "engagement": row['engagement'],
+        "original_url": row['original_url'],
+        "created_at": _isoformat(row['created_at']),
+        "company": {
+            "id": company_id,
+            "ticker": row['company_ticker'],
+            "name": row['company_name'],
+            "industry_id": str(row['company_industry_id']),
+            "created_at": _isoformat(row['company_created_at'])
+        }
+    }
+
+def fetch_post_rows(session: Session, stmt) -> List[Dict[str, Any]]:
+    """Execute a projection query and serialize its rows"""
+    return [serialize_post_row(row) for row in session.execute(stmt).mappings()]
+
+def post_event_query():
+    """post_projection_query plus the industry name and ingest position, used for live ingest events"""
+    return post_projection_query()\
+        .add_columns(IndustryModel.name.label('industry'), SentimentPostModel.ingest_seq)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)
+
+def serialize_post_event(row) -> Dict[str, Any]:
+    """Serialize a post_event_query row: the to_dict shape plus lower-case "industry" and "ingest_seq" keys"""
+    post = serialize_post_row(row)
+    post["industry"] = row['industry'].lower() if row['industry'] else None
+    post["ingest_seq"] = row['ingest_seq']
+    return post
+
+def fetch_post_events(session: Session, post_ids: List) -> List[Dict[str, Any]]:
+    """Load freshly stored posts as ingest events in one query"""
+    if not post_ids:
+        return []
+    stmt = post_event_query()\
+        .where(SentimentPostModel.id.in_(post_ids))\
+        .order_by(SentimentPostModel.timestamp, SentimentPostModel.id)
+    return [serialize_post_event(row) for row in session.execute(stmt).mappings()]
+
+def industry_filter(industry: str):
+    """WHERE clause restricting a post_projection_query to one industry by name"""
+    return CompanyModel.industry_id.in_(
+        select(IndustryModel.id).where(IndustryModel.name == industry.capitalize())
+    )
+
+def apply_post_filters(query,
+                       dialect: str,
+                       sources: Optional[List[str]] = None,
+                       sentiments: Optional[List[str]] = None,
+                       company_ids: Optional[List[str]] = None,
+                       search_query: Optional[str] = None,
+                       hours_back: Optional[int] = None):
+    """
+    Apply the standard /posts filters to an ORM Query or Core Select
+
+    Raises:
+        ValueError: If a company id is not a valid UUID
+    """
+    if hours_back:
+        time_cutoff = datetime.utcnow() - timedelta(hours=hours_back)
+        query = query.filter(SentimentPostModel.timestamp >= time_cutoff)
+    if sources:
+        query = query.filter(SentimentPostModel.source.in_(sources))
+    if sentiments:
+        query = query.filter(SentimentPostModel.sentiment.in_(sentiments))
+    if company_ids:
+        query = query.filter(SentimentPostModel.company_id.in_([uuid.UUID(str(cid)) for cid in company_ids]))
+    if search_query:
+        query = query.filter(search_filter(search_query, dialect))
+    return query
+
+def encode_cursor(timestamp: datetime, post_id: Any) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token"""
+    payload = json.dumps([timestamp.isoformat(), str(post_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    Decode a token produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, post_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), uuid.UUID(post_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_filter(cursor: str):
+    """
+    WHERE clause selecting posts strictly after a cursor in (timestamp DESC, id DESC) order
+
+    Served by idx_timestamp_id_desc, so every page costs one index range scan
+    no matter how deep the client has scrolled.
+    """
+    timestamp, post_id = decode_cursor(cursor)
+    return or_(
+        SentimentPostModel.timestamp < timestamp,
+        and_(SentimentPostModel.timestamp == timestamp, SentimentPostModel.id < post_id)
+    )
+
+KEYSET_ORDER = (SentimentPostModel.timestamp.desc(), SentimentPostModel.id.desc())
+
+# Columns of the compact delta-sync payload, in row order
+CHANGE_FIELDS = (
+    'id', 'company_ticker', 'sentiment', 'confidence', 'source',
+    'timestamp', 'author', 'engagement', 'content', 'original_url',
+)
+
+def encode_ingest_cursor(ingest_seq: int) -> str:
+    """Encode an ingest_seq position as an opaque URL-safe token"""
+    payload = json.dumps(['i', int(ingest_seq)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_ingest_cursor(cursor: str) -> int:
+    """
+    Decode a token produced by encode_ingest_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        kind, ingest_seq = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind != 'i' or not isinstance(ingest_seq, int):
+            raise ValueError(f"Not an ingest cursor: {cursor}")
+        return ingest_seq
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid ingest cursor: {cursor}") from e
+
+def current_ingest_seq(session: Session) -> int:
+    """
+    Newest ingest position, or 0 for an empty table
+
+    Safe to resume from: writers take lock_ingest, so no post still in
+    flight can commit below it.
+    """
+    return session.execute(select(func.max(SentimentPostModel.ingest_seq))).scalar() or 0
+
+def change_query(since: int):
+    """Compact projection of posts ingested after `since`, in ingest order"""
+    post = SentimentPostModel
+    return select(
+        post.ingest_seq,
+        post.id,
+        CompanyModel.ticker.label('company_ticker'),
+        post.sentiment,
+        post.confidence,
+        post.source,
+        post.timestamp,
+        post.author,
+        post.engagement,
+        post.content,
+        post.original_url,
+    ).join(CompanyModel, CompanyModel.id == post.company_id)\
+        .where(post.ingest_seq > since)\
+        .order_by(post.ingest_seq)
+
+def serialize_change_row(row) -> List[Any]:
+    """One delta-sync row, ordered as CHANGE_FIELDS"""
+    values = []
+    for field in CHANGE_FIELDS:
+        value = row[field]
+        if field == 'id':
+            value = str(value)
+        elif field == 'timestamp':
+            value = _isoformat(value)
+        values.append(value)
+    return values
+
+class _ExplainJSON(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper that keeps the inner statement's bind processing"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(_ExplainJSON, 'postgresql')
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+def estimate_post_count(session: Session,
+                        sources: Optional[List[str]] = None,
+                        sentiments: Optional[List[str]] = None,
+                        company_ids: Optional[List[str]] = None,
+                        search_query: Optional[str] = None,
+                        hours_back: Optional[int] = None) -> Optional[int]:
+    """
+    Cheaply estimate how many posts match the /posts filters
+
+    Without a text search the answer comes from the rollup tables (exact to
+    the minute). With a search, PostgreSQL's planner row estimate is used.
+
+    Returns:
+        Estimated count, or None if no cheap estimate is available
+    """
+    if not search_query:
+        since = datetime.utcnow() - timedelta(hours=hours_back) if hours_back else None
+        totals = query_rollup_totals(session, company_ids=company_ids, sources=sources, since=since)[0]
+        if not sentiments:
+            return int(totals['post_count'])
+        return int(sum(totals[f'{s}_count'] for s in sentiments if s in SENTIMENT_SCORES))
+
+    dialect = session.get_bind().dialect.name
+    if dialect != 'postgresql':
+        return None
+
+    stmt = apply_post_filters(
+        select(SentimentPostModel.id), dialect,
+        sources=sources, sentiments=sentiments, company_ids=company_ids,
+        search_query=search_query, hours_back=hours_back
+    )
+    plan = session.execute(_ExplainJSON(stmt)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,177 @@
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from flask import Response, make_response, request
+
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class _CacheEntry:
+    __slots__ = ('body', 'mimetype', 'headers', 'status', 'etag', 'generation', 'stored_at')
+
+    def __init__(self, body: bytes, mimetype: str, headers: Dict[str, str], generation: int, stored_at: float, status: int = 200):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.status = status
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.generation = generation
+        self.stored_at = stored_at
+
+def _encode_entry(entry: _CacheEntry) -> bytes:
+    """Serialize an entry for workers coalescing through the file lock"""
+    meta = {"mimetype": entry.mimetype, "headers": entry.headers, "status": entry.status}
+    return json.dumps(meta).encode('utf-8') + b'\n' + entry.body
+
+def _decode_entry(data: bytes) -> _CacheEntry:
+    meta, body = data.split(b'\n', 1)
+    meta = json.loads(meta)
+    # Generations are per process; the caller restamps the entry with its own
+    return _CacheEntry(body, meta['mimetype'], meta['headers'], generation=-1, stored_at=time.monotonic(), status=meta['status'])
+
+class ResponseCache:
+    """
+    In-process cache of read-endpoint responses, invalidated by ingest
+
+    Entries are keyed by path, normalized query parameters and the Accept
+    header (it selects the body format), and stamped with the ingest
+    generation they were built at. The generation advances when the ingest
+    bus publishes (collector or tailer in this process) or when the
+    database's newest ingest position moves, which is checked at most once
+    per generation_check_seconds. Entries also age out after
+    max_age_seconds because "last N hours" windows slide with the clock.
+
+    Once an entry is invalid, the first request for its key rebuilds it while
+    concurrent requests keep getting the stale copy for up to stale_seconds,
+    so a hot key costs one query per invalidation instead of one per client.
+    Requests with no usable copy join the rebuild in flight rather than
+    starting their own (single flight); with coalesce_dir set, workers
+    coalesce with each other through a file lock per key as well.
+    Every cached response carries an ETag and answers If-None-Match with 304.
+    """
+
+    def __init__(self,
+                 generation_loader: Optional[Callable[[], Any]] = None,
+                 max_age_seconds: float = 30.0,
+                 stale_seconds: float = 60.0,
+                 max_entries: int = 1024,
+                 generation_check_seconds: float = 1.0,
+                 list_args: Iterable[str] = (),
+                 coalesce_dir: Optional[str] = None):
+        self.generation_loader = generation_loader
+        self.max_age_seconds = max_age_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.generation_check_seconds = generation_check_seconds
+        self.list_args = frozenset(list_args)
+        self._entries: "OrderedDict[Tuple, _CacheEntry]" = OrderedDict()
+        self.flight = SingleFlight(lock_dir=coalesce_dir, encode=_encode_entry, decode=_decode_entry)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._marker = None
+        self._checked_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_seconds > 0
+
+    def bump(self, *_args) -> None:
+        """Invalidate every entry; usable directly as an ingest bus listener"""
+        with self._lock:
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def current_generation(self) -> int:
+        now = time.monotonic()
+        if self.generation_loader and now - self._checked_at >= self.generation_check_seconds:
+            self._checked_at = now
+            try:
+                marker = self.generation_loader()
+            except Exception as e:
+                logger.error(f"Error checking ingest generation: {e}")
+            else:
+                with self._lock:
+                    if marker != self._marker:
+                        self._marker = marker
+                        self._generation += 1
+        return self._generation
+
+    def make_key(self) -> Tuple:
+        """Path, query parameters (order, repeats and list formatting normalized) and Accept"""
+        params = []
+        for name in sorted(request.args):
+            values = request.args.getlist(name)
+            if name in self.list_args:
+                values = sorted({v.strip() for raw in values for v in raw.split(',') if v.strip()})
+            if values:
+                params.append((name, tuple(values)))
+        # Content negotiation picks the body format, so Accept is part of the key
+        return (request.path, tuple(params), request.headers.get('Accept', ''))
+
+    def _respond(self, entry: _CacheEntry, status: str) -> Response:
+        response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+        response.headers.update(entry.headers)
+        response.headers['X-Cache'] = status
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(entry.etag)
+        return response.make_conditional(request)
+
+    def _store(self, key: Tuple, entry: _CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _build(self, view: Callable, args, kwargs) -> _CacheEntry:
+        response = make_response(view(*args, **kwargs))
+        return _CacheEntry(
+            body=response.get_data(),
+            mimetype=response.mimetype,
+            headers={name: value for name, value in response.headers.items() if name.startswith('X-') or name in ('Vary', 'Retry-After')},
+            generation=-1,
+            stored_at=time.monotonic(),
+            status=response.status_code
+        )
+
+    def cached(self, view: Callable) -> Callable:
+        """Decorator for GET views whose output depends only on path, query and stored data"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = self.make_key()
+            generation = self.current_generation()
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    age = now - entry.stored_at
+                    if entry.generation == generation and age < self.max_age_seconds:
+                        return self._respond(entry, 'HIT')
+                    if self.flight.in_flight(key) and age < self.max_age_seconds + self.stale_seconds:
+                        return self._respond(entry, 'STALE')
+
+            entry, shared = self.flight.do(key, lambda: self._build(view, args, kwargs))
+            if entry.status != 200:
+                # Errors are shared with requests already waiting, never stored
+                return self._respond(entry, 'MISS')
+            if not shared:
+                entry.generation = generation
+                entry.stored_at = now
+                self._store(key, entry)
+            return self._respond(entry, 'COALESCED' if shared else 'MISS')
+
+        return wrapper
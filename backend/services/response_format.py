@@ -0,0 +1,133 @@
+import functools
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Optional encoders; each format is offered only when its library is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Fields a list endpoint can project; "company" is returned through a companies map
+POST_FIELDS = (
+    'id', 'company_id', 'content', 'sentiment', 'confidence', 'source', 'timestamp',
+    'author', 'engagement', 'original_url', 'created_at', 'company',
+)
+
+def available_formats() -> Dict[str, str]:
+    """Format name to mimetype for every format that can be produced here"""
+    formats = {'json': JSON_MIMETYPE}
+    if msgpack is not None:
+        formats['msgpack'] = MSGPACK_MIMETYPE
+    if pyarrow is not None:
+        formats['arrow'] = ARROW_MIMETYPE
+    return formats
+
+def negotiate_format() -> Optional[str]:
+    """
+    Pick the response format from ?format= or the Accept header
+
+    Returns:
+        The format name, or None if nothing acceptable can be produced
+    """
+    formats = available_formats()
+    requested = request.args.get('format')
+    if requested:
+        return requested if requested in formats else None
+    if not request.accept_mimetypes:
+        return 'json'
+    by_mimetype = {mimetype: name for name, mimetype in formats.items()}
+    by_mimetype.setdefault('application/x-msgpack', formats.get('msgpack'))
+    best = request.accept_mimetypes.best_match([m for m, name in by_mimetype.items() if name])
+    return by_mimetype.get(best) if best else None
+
+def negotiated(view):
+    """Resolve the response format into g.response_format, answering 406 when none fits"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response_format = negotiate_format()
+        if response_format is None:
+            return jsonify({"error": "Not acceptable", "available": sorted(available_formats().values())}), 406
+        g.response_format = response_format
+        return view(*args, **kwargs)
+    return wrapper
+
+def parse_fields(raw: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse ?fields=a,b,c
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not raw:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in POST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def project_posts(posts: List[Dict[str, Any]], fields: Optional[Tuple[str, ...]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Keep only the requested fields and move company objects into a map
+
+    Each post keeps "company_id"; the company itself appears once in the
+    returned companies map however many posts reference it.
+    """
+    fields = fields or POST_FIELDS
+    include_company = 'company' in fields
+    keep = [f for f in fields if f != 'company']
+    if include_company and 'company_id' not in keep:
+        keep.append('company_id')
+
+    companies: Dict[str, Any] = {}
+    projected = []
+    for post in posts:
+        projected.append({field: post[field] for field in keep})
+        if include_company and post.get('company'):
+            companies.setdefault(post['company_id'], post['company'])
+    return projected, companies
+
+def _arrow_body(payload: Dict[str, Any]) -> bytes:
+    """Posts as an Arrow IPC stream; the rest of the payload rides in schema metadata"""
+    table = pyarrow.Table.from_pylist(payload.get('posts', []))
+    meta = {key: value for key, value in payload.items() if key != 'posts'}
+    table = table.replace_schema_metadata({'meta': json.dumps(meta, separators=(',', ':'))})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode(payload: Any, response_format: str = 'json') -> Response:
+    """Encode a payload in the negotiated format"""
+    if response_format == 'msgpack':
+        body, mimetype = msgpack.packb(payload, use_bin_type=True), MSGPACK_MIMETYPE
+    elif response_format == 'arrow':
+        body, mimetype = _arrow_body(payload), ARROW_MIMETYPE
+    elif orjson is not None:
+        body, mimetype = orjson.dumps(payload), JSON_MIMETYPE
+    else:
+        body, mimetype = json.dumps(payload, separators=(',', ':')), JSON_MIMETYPE
+    response = Response(body, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept'
+    return response
@@ -0,0 +1,264 @@
+import logging
+import uuid
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Iterable, Any, Tuple
+
+from sqlalchemy import select, delete, func, and_, or_
+from sqlalchemy.orm import Session
+
+from models.models import SentimentRollupModel, SentimentPostModel
+
+logger = logging.getLogger(__name__)
+
+# Score assigned to each sentiment label when averaging
+SENTIMENT_SCORES = {"positive": 1, "neutral": 0, "negative": -1}
+
+ROLLUP_GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+}
+
+# Keeps multi-row upserts well under PostgreSQL's bind parameter limit
+_UPSERT_CHUNK_SIZE = 1000
+
+ROLLUP_SUM_COLUMNS = (
+    'post_count',
+    'positive_count',
+    'neutral_count',
+    'negative_count',
+    'confidence_sum',
+    'engagement_sum',
+    'score_confidence_sum',
+    'score_engagement_sum',
+)
+
+def as_uuid(value) -> uuid.UUID:
+    """Coerce a UUID or its string form to uuid.UUID"""
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its rollup bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup granularity: {granularity}")
+
+def _post_value(post: Any, field: str):
+    if isinstance(post, Mapping):
+        return post.get(field)
+    return getattr(post, field)
+
+def build_rollup_deltas(posts: Iterable[Any]) -> Dict[Tuple, Dict[str, float]]:
+    """
+    Aggregate posts into per-bucket deltas for every rollup granularity
+
+    Args:
+        posts: SentimentPostModel instances or dicts with the same fields
+
+    Returns:
+        Mapping of (company_id, source, granularity, bucket_start) to column deltas
+    """
+    deltas: Dict[Tuple, Dict[str, float]] = {}
+
+    for post in posts:
+        timestamp = _post_value(post, 'timestamp') or datetime.utcnow()
+        company_id = as_uuid(_post_value(post, 'company_id'))
+        source = _post_value(post, 'source')
+        sentiment = _post_value(post, 'sentiment')
+        confidence = float(_post_value(post, 'confidence') or 0.0)
+        engagement = int(_post_value(post, 'engagement') or 0)
+        score = SENTIMENT_SCORES.get(sentiment, 0)
+
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (company_id, source, granularity, bucket_start(timestamp, granularity))
+            delta = deltas.get(key)
+            if delta is None:
+                delta = deltas[key] = {column: 0 for column in ROLLUP_SUM_COLUMNS}
+            delta['post_count'] += 1
+            if sentiment in SENTIMENT_SCORES:
+                delta[f'{sentiment}_count'] += 1
+            delta['confidence_sum'] += confidence
+            delta['engagement_sum'] += engagement
+            delta['score_confidence_sum'] += score * confidence
+            delta['score_engagement_sum'] += score * engagement
+
+    return deltas
+
+def _upsert_deltas(session: Session, deltas: Dict[Tuple, Dict[str, float]]):
+    """Add deltas onto existing rollup rows, creating rows that don't exist yet"""
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        dict(company_id=key[0], source=key[1], granularity=key[2], bucket_start=key[3], updated_at=now, **delta)
+        for key, delta in deltas.items()
+    ]
+    dialect = session.get_bind().dialect.name
+    table = SentimentRollupModel.__table__
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        for offset in range(0, len(rows), _UPSERT_CHUNK_SIZE):
+            stmt = insert(table).values(rows[offset:offset + _UPSERT_CHUNK_SIZE])
+            update_columns = {column: table.c[column] + stmt.excluded[column] for column in ROLLUP_SUM_COLUMNS}
+            update_columns['updated_at'] = stmt.excluded.updated_at
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['company_id', 'source', 'granularity', 'bucket_start'],
+                set_=update_columns
+            )
+            session.execute(stmt)
+        return
+
+    # Generic fallback for dialects without native upsert support
+    for row in rows:
+        existing = session.get(SentimentRollupModel, (row['company_id'], row['source'], row['granularity'], row['bucket_start']))
+        if existing is None:
+            session.add(SentimentRollupModel(**row))
+            continue
+        for column in ROLLUP_SUM_COLUMNS:
+            setattr(existing, column, (getattr(existing, column) or 0) + row[column])
+        existing.updated_at = now
+
+def apply_posts_to_rollups(session: Session, posts: Iterable[Any]) -> int:
+    """
+    Fold newly stored posts into the rollup tables
+
+    Runs inside the caller's transaction so rollups commit (or roll back)
+    together with the posts themselves.
+
+    Returns:
+        Number of rollup buckets touched
+    """
+    deltas = build_rollup_deltas(posts)
+    _upsert_deltas(session, deltas)
+    return len(deltas)
+
+def _ceil(timestamp: datetime, granularity: str) -> datetime:
+    start = bucket_start(timestamp, granularity)
+    return start if start == timestamp else start + ROLLUP_GRANULARITIES[granularity]
+
+def _window_condition(since: Optional[datetime], until: Optional[datetime]):
+    """
+    Build a filter selecting the rollup rows that cover [since, until)
+
+    Whole hours are read from hourly buckets and the ragged edges from minute
+    buckets, so any window resolves to minute precision while reading at most
+    ~120 minute rows per series at the edges.
+    """
+    rollup = SentimentRollupModel
+    if since is None and until is None:
+        return rollup.granularity == 'hour'
+
+    if since is not None:
+        since = bucket_start(since, 'minute')
+    if until is not None:
+        until = _ceil(until, 'minute')
+
+    hour_from = _ceil(since, 'hour') if since is not None else None
+    hour_to = bucket_start(until, 'hour') if until is not None else None
+    if hour_from is not None and hour_to is not None and hour_from > hour_to:
+        # Window sits inside a single hour; answer it from minute buckets only
+        return and_(rollup.granularity == 'minute', rollup.bucket_start >= since, rollup.bucket_start < until)
+
+    conditions = []
+    hour_filters = [rollup.granularity == 'hour']
+    if hour_from is not None:
+        hour_filters.append(rollup.bucket_start >= hour_from)
+        conditions.append(and_(rollup.granularity == 'minute', rollup.bucket_start >= since, rollup.bucket_start < hour_from))
+    if hour_to is not None:
+        hour_filters.append(rollup.bucket_start < hour_to)
+        conditions.append(and_(rollup.granularity == 'minute', rollup.bucket_start >= hour_to, rollup.bucket_start < until))
+    conditions.append(and_(*hour_filters))
+    return or_(*conditions)
+
+def rollup_totals_query(company_ids: Optional[List] = None,
+                        sources: Optional[List[str]] = None,
+                        since: Optional[datetime] = None,
+                        until: Optional[datetime] = None,
+                        group_by: Optional[List[str]] = None):
+    """
+    Build a SELECT summing rollup rows over a window
+
+    Args:
+        company_ids: Restrict to these companies
+        sources: Restrict to these sources
+        since: Inclusive window start (None for all retained data)
+        until: Exclusive window end (None for open-ended)
+        group_by: Optional rollup columns to group by (e.g. ['company_id', 'source'])
+    """
+    rollup = SentimentRollupModel
+    group_columns = [getattr(rollup, column) for column in (group_by or [])]
+    sums = [func.coalesce(func.sum(getattr(rollup, column)), 0).label(column) for column in ROLLUP_SUM_COLUMNS]
+
+    stmt = select(*group_columns, *sums).where(_window_condition(since, until))
+    if company_ids:
+        stmt = stmt.where(rollup.company_id.in_([as_uuid(cid) for cid in company_ids]))
+    if sources:
+        stmt = stmt.where(rollup.source.in_(sources))
+    if group_columns:
+        stmt = stmt.group_by(*group_columns)
+    return stmt
+
+def query_rollup_totals(session: Session, **kwargs) -> List[Dict[str, Any]]:
+    """Execute rollup_totals_query and return plain dict rows"""
+    return [dict(row) for row in session.execute(rollup_totals_query(**kwargs)).mappings()]
+
+def average_score(totals: Dict[str, Any]) -> Optional[float]:
+    """Unweighted average of +1/0/-1 sentiment scores for a totals row"""
+    count = totals.get('post_count') or 0
+    if not count:
+        return None
+    return (totals['positive_count'] - totals['negative_count']) / count
+
+def prune_rollups(session: Session, cutoff: datetime) -> int:
+    """Delete rollup buckets that ended before the retention cutoff"""
+    rollup = SentimentRollupModel
+    deleted = 0
+    for granularity, width in ROLLUP_GRANULARITIES.items():
+        result = session.execute(
+            delete(rollup)
+            .where(rollup.granularity == granularity)
+            .where(rollup.bucket_start <= cutoff - width)
+        )
+        deleted += result.rowcount or 0
+    return deleted
+
+def rebuild_rollups(session: Session, batch_size: int = 5000) -> int:
+    """
+    Recompute all rollups from sentiment_posts
+
+    Used to backfill the tables for posts stored before rollups existed.
+    Posts are streamed in batches so memory stays flat.
+
+    Returns:
+        Number of posts folded into the rollups
+    """
+    session.execute(delete(SentimentRollupModel))
+
+    columns = (
+        SentimentPostModel.company_id,
+        SentimentPostModel.source,
+        SentimentPostModel.sentiment,
+        SentimentPostModel.confidence,
+        SentimentPostModel.engagement,
+        SentimentPostModel.timestamp,
+    )
+    result = session.execute(
+        select(*columns).execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+    total = 0
+    for batch in result.mappings().partitions(batch_size):
+        apply_posts_to_rollups(session, batch)
+        total += len(batch)
+
+    session.commit()
+    logger.info(f"Rebuilt rollups from {total} posts")
+    return total
@@ -0,0 +1,88 @@
+import logging
+from typing import List
+
+from sqlalchemy import func, literal_column, or_, text
+
+from models.models import SentimentPostModel
+
+logger = logging.getLogger(__name__)
+
+# FTS5 trigram tokens need at least three characters to match
+_SQLITE_MIN_TRIGRAM_LENGTH = 3
+
+# Whether sentiment_posts.search_vector exists on PostgreSQL (set by
+# ensure_search_schema); until it does, search falls back to ILIKE
+_search_vector_available = False
+
+def set_search_vector_available(available: bool) -> None:
+    global _search_vector_available
+    _search_vector_available = available
+
+def _escape_like(search_query: str) -> str:
+    return search_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _substring_filter(search_query: str):
+    """Plain case-insensitive substring match (the original search semantics)"""
+    return SentimentPostModel.content.ilike(f"%{_escape_like(search_query)}%", escape='\\')
+
+def _fts5_phrase(search_query: str) -> str:
+    """Quote the search text as a single FTS5 phrase so user input can't inject query syntax"""
+    return '"' + search_query.replace('"', '""') + '"'
+
+def _uses_sqlite_fts(search_query: str) -> bool:
+    return len(search_query) >= _SQLITE_MIN_TRIGRAM_LENGTH
+
+def _postgres_tsquery(search_query: str):
+    return func.websearch_to_tsquery('english', search_query)
+
+def search_filter(search_query: str, dialect: str):
+    """
+    Build a WHERE clause matching posts against a search query
+
+    The clause is a superset of the old ILIKE '%term%' behaviour: substring
+    matches still hit, but they are served from indexes instead of a
+    sequential scan.
+
+    Args:
+        search_query: Raw text from the search box
+        dialect: SQLAlchemy dialect name of the bound engine
+
+    Returns:
+        SQL expression usable in Query.filter / Select.where
+    """
+    if dialect == 'postgresql' and _search_vector_available:
+        # websearch_to_tsquery hits the GIN tsvector index; the ILIKE branch is
+        # answered from the pg_trgm index (when installed) and keeps substring matches working
+        search_vector = literal_column('sentiment_posts.search_vector')
+        return or_(
+            search_vector.op('@@')(_postgres_tsquery(search_query)),
+            _substring_filter(search_query)
+        )
+
+    if dialect == 'sqlite' and _uses_sqlite_fts(search_query):
+        return text(
+            "sentiment_posts.rowid IN "
+            "(SELECT rowid FROM sentiment_posts_fts WHERE sentiment_posts_fts MATCH :fts_match)"
+        ).bindparams(fts_match=_fts5_phrase(search_query))
+
+    return _substring_filter(search_query)
+
+def search_rank_order(search_query: str, dialect: str) -> List:
+    """
+    Build ORDER BY clauses ranking matches by relevance (best first)
+
+    Returns an empty list when the backend has no ranking function, in which
+    case callers fall back to timestamp ordering.
+    """
+    if dialect == 'postgresql' and _search_vector_available:
+        search_vector = literal_column('sentiment_posts.search_vector')
+        return [func.ts_rank_cd(search_vector, _postgres_tsquery(search_query)).desc()]
+
+    if dialect == 'sqlite' and _uses_sqlite_fts(search_query):
+        # bm25() scores are negative, lower is better
+        return [text(
+            "(SELECT bm25(sentiment_posts_fts) FROM sentiment_posts_fts "
+            "WHERE sentiment_posts_fts MATCH :fts_rank AND sentiment_posts_fts.rowid = sentiment_posts.rowid) ASC"
+        ).bindparams(fts_rank=_fts5_phrase(search_query))]
+
+    return []
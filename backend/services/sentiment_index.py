@@ -0,0 +1,348 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import CompanyModel, IndustryModel, SentimentIndexCheckpointModel, SentimentPostModel
+from services.ingest_bus import IngestBus
+from services.rollup_service import SENTIMENT_SCORES
+
+logger = logging.getLogger(__name__)
+
+MARKET = ('market', '')
+
+# Re-anchor the sums once growth factors reach e^50, long before floats overflow
+_REBASE_EXPONENT = 50.0
+
+_UPSERT_CHUNK_SIZE = 1000
+_CHECKPOINT_COLUMNS = ('half_life_hours', 'score_sum', 'weight_sum', 'post_sum', 'as_of', 'ingest_seq')
+
+def post_weight(post: Dict[str, Any]) -> float:
+    """Confidence (as a fraction) times (1 + engagement), so unliked posts still count"""
+    return float(post.get('confidence') or 0.0) / 100.0 * (1 + int(post.get('engagement') or 0))
+
+def _timestamp(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _upsert_checkpoints(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert or overwrite checkpoint rows in one statement per chunk
+
+    Workers checkpoint concurrently, so a row another worker wrote since is
+    only overwritten by a checkpoint covering at least as many posts.
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    table = SentimentIndexCheckpointModel.__table__
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        for offset in range(0, len(rows), _UPSERT_CHUNK_SIZE):
+            stmt = insert(table).values(rows[offset:offset + _UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['kind', 'key'],
+                set_={column: stmt.excluded[column] for column in _CHECKPOINT_COLUMNS},
+                where=table.c.ingest_seq <= stmt.excluded.ingest_seq
+            )
+            session.execute(stmt)
+        return
+
+    # Generic fallback for dialects without native upsert support
+    for row in rows:
+        existing = session.get(SentimentIndexCheckpointModel, (row['kind'], row['key']))
+        if existing is None:
+            session.add(SentimentIndexCheckpointModel(**row))
+        elif existing.ingest_seq <= row['ingest_seq']:
+            for column in _CHECKPOINT_COLUMNS:
+                setattr(existing, column, row[column])
+
+def _replay_query(since_seq: int, batch_size: int):
+    """Posts ingested after since_seq, in ingest order, with the fields the index needs"""
+    post = SentimentPostModel
+    return select(
+        post.company_id, post.sentiment, post.confidence, post.engagement, post.timestamp, post.ingest_seq,
+        IndustryModel.name.label('industry')
+    ).join(CompanyModel, CompanyModel.id == post.company_id)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .where(post.ingest_seq > since_seq)\
+        .order_by(post.ingest_seq)\
+        .execution_options(stream_results=True, yield_per=batch_size)
+
+class DecayedSentimentIndex:
+    """
+    Exponentially time-decayed, engagement- and confidence-weighted sentiment
+
+    For each series (the market, each company and each industry) it keeps
+    sums of weight * score, weight and post count, where each post's terms
+    decay by half every half_life_hours from its timestamp. The index is
+    their ratio, a weighted mean score in [-1, 1] dominated by recent,
+    engaged, confident posts.
+
+    Sums are kept relative to a fixed landmark time (forward decay): a post
+    adds its terms scaled by e^(rate * (timestamp - landmark)), so ingest is
+    O(1) per post and nothing is rescaled as time passes; reads multiply by
+    e^(-rate * (now - landmark)). The landmark moves forward when the
+    scale factors grow large.
+
+    State is checkpointed to sentiment_index_checkpoints with the ingest_seq
+    it covers; on startup the index loads the checkpoint and replays only
+    the posts ingested after it.
+
+    With a bus and max_feed_age_seconds, reads return None once neither the
+    bus nor the index's own load or catch_up has vouched for it within that
+    long. While the bus is quiet, start() runs catch_up itself, so the
+    index keeps up without the ingest tailer.
+    """
+
+    def __init__(self,
+                 half_life_hours: float = 6.0,
+                 bus: Optional[IngestBus] = None,
+                 max_feed_age_seconds: Optional[float] = None):
+        if half_life_hours <= 0:
+            raise ValueError("half_life_hours must be positive")
+        self.half_life_hours = half_life_hours
+        self.rate = math.log(2) / (half_life_hours * 3600)
+        self.bus = bus
+        self.max_feed_age_seconds = max_feed_age_seconds
+        self._caught_up_at = 0.0
+        self.ready = False
+        self.applied_seq = 0
+        self._landmark = datetime.utcnow()
+        self._series: Dict[Tuple[str, str], List[float]] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+    def _bus_fed(self) -> bool:
+        return self.bus is not None and self.max_feed_age_seconds is not None and \
+            self.bus.fed_within(self.max_feed_age_seconds)
+
+    @property
+    def current(self) -> bool:
+        """Loaded, and fed or caught up recently enough that nothing committed since can be missing"""
+        if not self.ready:
+            return False
+        if self.bus is None or self.max_feed_age_seconds is None:
+            return True
+        return self.bus.fed_within(self.max_feed_age_seconds, since=self._caught_up_at)
+
+    def _exponent(self, when: datetime) -> float:
+        return self.rate * (when - self._landmark).total_seconds()
+
+    def _rebase(self, now: datetime) -> None:
+        exponent = self._exponent(now)
+        if exponent < _REBASE_EXPONENT:
+            return
+        scale = math.exp(-exponent)
+        for sums in self._series.values():
+            for i in range(3):
+                sums[i] *= scale
+        self._landmark = now
+
+    @staticmethod
+    def _post_keys(post: Dict[str, Any]) -> List[Tuple[str, str]]:
+        keys = [MARKET, ('company', str(post['company_id']))]
+        if post.get('industry'):
+            keys.append(('industry', post['industry'].lower()))
+        return keys
+
+    def _apply(self, series: Dict[Tuple[str, str], List[float]], post: Dict[str, Any], now: datetime) -> None:
+        # Future-dated posts (clock skew) count as posted now
+        growth = math.exp(self._exponent(min(_timestamp(post['timestamp']), now)))
+        weight = post_weight(post) * growth
+        score = SENTIMENT_SCORES.get(post.get('sentiment'), 0)
+        for key in self._post_keys(post):
+            sums = series.get(key)
+            if sums is None:
+                sums = series[key] = [0.0, 0.0, 0.0]
+            sums[0] += score * weight
+            sums[1] += weight
+            sums[2] += growth
+
+    def add_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Ingest bus listener for post events"""
+        with self._lock:
+            if not self.ready:
+                self._pending.extend(posts)
+                return
+            now = datetime.utcnow()
+            self._rebase(now)
+            for post in posts:
+                seq = post.get('ingest_seq') or 0
+                if seq and seq <= self.applied_seq:
+                    continue
+                self._apply(self._series, post, now)
+                self.applied_seq = max(self.applied_seq, seq)
+
+    def load(self, session: Session, batch_size: int = 5000) -> int:
+        """
+        Restore from the checkpoint and replay posts ingested since, then mark ready
+
+        A checkpoint written with a different half-life is ignored and the
+        index is rebuilt from every retained post.
+
+        Returns:
+            Number of posts replayed
+        """
+        now = datetime.utcnow()
+        loaded_at = time.monotonic()
+        landmark = self._landmark
+        checkpoint = session.query(SentimentIndexCheckpointModel).all()
+        if any(row.half_life_hours != self.half_life_hours for row in checkpoint):
+            logger.info("Sentiment index half-life changed; rebuilding from posts")
+            checkpoint = []
+
+        series: Dict[Tuple[str, str], List[float]] = {}
+        since_seq = 0
+        for row in checkpoint:
+            # Move each sum from as_of onto the landmark
+            growth = math.exp(self.rate * (row.as_of - landmark).total_seconds())
+            series[(row.kind, row.key)] = [row.score_sum * growth, row.weight_sum * growth, row.post_sum * growth]
+            since_seq = max(since_seq, row.ingest_seq)
+
+        replayed = 0
+        for row in session.execute(_replay_query(since_seq, batch_size)).mappings():
+            self._apply(series, row, now)
+            since_seq = row['ingest_seq']
+            replayed += 1
+
+        with self._lock:
+            self._series = series
+            self.applied_seq = since_seq
+            self._caught_up_at = loaded_at
+            self.ready = True
+            pending, self._pending = self._pending, []
+            self.add_posts(pending)
+        logger.info(f"Sentiment index loaded {len(checkpoint)} checkpointed series and replayed {replayed} posts")
+        return replayed
+
+    def catch_up(self, session: Session, batch_size: int = 5000) -> int:
+        """
+        Apply posts ingested since applied_seq straight from sentiment_posts
+
+        For when nothing feeds the bus, e.g. a collector in another process
+        and no ingest tailer.
+
+        Returns:
+            Number of posts applied
+        """
+        with self._lock:
+            if not self.ready:
+                return 0
+            since_seq = self.applied_seq
+        caught_up_at = time.monotonic()
+        rows = session.execute(_replay_query(since_seq, batch_size)).mappings().all()
+        applied = 0
+        with self._lock:
+            now = datetime.utcnow()
+            self._rebase(now)
+            for row in rows:
+                if row['ingest_seq'] <= self.applied_seq:
+                    continue
+                self._apply(self._series, row, now)
+                self.applied_seq = row['ingest_seq']
+                applied += 1
+            self._caught_up_at = max(self._caught_up_at, caught_up_at)
+        return applied
+
+    def checkpoint(self, session: Session) -> int:
+        """Write every series, decayed to now, with the ingest position it covers"""
+        with self._lock:
+            if not self.ready:
+                return 0
+            now = datetime.utcnow()
+            decay = math.exp(-self._exponent(now))
+            rows = [
+                dict(kind=kind, key=key, half_life_hours=self.half_life_hours,
+                     score_sum=sums[0] * decay, weight_sum=sums[1] * decay, post_sum=sums[2] * decay,
+                     as_of=now, ingest_seq=self.applied_seq)
+                for (kind, key), sums in self._series.items()
+            ]
+        _upsert_checkpoints(session, rows)
+        session.commit()
+        return len(rows)
+
+    def start(self, session_factory, checkpoint_seconds: float = 60.0, catch_up_seconds: float = 2.0) -> threading.Thread:
+        """
+        Load in a background thread, then checkpoint every checkpoint_seconds
+
+        Every catch_up_seconds that the bus hasn't been fed within
+        max_feed_age_seconds, the thread also runs catch_up.
+        """
+        def run_with_session(action, description):
+            session = session_factory()
+            try:
+                action(session)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error {description} sentiment index: {e}")
+            finally:
+                session.close()
+
+        def run():
+            run_with_session(self.load, 'loading')
+            checkpoint_at = time.monotonic() + checkpoint_seconds
+            while not self._stop.wait(min(catch_up_seconds, checkpoint_seconds)):
+                if not self._bus_fed():
+                    run_with_session(self.catch_up, 'catching up')
+                if time.monotonic() >= checkpoint_at:
+                    run_with_session(self.checkpoint, 'checkpointing')
+                    checkpoint_at = time.monotonic() + checkpoint_seconds
+
+        self._stop.clear()
+        thread = threading.Thread(target=run, name='sentiment-index', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _summary(self, sums: Optional[List[float]], decay: float, now: datetime) -> Dict[str, Any]:
+        score_sum, weight_sum, post_sum = sums or (0.0, 0.0, 0.0)
+        return {
+            "index": score_sum / weight_sum if weight_sum > 0 else None,
+            "weight": weight_sum * decay,
+            "effective_posts": post_sum * decay,
+            "half_life_hours": self.half_life_hours,
+            "as_of": now.isoformat(),
+        }
+
+    def get(self, kind: str, key: Any = '') -> Optional[Dict[str, Any]]:
+        """
+        The index for one series, or None while not current
+
+        Args:
+            kind: 'market', 'company' (key: company id) or 'industry' (key: name, any case)
+
+        Returns:
+            Dict with "index" (None without posts), "weight" and
+            "effective_posts" (decayed sums of post weights and of posts)
+        """
+        key = str(key).lower() if kind == 'industry' else str(key)
+        with self._lock:
+            if not self.current:
+                return None
+            now = datetime.utcnow()
+            return self._summary(self._series.get((kind, key)), math.exp(-self._exponent(now)), now)
+
+    def get_many(self, kind: str, keys: List[Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """get() for several series of one kind at the same instant, keyed as given"""
+        with self._lock:
+            if not self.current:
+                return None
+            now = datetime.utcnow()
+            decay = math.exp(-self._exponent(now))
+            return {
+                str(key): self._summary(self._series.get((kind, str(key).lower() if kind == 'industry' else str(key))), decay, now)
+                for key in keys
+            }
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File locks are Unix-only; without them coalescing stays within one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Share one in-flight computation among concurrent callers with the same key
+
+    The first caller for a key runs the computation; callers arriving while
+    it runs wait and receive the same result (or exception).
+
+    With lock_dir set, the leader in each process also takes an exclusive
+    file lock for the key, so workers serialize on it: the first computes
+    and writes its result next to the lock, and workers that were waiting
+    read that result instead of computing again. Results cross processes
+    through encode/decode, which turn a result into bytes and back (encode
+    may return None for results that should not be shared).
+
+    A result only matters to the workers queued behind it, so leaders sweep
+    lock and result files older than file_ttl_seconds out of lock_dir (at
+    most once per file_ttl_seconds per process); a lock file is removed only
+    while the sweeper holds it, and takers re-check they locked the file
+    still at the path.
+    """
+
+    def __init__(self,
+                 lock_dir: Optional[str] = None,
+                 encode: Optional[Callable[[Any], Optional[bytes]]] = None,
+                 decode: Optional[Callable[[bytes], Any]] = None,
+                 file_ttl_seconds: float = 60.0):
+        if lock_dir and fcntl is None:
+            logger.warning("File locks unavailable; request coalescing limited to this process")
+            lock_dir = None
+        if lock_dir:
+            os.makedirs(lock_dir, mode=0o700, exist_ok=True)
+        self.lock_dir = lock_dir if encode and decode else None
+        self.encode = encode
+        self.decode = decode
+        self.file_ttl_seconds = file_ttl_seconds
+        self._swept_at = time.time()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with this key
+
+        Returns:
+            Tuple of (result, shared), where shared is True when the result
+            came from another thread's call. A leader that picks up another
+            worker's result gets shared=False: it stands in for a computation
+            started after it began waiting.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = self._run(key, fn)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            return fn()
+
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{name}.lock")
+        result_path = os.path.join(self.lock_dir, f"{name}.result")
+        waiting_since = time.time()
+
+        lock_file = self._open_locked(lock_path)
+        try:
+            # A result written while we waited comes from a flight we coalesced into
+            shared = self._read_result(result_path, waiting_since)
+            if shared is not None:
+                return shared
+            result = fn()
+            self._write_result(result_path, result)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            self._maybe_sweep()
+
+    @staticmethod
+    def _open_locked(lock_path: str):
+        """Open and exclusively lock lock_path, retrying if a sweep unlinked it meanwhile"""
+        while True:
+            lock_file = open(lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    os.utime(lock_path)
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+
+    def _maybe_sweep(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._swept_at < self.file_ttl_seconds:
+                return
+            self._swept_at = now
+        self.sweep(now - self.file_ttl_seconds)
+
+    def sweep(self, cutoff: float) -> int:
+        """
+        Remove lock, result and temp files last touched before cutoff
+
+        Lock files held by another flight are left alone.
+
+        Returns:
+            Number of files removed
+        """
+        if not self.lock_dir:
+            return 0
+        removed = 0
+        try:
+            entries = list(os.scandir(self.lock_dir))
+        except OSError as e:
+            logger.error(f"Error listing coalescing directory {self.lock_dir}: {e}")
+            return 0
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                if entry.name.endswith('.lock'):
+                    removed += self._remove_idle_lock(entry.path)
+                else:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Error sweeping coalescing file {entry.path}: {e}")
+        return removed
+
+    @staticmethod
+    def _remove_idle_lock(path: str) -> int:
+        with open(path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            try:
+                if os.fstat(lock_file.fileno()).st_ino != os.stat(path).st_ino:
+                    return 0
+                os.unlink(path)
+                return 1
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_result(self, path: str, not_before: float) -> Optional[Any]:
+        try:
+            if os.stat(path).st_mtime < not_before:
+                return None
+            with open(path, 'rb') as f:
+                return self.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading coalesced result {path}: {e}")
+            return None
+
+    def _write_result(self, path: str, result: Any) -> None:
+        try:
+            data = self.encode(result)
+            if data is None:
+                return
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing coalesced result {path}: {e}")
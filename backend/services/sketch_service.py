@@ -0,0 +1,349 @@
+import hashlib
+import logging
+import math
+import struct
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from models.models import SentimentPostModel, SentimentSketchModel
+from services.rollup_service import as_uuid, bucket_start
+
+logger = logging.getLogger(__name__)
+
+# Quantiles are within this relative error of a true sample value
+DDSKETCH_RELATIVE_ACCURACY = 0.01
+# Bins kept per DDSketch; past this the lowest bins are collapsed together
+DDSKETCH_MAX_BINS = 1024
+# 2^12 registers: unique counts have a standard error of 1.04 / 64, about 1.6%
+HLL_PRECISION = 12
+
+_CHUNK_SIZE = 500
+
+# Smaller values count as zero, which keeps bin keys well inside int16
+_MIN_POSITIVE = 1e-9
+
+def _post_value(post: Any, field: str) -> Any:
+    return post.get(field) if isinstance(post, Mapping) else getattr(post, field)
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch)
+
+    Positive values fall into logarithmic bins of ratio gamma = (1 + a) /
+    (1 - a), so every quantile is returned within a relative error a of a
+    value at that rank; zeros are counted apart. Merging adds bin counts, so
+    a window's sketch is the merge of its buckets' sketches and equals the
+    sketch built from all of its values at once.
+    """
+
+    def __init__(self, relative_accuracy: float = DDSKETCH_RELATIVE_ACCURACY, max_bins: int = DDSKETCH_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value < _MIN_POSITIVE:
+            # Confidence and engagement are never negative
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        self.bins[keys[len(excess)]] += sum(self.bins.pop(key) for key in excess)
+
+    def merge(self, other: 'DDSketch') -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracies")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1); None for an empty sketch"""
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile out of range: {q}")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # Midpoint (in relative terms) of the bin (gamma^(key-1), gamma^key]
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        keys = np.fromiter(self.bins.keys(), dtype=np.int16, count=len(self.bins))
+        counts = np.fromiter(self.bins.values(), dtype=np.uint32, count=len(self.bins))
+        return struct.pack('<dII', self.relative_accuracy, self.zero_count, len(keys)) + keys.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = DDSKETCH_MAX_BINS) -> 'DDSketch':
+        relative_accuracy, zero_count, size = struct.unpack_from('<dII', data)
+        offset = struct.calcsize('<dII')
+        keys = np.frombuffer(data, dtype=np.int16, count=size, offset=offset)
+        counts = np.frombuffer(data, dtype=np.uint32, count=size, offset=offset + 2 * size)
+        sketch = cls(relative_accuracy, max_bins)
+        sketch.bins = dict(zip(keys.tolist(), counts.tolist()))
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + int(counts.sum())
+        return sketch
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch (HyperLogLog)
+
+    Each item's 64-bit hash picks one of 2^precision registers, which keeps
+    the longest run of leading zeros seen in the rest of the hash. Merging
+    takes the register-wise maximum. Sketches with few registers set are
+    stored sparsely, so quiet buckets cost a few bytes rather than 2^precision.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, item: str) -> None:
+        hashed = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+        rest_bits = 64 - self.precision
+        index = hashed >> rest_bits
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precisions")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        nonzero = np.flatnonzero(self.registers)
+        if len(nonzero) * 3 < len(self.registers):
+            return struct.pack('<BBI', ord('S'), self.precision, len(nonzero)) \
+                + nonzero.astype(np.uint16).tobytes() + self.registers[nonzero].tobytes()
+        return struct.pack('<BBI', ord('D'), self.precision, len(self.registers)) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        encoding, precision, size = struct.unpack_from('<BBI', data)
+        offset = struct.calcsize('<BBI')
+        sketch = cls(precision)
+        if encoding == ord('S'):
+            indexes = np.frombuffer(data, dtype=np.uint16, count=size, offset=offset)
+            sketch.registers[indexes] = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset + 2 * size)
+        else:
+            sketch.registers[:] = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+        return sketch
+
+class SketchSet:
+    """Confidence and engagement distributions plus distinct authors for one bucket or window"""
+
+    def __init__(self):
+        self.confidence = DDSketch()
+        self.engagement = DDSketch()
+        self.authors = HyperLogLog()
+
+    def add_post(self, post: Any) -> None:
+        self.confidence.add(float(_post_value(post, 'confidence') or 0.0))
+        self.engagement.add(float(_post_value(post, 'engagement') or 0))
+        # Authors are only unique within a source, as in post_authors
+        self.authors.add(f"{_post_value(post, 'source')}:{_post_value(post, 'author')}")
+
+    def merge(self, other: 'SketchSet') -> None:
+        self.confidence.merge(other.confidence)
+        self.engagement.merge(other.engagement)
+        self.authors.merge(other.authors)
+
+    @classmethod
+    def from_row(cls, row: Any) -> 'SketchSet':
+        sketches = cls()
+        sketches.confidence = DDSketch.from_bytes(row.confidence_sketch)
+        sketches.engagement = DDSketch.from_bytes(row.engagement_sketch)
+        sketches.authors = HyperLogLog.from_bytes(row.author_sketch)
+        return sketches
+
+    def summary(self, percentiles: Iterable[float] = (50, 90, 99)) -> Dict[str, Any]:
+        percentiles = list(percentiles)
+        return {
+            "post_count": self.confidence.count,
+            "unique_authors": self.authors.count(),
+            "confidence": {f"p{p:g}": self.confidence.quantile(p / 100) for p in percentiles},
+            "engagement": {f"p{p:g}": self.engagement.quantile(p / 100) for p in percentiles},
+        }
+
+def sketch_accuracy() -> Dict[str, float]:
+    """The documented error bounds, for API responses"""
+    return {
+        "percentile_relative_error": DDSKETCH_RELATIVE_ACCURACY,
+        "unique_authors_standard_error": round(HyperLogLog().standard_error, 4),
+    }
+
+def build_sketch_deltas(posts: Iterable[Any]) -> Dict[Tuple, SketchSet]:
+    """Sketch posts per (company_id, hour bucket_start)"""
+    deltas: Dict[Tuple, SketchSet] = {}
+    for post in posts:
+        timestamp = _post_value(post, 'timestamp') or datetime.utcnow()
+        key = (as_uuid(_post_value(post, 'company_id')), bucket_start(timestamp, 'hour'))
+        sketches = deltas.get(key)
+        if sketches is None:
+            sketches = deltas[key] = SketchSet()
+        sketches.add_post(post)
+    return deltas
+
+def apply_posts_to_sketches(session: Session, posts: Iterable[Any]) -> int:
+    """
+    Merge newly stored posts into the hourly sketches
+
+    Runs inside the caller's transaction, next to apply_posts_to_rollups.
+    Sketches can't be summed in SQL, so missing rows are inserted empty,
+    then the touched rows are locked (on PostgreSQL), merged and rewritten.
+
+    Returns:
+        Number of sketch buckets touched
+    """
+    deltas = build_sketch_deltas(posts)
+    if not deltas:
+        return 0
+    table = SentimentSketchModel.__table__
+    empty = SketchSet()
+    empty_row = dict(
+        post_count=0, confidence_sketch=empty.confidence.to_bytes(),
+        engagement_sketch=empty.engagement.to_bytes(), author_sketch=empty.authors.to_bytes()
+    )
+    keys = list(deltas)
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for offset in range(0, len(keys), _CHUNK_SIZE):
+            rows = [dict(company_id=company_id, bucket_start=start, **empty_row) for company_id, start in keys[offset:offset + _CHUNK_SIZE]]
+            session.execute(insert(table).values(rows).on_conflict_do_nothing(index_elements=['company_id', 'bucket_start']))
+
+    now = datetime.utcnow()
+    sketch = SentimentSketchModel
+    for offset in range(0, len(keys), _CHUNK_SIZE):
+        chunk = keys[offset:offset + _CHUNK_SIZE]
+        query = session.query(sketch).filter(
+            sketch.company_id.in_({company_id for company_id, _ in chunk}),
+            sketch.bucket_start.in_({start for _, start in chunk})
+        )
+        if dialect == 'postgresql':
+            query = query.with_for_update()
+        existing = {(row.company_id, row.bucket_start): row for row in query}
+        for key in chunk:
+            row = existing.get(key)
+            if row is None:
+                # Generic fallback for dialects without native upsert support
+                row = sketch(company_id=key[0], bucket_start=key[1], **empty_row)
+                session.add(row)
+            merged = SketchSet.from_row(row)
+            merged.merge(deltas[key])
+            row.post_count = merged.confidence.count
+            row.confidence_sketch = merged.confidence.to_bytes()
+            row.engagement_sketch = merged.engagement.to_bytes()
+            row.author_sketch = merged.authors.to_bytes()
+            row.updated_at = now
+    session.flush()
+    return len(deltas)
+
+def merge_sketches(session: Session,
+                   company_ids: Optional[List] = None,
+                   since: Optional[datetime] = None,
+                   until: Optional[datetime] = None,
+                   group_by_company: bool = False):
+    """
+    Merge the hourly sketches covering [since, until), widened to whole hours
+
+    Returns:
+        One SketchSet, or with group_by_company a dict of company id to SketchSet
+    """
+    sketch = SentimentSketchModel
+    stmt = select(sketch.company_id, sketch.confidence_sketch, sketch.engagement_sketch, sketch.author_sketch)
+    if since is not None:
+        stmt = stmt.where(sketch.bucket_start >= bucket_start(since, 'hour'))
+    if until is not None:
+        stmt = stmt.where(sketch.bucket_start < until)
+    if company_ids:
+        stmt = stmt.where(sketch.company_id.in_([as_uuid(cid) for cid in company_ids]))
+
+    merged: Dict[str, SketchSet] = {}
+    for row in session.execute(stmt):
+        key = str(row.company_id) if group_by_company else ''
+        if key not in merged:
+            merged[key] = SketchSet.from_row(row)
+        else:
+            merged[key].merge(SketchSet.from_row(row))
+    if group_by_company:
+        return merged
+    return merged.get('', SketchSet())
+
+def prune_sketches(session: Session, cutoff: datetime) -> int:
+    """Delete sketch buckets that ended before the retention cutoff"""
+    result = session.execute(
+        delete(SentimentSketchModel).where(SentimentSketchModel.bucket_start <= cutoff - timedelta(hours=1))
+    )
+    return result.rowcount or 0
+
+def rebuild_sketches(session: Session, batch_size: int = 5000) -> int:
+    """
+    Recompute all sketches from sentiment_posts
+
+    Returns:
+        Number of posts sketched
+    """
+    session.execute(delete(SentimentSketchModel))
+    post = SentimentPostModel
+    result = session.execute(
+        select(post.company_id, post.source, post.author, post.confidence, post.engagement, post.timestamp)
+        .order_by(post.timestamp)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    total = 0
+    for batch in result.mappings().partitions(batch_size):
+        apply_posts_to_sketches(session, batch)
+        total += len(batch)
+    session.commit()
+    logger.info(f"Rebuilt sketches from {total} posts")
+    return total
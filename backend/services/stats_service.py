@@ -0,0 +1,217 @@
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, tuple_
+from sqlalchemy.orm import Session
+
+from models.models import (
+    IngestCounterModel, PostAuthorModel, SentimentPostModel, SentimentRollupModel,
+    CompanyModel, IndustryModel
+)
+from services.rollup_service import as_uuid, bucket_start
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 500
+
+def _post_value(post: Any, field: str) -> Any:
+    return post[field] if isinstance(post, Mapping) else getattr(post, field)
+
+def _upsert_additive(session: Session, model, key_columns: Tuple[str, ...], rows: List[Dict[str, Any]], sum_columns: Tuple[str, ...]):
+    """Add row values onto existing rows, creating rows that don't exist yet"""
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    table = model.__table__
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        for offset in range(0, len(rows), _CHUNK_SIZE):
+            stmt = insert(table).values(rows[offset:offset + _CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={column: table.c[column] + stmt.excluded[column] for column in sum_columns}
+            )
+            session.execute(stmt)
+        return
+
+    # Generic fallback for dialects without native upsert support
+    for row in rows:
+        existing = session.get(model, tuple(row[column] for column in key_columns))
+        if existing is None:
+            session.add(model(**row))
+            continue
+        for column in sum_columns:
+            setattr(existing, column, (getattr(existing, column) or 0) + row[column])
+
+def _industry_names(session: Session, company_ids: Iterable[Any]) -> Dict[Any, str]:
+    ids = {as_uuid(cid) for cid in company_ids}
+    if not ids:
+        return {}
+    stmt = select(CompanyModel.id, IndustryModel.name)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .where(CompanyModel.id.in_(ids))
+    return {company_id: name.lower() for company_id, name in session.execute(stmt)}
+
+def _counter_rows(counts: Dict[Tuple[str, str], List[float]], sign: int) -> List[Dict[str, Any]]:
+    now = datetime.utcnow()
+    return [
+        dict(dimension=dimension, key=key, post_count=sign * int(count), confidence_sum=sign * float(confidence), updated_at=now)
+        for (dimension, key), (count, confidence) in counts.items()
+    ]
+
+def _fold(counts, source: str, sentiment: str, industry: Optional[str], count: int, confidence: float):
+    for dimension_key in (('all', ''), ('source', source), ('sentiment', sentiment), ('industry', industry or '')):
+        counts[dimension_key][0] += count
+        counts[dimension_key][1] += confidence
+
+def _existing_authors(session: Session, keys: List[Tuple[str, str]]) -> set:
+    existing = set()
+    for offset in range(0, len(keys), _CHUNK_SIZE):
+        chunk = keys[offset:offset + _CHUNK_SIZE]
+        existing.update(session.execute(
+            select(PostAuthorModel.source, PostAuthorModel.author)
+            .where(tuple_(PostAuthorModel.source, PostAuthorModel.author).in_(chunk))
+        ).all())
+    return existing
+
+def apply_posts_to_stats(session: Session, posts: Iterable[Any]) -> None:
+    """
+    Fold newly stored posts into the ingest counters and author table
+
+    Runs inside the caller's transaction, next to apply_posts_to_rollups.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    industries = _industry_names(session, (_post_value(post, 'company_id') for post in posts))
+
+    counts = defaultdict(lambda: [0, 0.0])
+    authors = defaultdict(int)
+    for post in posts:
+        _fold(counts, _post_value(post, 'source'), _post_value(post, 'sentiment'),
+              industries.get(as_uuid(_post_value(post, 'company_id'))), 1, _post_value(post, 'confidence') or 0.0)
+        authors[(_post_value(post, 'source'), _post_value(post, 'author'))] += 1
+
+    new_authors = len(set(authors) - _existing_authors(session, list(authors)))
+    if new_authors:
+        counts[('authors', '')][0] += new_authors
+
+    _upsert_additive(session, PostAuthorModel, ('source', 'author'),
+                     [dict(source=source, author=author, post_count=count) for (source, author), count in authors.items()],
+                     ('post_count',))
+    _upsert_additive(session, IngestCounterModel, ('dimension', 'key'), _counter_rows(counts, 1),
+                     ('post_count', 'confidence_sum'))
+
+def remove_expired_from_stats(session: Session, cutoff: datetime) -> None:
+    """
+    Subtract posts older than the retention cutoff from the counters
+
+    Must run before those posts are deleted, in the same transaction. Reads
+    two grouped aggregates over the expiring range only.
+    """
+    post = SentimentPostModel
+    expiring = post.timestamp < cutoff
+
+    counts = defaultdict(lambda: [0, 0.0])
+    stmt = select(post.source, post.sentiment, IndustryModel.name, func.count(), func.sum(post.confidence))\
+        .join(CompanyModel, CompanyModel.id == post.company_id)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .where(expiring)\
+        .group_by(post.source, post.sentiment, IndustryModel.name)
+    for source, sentiment, industry, count, confidence in session.execute(stmt):
+        _fold(counts, source, sentiment, industry.lower() if industry else None, count, confidence or 0.0)
+    if not counts:
+        return
+
+    author_rows = [
+        dict(source=source, author=author, post_count=-count)
+        for source, author, count in session.execute(
+            select(post.source, post.author, func.count()).where(expiring).group_by(post.source, post.author)
+        )
+    ]
+    _upsert_additive(session, PostAuthorModel, ('source', 'author'), author_rows, ('post_count',))
+    gone = session.execute(delete(PostAuthorModel).where(PostAuthorModel.post_count <= 0)).rowcount or 0
+    if gone:
+        # Subtracted along with everything else below
+        counts[('authors', '')][0] += gone
+
+    _upsert_additive(session, IngestCounterModel, ('dimension', 'key'), _counter_rows(counts, -1),
+                     ('post_count', 'confidence_sum'))
+
+def rebuild_stats(session: Session) -> None:
+    """Recompute the counters and author table from sentiment_posts (backfill)"""
+    session.execute(delete(IngestCounterModel))
+    session.execute(delete(PostAuthorModel))
+
+    post = SentimentPostModel
+    author_rows = [
+        dict(source=source, author=author, post_count=count)
+        for source, author, count in session.execute(
+            select(post.source, post.author, func.count()).group_by(post.source, post.author)
+        )
+    ]
+    _upsert_additive(session, PostAuthorModel, ('source', 'author'), author_rows, ('post_count',))
+
+    counts = defaultdict(lambda: [0, 0.0])
+    stmt = select(post.source, post.sentiment, IndustryModel.name, func.count(), func.sum(post.confidence))\
+        .join(CompanyModel, CompanyModel.id == post.company_id)\
+        .join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)\
+        .group_by(post.source, post.sentiment, IndustryModel.name)
+    for source, sentiment, industry, count, confidence in session.execute(stmt):
+        _fold(counts, source, sentiment, industry.lower() if industry else None, count, confidence or 0.0)
+    if author_rows:
+        counts[('authors', '')][0] = len(author_rows)
+    _upsert_additive(session, IngestCounterModel, ('dimension', 'key'), _counter_rows(counts, 1),
+                     ('post_count', 'confidence_sum'))
+
+def get_ingest_stats(session: Session, hours: int = 24, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Overall statistics from the ingest counters and hour rollups
+
+    Reads a few dozen counter rows plus one grouped query over hour rollup
+    buckets, so the cost does not depend on how many posts are stored.
+
+    Returns:
+        Dict with total_posts, avg_confidence, unique_authors, by_source,
+        by_sentiment, by_industry and posts_per_hour (oldest first)
+    """
+    dimensions = defaultdict(dict)
+    totals = {"post_count": 0, "confidence_sum": 0.0}
+    unique_authors = 0
+    for row in session.execute(select(IngestCounterModel)).scalars():
+        if row.dimension == 'all':
+            totals = {"post_count": row.post_count, "confidence_sum": row.confidence_sum}
+        elif row.dimension == 'authors':
+            unique_authors = row.post_count
+        elif row.post_count > 0:
+            dimensions[row.dimension][row.key] = row.post_count
+
+    now = now or datetime.utcnow()
+    first_hour = bucket_start(now, 'hour') - timedelta(hours=hours - 1)
+    rollup = SentimentRollupModel
+    hourly = dict(session.execute(
+        select(rollup.bucket_start, func.sum(rollup.post_count))
+        .where(rollup.granularity == 'hour', rollup.bucket_start >= first_hour)
+        .group_by(rollup.bucket_start)
+    ).all())
+
+    return {
+        "total_posts": totals["post_count"],
+        "avg_confidence": totals["confidence_sum"] / totals["post_count"] if totals["post_count"] else None,
+        "unique_authors": unique_authors,
+        "by_source": dimensions['source'],
+        "by_sentiment": dimensions['sentiment'],
+        "by_industry": dimensions['industry'],
+        "posts_per_hour": [
+            {"hour": (first_hour + timedelta(hours=i)).isoformat(), "count": int(hourly.get(first_hour + timedelta(hours=i)) or 0)}
+            for i in range(hours)
+        ],
+    }
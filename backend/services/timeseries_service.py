@@ -0,0 +1,184 @@
+import logging
+import re
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from models.models import SentimentRollupModel
+from services.aggregation_service import summarize, WEIGHTING_OPTIONS
+from services.rollup_service import bucket_start, as_uuid, ROLLUP_SUM_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+_BUCKET_PATTERN = re.compile(r'^(\d+)([mhd])$')
+_BUCKET_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+_EPOCH = datetime(1970, 1, 1)
+
+# Upper bound on buckets computed per request before downsampling
+MAX_SERIES_BUCKETS = 20000
+
+def parse_bucket(bucket: str) -> int:
+    """
+    Parse a bucket size like '5m', '1h' or '1d' into seconds
+
+    Raises:
+        ValueError: If the bucket is malformed or not a whole number of minutes
+    """
+    match = _BUCKET_PATTERN.match(bucket or '')
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid bucket size: {bucket}")
+    return int(match.group(1)) * _BUCKET_UNITS[match.group(2)]
+
+def _bucket_floor(timestamp: datetime, bucket_seconds: int) -> datetime:
+    """Align to epoch-based buckets so bucket boundaries are stable across requests"""
+    offset = int((timestamp - _EPOCH).total_seconds()) // bucket_seconds * bucket_seconds
+    return _EPOCH + timedelta(seconds=offset)
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points and, from each of threshold-2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average. Visual shape
+    (peaks, troughs) survives far better than with plain striding.
+
+    Args:
+        points: (x, y) pairs sorted by x
+        threshold: Maximum number of points to keep
+
+    Returns:
+        Indices of the kept points, in order
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    kept = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(points[j][0] for j in range(next_start, next_end)) / span
+        avg_y = sum(points[j][1] for j in range(next_start, next_end)) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a]
+        best_area, best_index = -1.0, start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best_index = area, j
+        kept.append(best_index)
+        a = best_index
+
+    kept.append(n - 1)
+    return kept
+
+def _rollup_series_query(company_ids: Optional[List], sources: Optional[List[str]], granularity: str, since: datetime):
+    rollup = SentimentRollupModel
+    stmt = select(
+        rollup.bucket_start,
+        *[func.sum(getattr(rollup, column)).label(column) for column in ROLLUP_SUM_COLUMNS]
+    ).where(rollup.granularity == granularity, rollup.bucket_start >= since)
+    if company_ids:
+        stmt = stmt.where(rollup.company_id.in_([as_uuid(cid) for cid in company_ids]))
+    if sources:
+        stmt = stmt.where(rollup.source.in_(sources))
+    return stmt.group_by(rollup.bucket_start).order_by(rollup.bucket_start)
+
+def build_timeseries(session: Session,
+                     company_ids: Optional[List] = None,
+                     sources: Optional[List[str]] = None,
+                     hours_back: int = 24,
+                     bucket_seconds: int = 3600,
+                     weighting: str = 'none',
+                     moving_average: int = 0,
+                     max_points: Optional[int] = None,
+                     now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Build a bucketed sentiment time series from the rollup tables
+
+    The database sums rollups per rollup bucket; those are folded into the
+    requested bucket size here. Empty buckets are kept (count 0, sentiment
+    None) so charts show gaps honestly.
+
+    Args:
+        company_ids: Restrict to these companies (None for the whole market)
+        sources: Restrict to these sources
+        hours_back: Window size in hours
+        bucket_seconds: Bucket size, a whole number of minutes
+        weighting: Which score fills "sentiment": 'none', 'confidence' or 'engagement'
+        moving_average: Trailing moving average length in buckets (0 to disable)
+        max_points: Downsample with LTTB to at most this many points
+
+    Returns:
+        Dict with "points" and a "downsampled" flag
+    """
+    if weighting not in WEIGHTING_OPTIONS:
+        raise ValueError(f"Unknown weighting: {weighting}")
+    if bucket_seconds % 60:
+        raise ValueError("Bucket size must be a whole number of minutes")
+    if hours_back * 3600 / bucket_seconds > MAX_SERIES_BUCKETS:
+        raise ValueError(f"Window too large for bucket size (max {MAX_SERIES_BUCKETS} buckets)")
+
+    now = now or datetime.utcnow()
+    granularity = 'hour' if bucket_seconds % 3600 == 0 else 'minute'
+    start = _bucket_floor(now - timedelta(hours=hours_back), bucket_seconds)
+    # Rollup buckets never straddle a series bucket because both are epoch-aligned
+    since = bucket_start(start, granularity)
+
+    buckets: Dict[datetime, Dict[str, float]] = {}
+    for row in session.execute(_rollup_series_query(company_ids, sources, granularity, since)).mappings():
+        key = _bucket_floor(row['bucket_start'], bucket_seconds)
+        totals = buckets.setdefault(key, {column: 0 for column in ROLLUP_SUM_COLUMNS})
+        for column in ROLLUP_SUM_COLUMNS:
+            totals[column] += row[column] or 0
+
+    points = []
+    step = timedelta(seconds=bucket_seconds)
+    empty = {column: 0 for column in ROLLUP_SUM_COLUMNS}
+    window = deque()
+    window_totals = dict(empty)
+    current = start
+    while current <= now:
+        totals = buckets.get(current, empty)
+        summary = summarize(totals, weighting)
+        point = {
+            "t": current.isoformat(),
+            "count": summary["count"],
+            "sentiment": summary["sentiment"],
+            "confidence_weighted_score": summary.get("confidence_weighted_score"),
+            "engagement_weighted_score": summary.get("engagement_weighted_score"),
+        }
+        if moving_average:
+            # Running sums make the trailing average O(1) per bucket
+            window.append(totals)
+            for column in ROLLUP_SUM_COLUMNS:
+                window_totals[column] += totals[column]
+            if len(window) > moving_average:
+                expired = window.popleft()
+                for column in ROLLUP_SUM_COLUMNS:
+                    window_totals[column] -= expired[column]
+            point["moving_average"] = summarize(window_totals, weighting)["sentiment"]
+        points.append(point)
+        current += step
+
+    downsampled = False
+    if max_points and len(points) > max_points:
+        # Empty buckets have no score; plot them at 0 for shape selection only
+        xy = [(i, p["sentiment"] or 0.0) for i, p in enumerate(points)]
+        points = [points[i] for i in lttb(xy, max_points)]
+        downsampled = True
+
+    return {"points": points, "downsampled": downsampled}
@@ -0,0 +1,365 @@
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import threading
+import zlib
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from models.models import TrendingSketchModel
+from services.rollup_service import bucket_start
+
+logger = logging.getLogger(__name__)
+
+TRENDING_DIMENSIONS = ('cashtags', 'authors', 'terms')
+
+# Slice granularity and length in seconds
+TRENDING_SLICES = {'5m': 300, 'hour': 3600}
+
+# Window name to (slice granularity, slices); shortest first
+TRENDING_WINDOWS = {'1h': ('5m', 12), '24h': ('hour', 24)}
+
+# Overestimates are at most e / 2048 (~0.13%) of a window's total with
+# probability 1 - e^-4 (~98%)
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+# Items each Space-Saving summary tracks; anything above 1/200 of a slice is kept
+TOP_K_CAPACITY = 200
+
+# Identifies this writer's rows; each process only ever writes its own
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+_CASHTAG = re.compile(r'\$([A-Za-z]{1,5})\b')
+_WORD = re.compile(r"[a-z][a-z'\-]{2,29}")
+_URL = re.compile(r'https?://\S+')
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being below between
+both but by can can't could couldn't did didn't do does doesn't doing don't down during each even few for from
+further get gets got had hadn't has hasn't have haven't having he her here hers herself him himself his how i if
+in into is isn't it it's its itself just let's like me more most much my myself no nor not now of off on once only
+or other our ours ourselves out over own really same she should shouldn't so some still such than that that's the
+their theirs them themselves then there there's these they they're this those through to too under until up us very
+was wasn't we were weren't what what's when where which while who whom why will with won't would wouldn't you your
+yours yourself yourselves going gonna one two new today time think know see day week year people stock stocks
+share shares market markets company""".split())
+
+def _post_value(post: Any, field: str) -> Any:
+    return post.get(field) if isinstance(post, Mapping) else getattr(post, field)
+
+def extract_items(post: Any) -> Dict[str, List[str]]:
+    """
+    The cashtags, author and salient terms of one post, each counted once per post
+
+    Cashtags are upper-cased ($nvda -> NVDA); authors are "source:author";
+    terms are lower-case words of 3-30 letters that aren't stopwords or
+    cashtags.
+    """
+    content = _post_value(post, 'content') or ''
+    cashtags = {tag.upper() for tag in _CASHTAG.findall(content)}
+    text = _CASHTAG.sub(' ', _URL.sub(' ', content.lower()))
+    terms = {word.strip("'-") for word in _WORD.findall(text)}
+    return {
+        'cashtags': sorted(cashtags),
+        'authors': [f"{_post_value(post, 'source')}:{_post_value(post, 'author')}"],
+        'terms': sorted(term for term in terms if len(term) >= 3 and term not in STOPWORDS and term.upper() not in cashtags),
+    }
+
+class CountMinSketch:
+    """
+    Mergeable frequency sketch: depth rows of width counters, one hashed slot per row
+
+    An item's estimate is the minimum of its slots, which never undercounts
+    and overcounts by at most e / width of the total with probability
+    1 - e^-depth. Merging adds the tables.
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self.total = 0
+        self._rows = np.arange(depth)
+
+    def _slots(self, item: str) -> np.ndarray:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return np.array([(h1 + i * h2) % self.width for i in range(self.depth)])
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.table[self._rows, self._slots(item)] += count
+        self.total += count
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[self._rows, self._slots(item)].min())
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge sketches of different shapes")
+        self.table += other.table
+        self.total += other.total
+
+    def to_bytes(self) -> bytes:
+        # Mostly-empty tables compress to a small fraction of width * depth * 4 bytes
+        return zlib.compress(struct.pack('<IIQ', self.width, self.depth, self.total) + self.table.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CountMinSketch':
+        raw = zlib.decompress(data)
+        width, depth, total = struct.unpack_from('<IIQ', raw)
+        sketch = cls(width, depth)
+        sketch.table = np.frombuffer(raw, dtype=np.uint32, offset=struct.calcsize('<IIQ')).reshape(depth, width).copy()
+        sketch.total = total
+        return sketch
+
+class SpaceSaving:
+    """
+    Top-k heavy hitters in bounded memory (Space-Saving)
+
+    Tracks at most capacity items. A new item past capacity replaces the
+    one with the smallest count and inherits that count as its error, so
+    every item more frequent than total / capacity is always tracked and
+    counts never undercount. A lazy min-heap finds the smallest count in
+    O(log capacity) amortized.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # (count, item) entries; counts only grow, so an entry may be stale-low
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str, count: int = 1) -> None:
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, item))
+            return
+        while True:
+            stale_count, victim = self._heap[0]
+            current = self.counts[victim]
+            if current == stale_count:
+                break
+            heapq.heapreplace(self._heap, (current, victim))
+        heapq.heappop(self._heap)
+        minimum = self.counts.pop(victim)
+        self.errors.pop(victim)
+        self.counts[item] = minimum + count
+        self.errors[item] = minimum
+        heapq.heappush(self._heap, (self.counts[item], item))
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """
+        Sum counts and errors, then keep the capacity largest
+
+        An item missing from one side may be undercounted by up to that
+        side's smallest count, so merged counts only rank candidates;
+        TrendingTracker re-counts them with the Count-Min Sketch.
+        """
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+            self.errors[item] = self.errors.get(item, 0) + other.errors[item]
+        if len(self.counts) > self.capacity:
+            keep = heapq.nlargest(self.capacity, self.counts.items(), key=lambda entry: entry[1])
+            self.counts = dict(keep)
+            self.errors = {item: self.errors[item] for item in self.counts}
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """(item, count, error), largest first"""
+        return [(item, count, self.errors[item])
+                for item, count in heapq.nlargest(n, self.counts.items(), key=lambda entry: entry[1])]
+
+    def to_json(self) -> str:
+        return json.dumps([[item, count, self.errors[item]] for item, count in self.counts.items()])
+
+    @classmethod
+    def from_json(cls, data: str, capacity: int = TOP_K_CAPACITY) -> 'SpaceSaving':
+        summary = cls(capacity)
+        for item, count, error in json.loads(data):
+            summary.counts[item] = count
+            summary.errors[item] = error
+        summary._heap = [(count, item) for item, count in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+def slice_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == 'hour':
+        return bucket_start(timestamp, 'hour')
+    minute = bucket_start(timestamp, 'minute')
+    return minute - timedelta(minutes=minute.minute % 5)
+
+def apply_posts_to_trending(session: Session, posts: Iterable[Any], worker: str = WORKER_ID) -> int:
+    """
+    Count newly stored posts into this worker's trending slices
+
+    Runs inside the caller's transaction, next to apply_posts_to_rollups.
+    Each writer process merges into its own rows, so concurrent collectors
+    never contend; readers merge every worker's rows. Posts older than the
+    longest window are skipped.
+
+    Returns:
+        Number of slice rows written
+    """
+    now = datetime.utcnow()
+    oldest = now - timedelta(seconds=max(TRENDING_SLICES[g] * n for g, n in TRENDING_WINDOWS.values()))
+    deltas: Dict[Tuple[str, str, datetime], Tuple[CountMinSketch, SpaceSaving, List[int]]] = {}
+    for post in posts:
+        # Future-dated posts (clock skew) count as posted now
+        timestamp = min(_post_value(post, 'timestamp') or now, now)
+        if timestamp < oldest:
+            continue
+        items = extract_items(post)
+        for granularity in TRENDING_SLICES:
+            start = slice_start(timestamp, granularity)
+            for dimension in TRENDING_DIMENSIONS:
+                key = (dimension, granularity, start)
+                if key not in deltas:
+                    deltas[key] = (CountMinSketch(), SpaceSaving(), [0])
+                counts, top, post_count = deltas[key]
+                post_count[0] += 1
+                for item in items[dimension]:
+                    counts.add(item)
+                    top.add(item)
+
+    for (dimension, granularity, start), (counts, top, post_count) in deltas.items():
+        row = session.get(TrendingSketchModel, (dimension, granularity, start, worker))
+        if row is None:
+            row = TrendingSketchModel(dimension=dimension, granularity=granularity, slice_start=start, worker=worker, post_count=0)
+            session.add(row)
+        else:
+            existing_counts = CountMinSketch.from_bytes(row.count_sketch)
+            existing_counts.merge(counts)
+            counts = existing_counts
+            existing_top = SpaceSaving.from_json(row.top_items)
+            existing_top.merge(top)
+            top = existing_top
+        row.post_count += post_count[0]
+        row.count_sketch = counts.to_bytes()
+        row.top_items = top.to_json()
+        row.updated_at = now
+    return len(deltas)
+
+def prune_trending(session: Session, cutoff: Optional[datetime] = None) -> int:
+    """Delete slices older than the longest window (or the given cutoff)"""
+    if cutoff is None:
+        granularity, slices = TRENDING_WINDOWS[list(TRENDING_WINDOWS)[-1]]
+        cutoff = datetime.utcnow() - timedelta(seconds=TRENDING_SLICES[granularity] * (slices + 1))
+    result = session.execute(delete(TrendingSketchModel).where(TrendingSketchModel.slice_start < cutoff))
+    return result.rowcount or 0
+
+def window_start(window: str, now: Optional[datetime] = None) -> datetime:
+    """First slice of a window; the current (partial) slice is the last"""
+    granularity, slices = TRENDING_WINDOWS[window]
+    return slice_start(now or datetime.utcnow(), granularity) - timedelta(seconds=TRENDING_SLICES[granularity] * (slices - 1))
+
+def merge_window(session: Session, window: str, dimension: str,
+                 now: Optional[datetime] = None) -> Tuple[CountMinSketch, set, int]:
+    """
+    Merge every worker's slices of one window and dimension
+
+    Returns:
+        The merged Count-Min Sketch, the union of the slices' top-k items and the post count
+    """
+    granularity, _ = TRENDING_WINDOWS[window]
+    sketch = TrendingSketchModel
+    stmt = select(sketch.count_sketch, sketch.top_items, sketch.post_count)\
+        .where(sketch.dimension == dimension)\
+        .where(sketch.granularity == granularity)\
+        .where(sketch.slice_start >= window_start(window, now))
+    counts, candidates, posts = CountMinSketch(), set(), 0
+    for row in session.execute(stmt):
+        counts.merge(CountMinSketch.from_bytes(row.count_sketch))
+        candidates.update(item for item, _, _ in json.loads(row.top_items))
+        posts += row.post_count
+    return counts, candidates, posts
+
+class TrendingTracker:
+    """
+    Precomputed trending lists per window and dimension, served from memory
+
+    A background thread merges the slices written by every ingest worker
+    every refresh_seconds. Candidates are the union of the slices'
+    Space-Saving summaries (any item above 1/capacity of the window is
+    among them); each is counted with the merged Count-Min Sketch, and
+    for shorter windows compared against its rate over the longest one.
+    Serving a request reads the latest snapshot, independent of volume.
+    """
+
+    def __init__(self, limit: int = 50):
+        self.limit = limit
+        self.ready = False
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh(self, session: Session) -> None:
+        now = datetime.utcnow()
+        snapshots = {}
+        baselines: Dict[str, CountMinSketch] = {}
+        # Longest window first, so shorter ones can compute lift against it
+        for window in reversed(list(TRENDING_WINDOWS)):
+            snapshot = {"window": window, "since": window_start(window, now).isoformat(), "as_of": now.isoformat()}
+            for dimension in TRENDING_DIMENSIONS:
+                counts, candidates, posts = merge_window(session, window, dimension, now)
+                baseline = baselines.get(dimension)
+                items = []
+                for item in candidates:
+                    count = counts.estimate(item)
+                    entry = {"item": item, "count": count, "share": count / counts.total if counts.total else 0.0}
+                    if baseline is not None and baseline.total and counts.total:
+                        base = baseline.estimate(item) / baseline.total
+                        entry["lift"] = entry["share"] / base if base else None
+                    items.append(entry)
+                items.sort(key=lambda entry: (-entry["count"], entry["item"]))
+                snapshot[dimension] = {"posts": posts, "mentions": counts.total, "items": items[:self.limit]}
+                if baseline is None:
+                    baselines[dimension] = counts
+            snapshots[window] = snapshot
+        with self._lock:
+            self._snapshots = snapshots
+            self.ready = True
+
+    def get(self, window: str) -> Optional[Dict[str, Any]]:
+        """The latest snapshot of one window, or None until the first refresh"""
+        with self._lock:
+            return self._snapshots.get(window)
+
+    def start(self, session_factory, refresh_seconds: float = 10.0) -> threading.Thread:
+        """Refresh in a background thread every refresh_seconds"""
+        def run():
+            while True:
+                session = session_factory()
+                try:
+                    self.refresh(session)
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"Error refreshing trending: {e}")
+                finally:
+                    session.close()
+                if self._stop.wait(refresh_seconds):
+                    return
+
+        self._stop.clear()
+        thread = threading.Thread(target=run, name='trending', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,370 @@
+import heapq
+import ipaddress
+import itertools
+import json
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.models import AlertCooldownModel, AlertDeliveryModel
+
+logger = logging.getLogger(__name__)
+
+# Longest wait honoured from a receiver's Retry-After header
+_MAX_RETRY_AFTER_SECONDS = 300.0
+
+def prune_alert_deliveries(session: Session, cutoff: datetime) -> int:
+    """Delete deliveries created before the retention cutoff, whatever their status"""
+    result = session.execute(delete(AlertDeliveryModel).where(AlertDeliveryModel.created_at < cutoff))
+    return result.rowcount or 0
+
+def _host_allowed(host: str, allowed_hosts: Iterable[str]) -> bool:
+    return any(host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts)
+
+def check_webhook_url(url: str, allowed_hosts: Iterable[str] = ()) -> None:
+    """
+    Refuse webhook URLs that could reach the API's own network
+
+    With an allowlist, the host must be a listed domain or a subdomain of
+    one; listed hosts are trusted wherever they resolve, which is how an
+    internal receiver is configured. Any other host must resolve only to
+    public addresses: loopback, private, link-local (cloud metadata),
+    shared, reserved and multicast addresses are rejected. Rule creation
+    checks once and every delivery checks again, since DNS can change.
+
+    Raises:
+        ValueError: if the URL isn't http(s) or its host isn't allowed
+        OSError: if the host can't be resolved
+    """
+    parsed = urlparse(url or '')
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError(f"Invalid webhook_url: {url}")
+    host = parsed.hostname.lower().rstrip('.')
+    allowed_hosts = [allowed.lower().rstrip('.') for allowed in allowed_hosts if allowed]
+    if allowed_hosts:
+        if not _host_allowed(host, allowed_hosts):
+            raise ValueError(f"Webhook host not in ALERT_WEBHOOK_ALLOWED_HOSTS: {host}")
+        return
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    for *_, sockaddr in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Webhook host {host} resolves to non-public address {address}")
+
+class WebhookDispatcher:
+    """
+    Delivers alert payloads to webhooks from a bounded queue on worker threads
+
+    enqueue() never blocks the caller (the ingest path): a full queue drops
+    the delivery and counts it. Each delivery has a dedup key; keys seen
+    recently in this process are dropped up front, and with a session
+    factory the first worker to insert the key into alert_deliveries claims
+    it, so several API processes firing the same alert deliver it once.
+
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff and jitter (or the receiver's Retry-After) up to
+    max_attempts; other non-2xx responses fail at once, as do URLs that
+    check_webhook_url refuses at send time. Deliveries still queued when
+    the process exits are lost.
+    """
+
+    def __init__(self,
+                 session_factory=None,
+                 workers: int = 4,
+                 max_attempts: int = 5,
+                 timeout_seconds: float = 5.0,
+                 queue_size: int = 10000,
+                 backoff_seconds: float = 1.0,
+                 dedup_size: int = 100000,
+                 allowed_hosts: Iterable[str] = ()):
+        if workers < 1 or max_attempts < 1:
+            raise ValueError("workers and max_attempts must be positive")
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.timeout_seconds = timeout_seconds
+        self.backoff_seconds = backoff_seconds
+        self.dedup_size = dedup_size
+        self.allowed_hosts = list(allowed_hosts)
+        self.stats = {'enqueued': 0, 'duplicates': 0, 'dropped': 0, 'delivered': 0, 'retried': 0, 'failed': 0}
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._recent: OrderedDict = OrderedDict()
+        self._retries = []
+        self._retry_order = itertools.count()
+        self._requeueing = 0
+        self._lock = threading.Lock()
+        self._retry_ready = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._threads = []
+        self._stop = threading.Event()
+
+    def check_url(self, url: str) -> None:
+        """check_webhook_url against this dispatcher's allowlist"""
+        check_webhook_url(url, self.allowed_hosts)
+
+    def enqueue(self,
+                dedup_key: str,
+                rule_id,
+                url: str,
+                payload: Dict[str, Any],
+                cooldown: Optional[Tuple[str, int]] = None,
+                fired_at: Optional[datetime] = None) -> bool:
+        """
+        Queue one delivery without blocking
+
+        Args:
+            cooldown: (subject, seconds) for window rules; the delivery is
+                only claimed if the rule last fired for the subject at least
+                that long before fired_at
+
+        Returns:
+            False if the key was seen recently or the queue is full
+        """
+        with self._lock:
+            if dedup_key in self._recent:
+                self.stats['duplicates'] += 1
+                return False
+            self._recent[dedup_key] = True
+            if len(self._recent) > self.dedup_size:
+                self._recent.popitem(last=False)
+        delivery = {
+            'dedup_key': dedup_key, 'rule_id': str(rule_id), 'url': url, 'payload': payload, 'attempts': 0,
+            'cooldown': cooldown, 'fired_at': fired_at or datetime.utcnow()
+        }
+        try:
+            self._queue.put_nowait(delivery)
+        except queue.Full:
+            with self._lock:
+                self._recent.pop(dedup_key, None)
+                self.stats['dropped'] += 1
+            logger.warning(f"Webhook queue full; dropped delivery {dedup_key}")
+            return False
+        with self._lock:
+            self.stats['enqueued'] += 1
+        return True
+
+    def pending(self) -> int:
+        """Deliveries queued, in flight or waiting to retry"""
+        with self._lock:
+            return self._queue.unfinished_tasks + len(self._retries) + self._requeueing
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Wait until nothing is pending; True unless the timeout passed first"""
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _claim_cooldown(self, session, dialect: str, delivery: Dict[str, Any]) -> bool:
+        subject, seconds = delivery['cooldown']
+        fired_at = delivery['fired_at']
+        rule_id = uuid.UUID(delivery['rule_id'])
+        table = AlertCooldownModel.__table__
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(rule_id=rule_id, subject=subject, last_fired_at=fired_at)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['rule_id', 'subject'],
+                set_={'last_fired_at': stmt.excluded.last_fired_at},
+                where=table.c.last_fired_at <= fired_at - timedelta(seconds=seconds)
+            )
+            return session.execute(stmt).rowcount == 1
+        # Generic fallback: the primary key rejects a concurrent first claim at commit
+        row = session.get(AlertCooldownModel, (rule_id, subject))
+        if row is None:
+            session.add(AlertCooldownModel(rule_id=rule_id, subject=subject, last_fired_at=fired_at))
+            return True
+        if row.last_fired_at > fired_at - timedelta(seconds=seconds):
+            return False
+        row.last_fired_at = fired_at
+        return True
+
+    def _claim(self, delivery: Dict[str, Any]) -> bool:
+        if self.session_factory is None:
+            return True
+        row = dict(
+            dedup_key=delivery['dedup_key'], rule_id=uuid.UUID(delivery['rule_id']),
+            payload=json.dumps(delivery['payload']), status='pending', attempts=0, created_at=datetime.utcnow()
+        )
+        session = self.session_factory()
+        try:
+            dialect = session.get_bind().dialect.name
+            # The cooldown and the delivery are claimed in one transaction
+            if delivery.get('cooldown') and not self._claim_cooldown(session, dialect, delivery):
+                session.rollback()
+                return False
+            if dialect in ('postgresql', 'sqlite'):
+                if dialect == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                stmt = insert(AlertDeliveryModel.__table__).values(**row).on_conflict_do_nothing(index_elements=['dedup_key'])
+                claimed = session.execute(stmt).rowcount == 1
+                if not claimed:
+                    session.rollback()
+                    return False
+                session.commit()
+                return True
+            # Generic fallback: the primary key rejects a second claim
+            session.add(AlertDeliveryModel(**row))
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                return False
+            return True
+        finally:
+            session.close()
+
+    def _record(self, delivery: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+        if self.session_factory is None:
+            return
+        session = self.session_factory()
+        try:
+            session.query(AlertDeliveryModel).filter_by(dedup_key=delivery['dedup_key']).update({
+                'status': status,
+                'attempts': delivery['attempts'],
+                'last_error': error[:500] if error else None,
+                'delivered_at': datetime.utcnow() if status == 'delivered' else None,
+            })
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error recording webhook delivery {delivery['dedup_key']}: {e}")
+        finally:
+            session.close()
+
+    def _http(self) -> requests.Session:
+        # requests.Session isn't documented as thread-safe, so one per worker
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = requests.Session()
+        return http
+
+    def _send(self, delivery: Dict[str, Any]) -> Tuple[bool, bool, Optional[str], Optional[float]]:
+        """POST once; returns (delivered, retryable, error, retry_after)"""
+        try:
+            self.check_url(delivery['url'])
+        except ValueError as e:
+            return False, False, str(e), None
+        except OSError as e:
+            return False, True, f"{type(e).__name__}: {e}", None
+        try:
+            response = self._http().post(
+                delivery['url'],
+                json=delivery['payload'],
+                headers={
+                    'X-Alert-Delivery-Id': delivery['dedup_key'],
+                    'X-Alert-Attempt': str(delivery['attempts']),
+                },
+                timeout=self.timeout_seconds,
+                allow_redirects=False
+            )
+        except requests.RequestException as e:
+            return False, True, f"{type(e).__name__}: {e}", None
+        if 200 <= response.status_code < 300:
+            return True, False, None, None
+        retry_after = None
+        try:
+            retry_after = min(float(response.headers.get('Retry-After', '')), _MAX_RETRY_AFTER_SECONDS)
+        except ValueError:
+            pass
+        retryable = response.status_code == 429 or response.status_code >= 500
+        return False, retryable, f"HTTP {response.status_code}", retry_after
+
+    def _deliver(self, delivery: Dict[str, Any]) -> None:
+        if delivery['attempts'] == 0 and not self._claim(delivery):
+            with self._lock:
+                self.stats['duplicates'] += 1
+            return
+        delivery['attempts'] += 1
+        delivered, retryable, error, retry_after = self._send(delivery)
+        if delivered:
+            self._record(delivery, 'delivered')
+            with self._lock:
+                self.stats['delivered'] += 1
+            return
+        if retryable and delivery['attempts'] < self.max_attempts:
+            delay = retry_after if retry_after is not None else \
+                self.backoff_seconds * 2 ** (delivery['attempts'] - 1) * random.uniform(0.5, 1.5)
+            self._record(delivery, 'pending', error)
+            with self._retry_ready:
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_order), delivery))
+                self.stats['retried'] += 1
+                self._retry_ready.notify()
+            return
+        logger.warning(f"Webhook delivery {delivery['dedup_key']} failed after {delivery['attempts']} attempts: {error}")
+        self._record(delivery, 'failed', error)
+        with self._lock:
+            self.stats['failed'] += 1
+
+    def _work(self) -> None:
+        while True:
+            delivery = self._queue.get()
+            try:
+                if delivery is None:
+                    return
+                self._deliver(delivery)
+            except Exception as e:
+                logger.error(f"Error delivering webhook {delivery['dedup_key']}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _schedule_retries(self) -> None:
+        while not self._stop.is_set():
+            with self._retry_ready:
+                if not self._retries:
+                    self._retry_ready.wait(1.0)
+                    continue
+                wait = self._retries[0][0] - time.monotonic()
+                if wait > 0:
+                    self._retry_ready.wait(min(wait, 1.0))
+                    continue
+                _, _, delivery = heapq.heappop(self._retries)
+                self._requeueing += 1
+            # Outside the lock: blocks only while every worker is busy and the queue is full
+            self._queue.put(delivery)
+            with self._lock:
+                self._requeueing -= 1
+
+    def start(self) -> None:
+        """Start the worker threads and the retry scheduler"""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'webhook-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._schedule_retries, name='webhook-retry', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop after the deliveries already queued; pending retries are abandoned"""
+        self._stop.set()
+        with self._retry_ready:
+            self._retry_ready.notify_all()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
@@ -0,0 +1,329 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import CompanyModel, IndustryModel, SentimentRollupModel
+from services.aggregation_service import summarize
+from services.ingest_bus import IngestBus
+from services.post_query_service import current_ingest_seq
+from services.rollup_service import ROLLUP_SUM_COLUMNS, SENTIMENT_SCORES, query_rollup_totals
+
+logger = logging.getLogger(__name__)
+
+# Window name to length in minutes, shortest first; each window's delta is
+# its sentiment minus the next longer window's
+SLIDING_WINDOWS = {'5m': 5, '1h': 60, '24h': 1440, '7d': 10080}
+
+# Windows up to this many minutes keep minute buckets; longer ones keep hour
+# buckets, so a 7d series holds ~170 buckets rather than 10080
+MINUTE_RESOLUTION_MAX = 60
+
+# Series keys: the whole market, or one company (id), industry (lower-case name) or source
+MARKET = ('market', None)
+
+_EPOCH = datetime(1970, 1, 1)
+
+def to_minute(value: datetime) -> int:
+    """Naive UTC datetime to whole minutes since the epoch"""
+    return int((value.replace(tzinfo=None) - _EPOCH) // timedelta(minutes=1))
+
+def window_unit(length: int) -> int:
+    """Bucket size, in minutes, a window of this many minutes is kept at"""
+    return 1 if length <= MINUTE_RESOLUTION_MAX else 60
+
+def _tail(head: int, length: int, unit: int) -> int:
+    """Oldest bucket (in units since the epoch) of a window ending at minute head"""
+    return (head - length + 1) // unit
+
+def window_starts(now: Optional[datetime] = None, windows: Optional[Dict[str, int]] = None) -> Dict[str, datetime]:
+    """
+    First minute of each window; the current (partial) minute is the last
+
+    Windows kept at hourly resolution start at the top of the hour their
+    minute-precise start falls in.
+    """
+    head = to_minute(now or datetime.utcnow())
+    return {
+        name: _EPOCH + timedelta(minutes=_tail(head, length, window_unit(length)) * window_unit(length))
+        for name, length in (windows or SLIDING_WINDOWS).items()
+    }
+
+def empty_totals() -> Dict[str, Any]:
+    return {column: 0 for column in ROLLUP_SUM_COLUMNS}
+
+def _post_vector(post: Dict[str, Any]) -> np.ndarray:
+    sentiment = post.get('sentiment')
+    score = SENTIMENT_SCORES.get(sentiment, 0)
+    confidence = float(post.get('confidence') or 0.0)
+    engagement = int(post.get('engagement') or 0)
+    return np.array([
+        1,
+        sentiment == 'positive',
+        sentiment == 'neutral',
+        sentiment == 'negative',
+        confidence,
+        engagement,
+        score * confidence,
+        score * engagement,
+    ], dtype=np.float64)
+
+class _Series:
+    """Buckets of one series in a ring per resolution, plus a running total per window"""
+
+    def __init__(self, ring_slots: Dict[int, int], windows: List[Tuple[int, int]], head: int):
+        self.rings = {
+            unit: (np.zeros((slots, len(ROLLUP_SUM_COLUMNS))), np.full(slots, -1, dtype=np.int64))
+            for unit, slots in ring_slots.items()
+        }
+        self.totals = np.zeros((len(windows), len(ROLLUP_SUM_COLUMNS)))
+        # Oldest bucket each window's total covers, in the window's unit
+        self.tails = [_tail(head, length, unit) for length, unit in windows]
+
+    def add(self, minute: int, vector: np.ndarray, windows: List[Tuple[int, int]]) -> None:
+        for unit, (buckets, held) in self.rings.items():
+            bucket = minute // unit
+            slot = bucket % len(held)
+            if held[slot] > bucket:
+                # A newer bucket holds the slot, so this one is older than every window at this resolution
+                continue
+            if held[slot] != bucket:
+                # The slot's previous bucket has already left every window
+                buckets[slot] = 0
+                held[slot] = bucket
+            buckets[slot] += vector
+        for i, (_, unit) in enumerate(windows):
+            if minute // unit >= self.tails[i]:
+                self.totals[i] += vector
+
+    def advance(self, head: int, windows: List[Tuple[int, int]]) -> None:
+        for i, (length, unit) in enumerate(windows):
+            buckets, held = self.rings[unit]
+            slots = len(held)
+            tail = _tail(head, length, unit)
+            if tail - self.tails[i] >= slots:
+                self.totals[i] = 0
+            elif tail > self.tails[i]:
+                leaving = np.arange(self.tails[i], tail)
+                leaving = leaving[held[leaving % slots] == leaving]
+                if len(leaving):
+                    self.totals[i] -= buckets[leaving % slots].sum(axis=0)
+                if self.totals[i][0] <= 0:
+                    # Drop float residue from the running sums once a window is empty
+                    self.totals[i] = 0
+            self.tails[i] = tail
+
+class SlidingWindowAggregator:
+    """
+    Rolling 5m/1h/24h/7d sentiment totals for the market and each company, industry and source
+
+    Each series keeps buckets of rollup sums in rings, plus a running total
+    per window: minute buckets for windows up to an hour, and hour buckets
+    for longer ones, which start at the top of the hour (see window_starts).
+    Adding a post touches one bucket per ring and one total per window; as
+    the clock moves on, the buckets leaving each window are subtracted from
+    its total. Reading a window is a copy of its total, independent of post
+    volume.
+
+    On startup it rebuilds from the minute rollups while buffering ingest
+    events, then replays the events ingested after its snapshot (by
+    ingest_seq), so restarts don't double count or drop posts.
+
+    With a bus and max_feed_age_seconds, window_totals also returns None
+    once neither the rebuild nor the bus has vouched for the feed within
+    that long, rather than serving windows that only decay.
+    """
+
+    def __init__(self,
+                 windows: Optional[Dict[str, int]] = None,
+                 bus: Optional[IngestBus] = None,
+                 max_feed_age_seconds: Optional[float] = None):
+        self.windows = dict(windows or SLIDING_WINDOWS)
+        # (length in minutes, bucket unit in minutes) per window
+        self._windows = [(length, window_unit(length)) for length in self.windows.values()]
+        # A ring one bucket longer than its longest window's span never overwrites a bucket still in it
+        self.ring_slots: Dict[int, int] = {}
+        for length, unit in self._windows:
+            self.ring_slots[unit] = max(self.ring_slots.get(unit, 0), length // unit + 1)
+        self.bus = bus
+        self.max_feed_age_seconds = max_feed_age_seconds
+        self._loaded_at = 0.0
+        self.ready = False
+        self.loaded_seq: Optional[int] = None
+        self._series: Dict[Tuple[str, Hashable], _Series] = {}
+        self._head = to_minute(datetime.utcnow())
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+
+    @property
+    def current(self) -> bool:
+        """Rebuilt, and fed recently enough that nothing committed since can be missing"""
+        if not self.ready:
+            return False
+        if self.bus is None or self.max_feed_age_seconds is None:
+            return True
+        return self.bus.fed_within(self.max_feed_age_seconds, since=self._loaded_at)
+
+    def _advance(self, series: Dict[Tuple[str, Hashable], _Series], head: int) -> int:
+        if head > self._head:
+            for s in series.values():
+                s.advance(head, self._windows)
+            self._head = head
+        return self._head
+
+    def _apply(self, series: Dict[Tuple[str, Hashable], _Series], keys, minute: int, vector: np.ndarray) -> None:
+        if minute > self._head:
+            # Clock skew: count future-dated posts in the current minute
+            minute = self._head
+        if minute < self._oldest_minute():
+            return
+        for key in keys:
+            s = series.get(key)
+            if s is None:
+                s = series[key] = _Series(self.ring_slots, self._windows, self._head)
+            s.add(minute, vector, self._windows)
+
+    def _oldest_minute(self) -> int:
+        """First minute any window still covers"""
+        return min(_tail(self._head, length, unit) * unit for length, unit in self._windows)
+
+    @staticmethod
+    def _post_keys(post: Dict[str, Any]) -> List[Tuple[str, Hashable]]:
+        keys = [MARKET, ('company', str(post['company_id'])), ('source', post['source'])]
+        if post.get('industry'):
+            keys.append(('industry', post['industry'].lower()))
+        return keys
+
+    def add_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """Ingest bus listener for post events"""
+        with self._lock:
+            if not self.ready:
+                self._pending.extend(posts)
+                return
+            self._advance(self._series, to_minute(datetime.utcnow()))
+            for post in posts:
+                if self.loaded_seq is not None and (post.get('ingest_seq') or 0) <= self.loaded_seq:
+                    continue
+                minute = to_minute(datetime.fromisoformat(post['timestamp']))
+                self._apply(self._series, self._post_keys(post), minute, _post_vector(post))
+
+    def load(self, session: Session, batch_size: int = 5000) -> int:
+        """
+        Rebuild every series from the minute rollups and mark the aggregator ready
+
+        Returns:
+            Number of rollup rows read
+        """
+        if session.get_bind().dialect.name == 'postgresql':
+            # One snapshot for the ingest position and the rollups it covers
+            session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        loaded_at = time.monotonic()
+        seq = current_ingest_seq(session)
+        industries = {
+            str(company_id): name.lower() if name else None
+            for company_id, name in session.execute(
+                select(CompanyModel.id, IndustryModel.name).join(IndustryModel, IndustryModel.id == CompanyModel.industry_id)
+            )
+        }
+        rollup = SentimentRollupModel
+        now = datetime.utcnow()
+        stmt = select(rollup.company_id, rollup.source, rollup.bucket_start, *[getattr(rollup, c) for c in ROLLUP_SUM_COLUMNS])\
+            .where(rollup.granularity == 'minute')\
+            .where(rollup.bucket_start >= min(window_starts(now, self.windows).values()))\
+            .execution_options(stream_results=True, yield_per=batch_size)
+
+        series: Dict[Tuple[str, Hashable], _Series] = {}
+        rows = 0
+        with self._lock:
+            self._advance(self._series, to_minute(now))
+        for row in session.execute(stmt):
+            company_id = str(row.company_id)
+            keys = [MARKET, ('company', company_id), ('source', row.source)]
+            if industries.get(company_id):
+                keys.append(('industry', industries[company_id]))
+            vector = np.array([float(getattr(row, c) or 0) for c in ROLLUP_SUM_COLUMNS])
+            with self._lock:
+                self._apply(series, keys, to_minute(row.bucket_start), vector)
+            rows += 1
+
+        with self._lock:
+            self._series = series
+            self.loaded_seq = seq
+            self._loaded_at = loaded_at
+            self.ready = True
+            pending, self._pending = self._pending, []
+            self.add_posts(pending)
+        logger.info(f"Sliding windows rebuilt from {rows} rollup buckets")
+        return rows
+
+    def start(self, session_factory) -> threading.Thread:
+        """Rebuild in a background thread; callers fall back to rollup queries until it finishes"""
+        def run():
+            session = session_factory()
+            try:
+                self.load(session)
+            except Exception as e:
+                logger.error(f"Error rebuilding sliding windows: {e}")
+            finally:
+                session.close()
+        thread = threading.Thread(target=run, name='window-aggregator-load', daemon=True)
+        thread.start()
+        return thread
+
+    def window_totals(self, kind: str, key: Hashable = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Rollup-shaped sums per window for one series, or None while not current
+
+        Args:
+            kind: 'market', 'company' (key: company id), 'industry' (key:
+                name, any case) or 'source' (key: source name)
+        """
+        if kind == 'company':
+            key = str(key)
+        elif kind == 'industry' and key:
+            key = key.lower()
+        with self._lock:
+            if not self.current:
+                return None
+            self._advance(self._series, to_minute(datetime.utcnow()))
+            series = self._series.get((kind, key))
+            if series is None:
+                return {name: empty_totals() for name in self.windows}
+            return {
+                name: dict(zip(ROLLUP_SUM_COLUMNS, series.totals[i].tolist()))
+                for i, name in enumerate(self.windows)
+            }
+
+def rollup_window_totals(session: Session,
+                         company_ids: Optional[List] = None,
+                         sources: Optional[List[str]] = None,
+                         group_by_company: bool = False) -> Dict[str, Any]:
+    """
+    The same window totals summed from the rollup tables, one query per window
+
+    Used for series the aggregator doesn't track (e.g. a company filtered by
+    source) and while it rebuilds. With group_by_company, each window maps
+    company id to totals instead.
+    """
+    results = {}
+    for name, since in window_starts().items():
+        if group_by_company:
+            rows = query_rollup_totals(session, company_ids=company_ids, sources=sources, since=since, group_by=['company_id'])
+            results[name] = {str(row.pop('company_id')): row for row in rows}
+        else:
+            results[name] = query_rollup_totals(session, company_ids=company_ids, sources=sources, since=since)[0]
+    return results
+
+def window_summaries(totals: Dict[str, Dict[str, Any]], weighting: str = 'none') -> Dict[str, Dict[str, Any]]:
+    """summarize() each window and add its delta against the next longer window"""
+    summaries = {name: summarize(window, weighting) for name, window in totals.items()}
+    names = list(summaries)
+    for name, longer in zip(names, names[1:]):
+        current, baseline = summaries[name]['sentiment'], summaries[longer]['sentiment']
+        summaries[name]['delta'] = current - baseline if current is not None and baseline is not None else None
+    return summaries
@@ -10,7 +10,15 @@ from services.reddit_service import RedditService
 from services.stocktwits_service import StockTwitsService
 from services.news_service import NewsService
 from services.sentiment_analyzer import FinancialSentimentAnalyzer
-from models.models import SentimentPostModel, CompanyModel
+from models.models import SentimentPostModel, CompanyModel, lock_ingest
+from services.rollup_service import apply_posts_to_rollups, prune_rollups
+from services.stats_service import apply_posts_to_stats, remove_expired_from_stats
+from services.sketch_service import apply_posts_to_sketches, prune_sketches
+from services.trending_service import apply_posts_to_trending, prune_trending
+from services.webhook_dispatcher import prune_alert_deliveries
+from services.anomaly_detector import prune_signals
+from services.ingest_bus import ingest_bus
+from services.post_query_service import fetch_post_events, current_ingest_seq
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -134,6 +142,8 @@ class DataCollector:
     def store_data(self, items: List[Dict]):
         """Store processed items in the database"""
         try:
+            lock_ingest(self.session)
+            stored_posts = []
             for item in items:
                 # Check for duplicates
                 if self.check_duplicate(item['content'], item['source'], item['author']):
@@ -153,9 +163,21 @@ class DataCollector:
                 )
                 
                 self.session.add(post)
+                stored_posts.append(post)
             
+            # Rollups, counters and sketches are updated in the same transaction as the posts
+            apply_posts_to_rollups(self.session, stored_posts)
+            apply_posts_to_stats(self.session, stored_posts)
+            apply_posts_to_sketches(self.session, stored_posts)
+            apply_posts_to_trending(self.session, stored_posts)
+            self.session.flush()
+            post_ids = [post.id for post in stored_posts]
             self.session.commit()
             
+            # Notify in-process listeners (live stream etc.) once the batch is committed
+            if ingest_bus.has_listeners:
+                ingest_bus.publish(fetch_post_events(self.session, post_ids), position=current_ingest_seq(self.session))
+            
         except Exception as e:
             logger.error(f"Error storing data: {e}")
             self.session.rollback()
@@ -182,9 +204,16 @@ class DataCollector:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days_old)
             
+            # Counters are decremented from the expiring posts before they go
+            remove_expired_from_stats(self.session, cutoff_date)
             deleted_count = self.session.query(SentimentPostModel)\
                                        .filter(SentimentPostModel.timestamp < cutoff_date)\
                                        .delete()
+            prune_rollups(self.session, cutoff_date)
+            prune_sketches(self.session, cutoff_date)
+            prune_trending(self.session)
+            prune_alert_deliveries(self.session, cutoff_date)
+            prune_signals(self.session, cutoff_date)
             
             self.session.commit()
             logger.info(f"Deleted {deleted_count} old posts")
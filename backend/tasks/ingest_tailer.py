@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Optional
+
+from models.models import SentimentPostModel
+from services.ingest_bus import IngestBus, ingest_bus
+from services.post_query_service import post_event_query, serialize_post_event, current_ingest_seq
+
+logger = logging.getLogger(__name__)
+
+class IngestTailer:
+    """
+    Feed the in-process ingest bus from the database
+
+    Used when the collector runs in a different process than the API. One
+    small query on the ingest_seq index per interval per worker replaces
+    per-client polling; the tailer starts at the newest post so history is
+    never replayed.
+    """
+
+    def __init__(self, session_factory, interval_seconds: float = 2.0, batch_size: int = 500, bus: IngestBus = ingest_bus):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.bus = bus
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_seq: Optional[int] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        if self._last_seq is None:
+            # Fix the starting position now, so anything that loads the database
+            # after start() (e.g. the hot store) overlaps with what gets published
+            session = self.session_factory()
+            try:
+                self._last_seq = current_ingest_seq(session)
+            finally:
+                session.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ingest-tailer', daemon=True)
+        self._thread.start()
+        logger.info(f"Ingest tailer started (every {self.interval_seconds}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def poll_once(self) -> int:
+        """Publish posts stored since the last poll; returns how many were published"""
+        session = self.session_factory()
+        try:
+            if self._last_seq is None:
+                self._last_seq = current_ingest_seq(session)
+
+            post = SentimentPostModel
+            stmt = post_event_query()\
+                .where(post.ingest_seq > self._last_seq)\
+                .order_by(post.ingest_seq)\
+                .limit(self.batch_size)
+
+            rows = session.execute(stmt).mappings().all()
+            if len(rows) < self.batch_size:
+                # Caught up, whether or not anything new was published
+                self.bus.heartbeat()
+            if not rows:
+                return 0
+            self._last_seq = rows[-1]['ingest_seq']
+            self.bus.publish([serialize_post_event(row) for row in rows], position=self._last_seq)
+            return len(rows)
+        finally:
+            session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.poll_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Error tailing ingested posts: {e}")
+            self._stop.wait(self.interval_seconds)
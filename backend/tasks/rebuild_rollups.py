@@ -0,0 +1,40 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.models import Base, migrate_search_schema
+from services.rollup_service import rebuild_rollups
+from services.stats_service import rebuild_stats
+from services.sketch_service import rebuild_sketches
+from config import Config
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+def rebuild_sentiment_rollups(migrate_search: bool = False):
+    engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+    Base.metadata.create_all(engine)
+    if migrate_search:
+        # Rewrites sentiment_posts under an exclusive lock on PostgreSQL
+        try:
+            migrate_search_schema(engine)
+            print('✅ Built full-text search column and indexes.')
+        except Exception as e:
+            print(f'❌ Error building full-text search schema: {e}')
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        total = rebuild_rollups(session)
+        print(f'✅ Rebuilt sentiment rollups from {total} posts.')
+        rebuild_stats(session)
+        session.commit()
+        print('✅ Rebuilt ingest counters.')
+        total = rebuild_sketches(session)
+        print(f'✅ Rebuilt percentile and unique-author sketches from {total} posts.')
+    except Exception as e:
+        print(f'❌ Error rebuilding rollups: {e}')
+        session.rollback()
+    finally:
+        session.close()
+
+if __name__ == '__main__':
+    rebuild_sentiment_rollups(migrate_search='--search' in sys.argv[1:])
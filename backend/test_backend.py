@@ -7,7 +7,7 @@ This script tests the backend components to ensure everything is set up correctl
 
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import Mock
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -21,7 +21,66 @@ from services.twitter_service import TwitterService
 from services.reddit_service import RedditService
 from services.stocktwits_service import StockTwitsService
 from services.news_service import NewsService
-from models.models import SentimentPost, CompanyModel, IndustryModel
+from models.models import SentimentPost, CompanyModel, IndustryModel, SentimentPostModel, Base, ensure_ingest_seq_schema
+from services.rollup_service import apply_posts_to_rollups, query_rollup_totals, average_score, rebuild_rollups
+from services.timeseries_service import build_timeseries, lttb, parse_bucket
+from services.stats_service import apply_posts_to_stats, remove_expired_from_stats, rebuild_stats, get_ingest_stats
+from services.single_flight import SingleFlight
+from services.admission import AdmissionController, Overloaded
+from services.hot_store import HotPostStore
+from services.aggregation_service import aggregate_sentiment
+from services.post_query_service import fetch_post_events
+from services.window_aggregator import SlidingWindowAggregator, rollup_window_totals, window_starts, window_summaries
+from services.sentiment_index import DecayedSentimentIndex
+from services.anomaly_detector import AnomalyDetector
+from services.alert_engine import AlertEngine, AlertRule
+from services.webhook_dispatcher import WebhookDispatcher, prune_alert_deliveries
+from models.models import AlertDeliveryModel, SentimentIndexCheckpointModel
+from services.sketch_service import DDSketch, HyperLogLog, apply_posts_to_sketches, merge_sketches, prune_sketches
+from services.trending_service import CountMinSketch, SpaceSaving, TrendingTracker, apply_posts_to_trending, extract_items, prune_trending
+
+def create_test_session():
+    """Create an in-memory SQLite session with a seeded industry and company"""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    industry = IndustryModel(name="Technology")
+    session.add(industry)
+    session.commit()
+    company = CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=industry.id)
+    session.add(company)
+    session.commit()
+    return session, company
+
+_test_app = None
+
+def create_test_app():
+    """
+    Flask app on a temporary SQLite file, seeded like create_test_session
+
+    The ingest tailer, hot store and response cache are off so requests see
+    each write at once. Built once per run, since routes.posts binds its engine
+    on import.
+    """
+    global _test_app
+    if _test_app is None:
+        import tempfile
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_app.sqlite')}"
+        Config.INGEST_TAIL_INTERVAL_SECONDS = 0
+        Config.HOT_STORE_ENABLED = False
+        Config.RESPONSE_CACHE_MAX_AGE_SECONDS = 0
+        from app import create_app
+        from routes.posts import Session
+        app = create_app()
+        session = Session()
+        industry = IndustryModel(name="Technology")
+        session.add(industry)
+        session.commit()
+        session.add(CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=industry.id))
+        session.commit()
+        session.close()
+        _test_app = app
+    return _test_app
 
 def test_config():
     """Test configuration loading"""
@@ -287,6 +346,1733 @@ def test_database_model():
         else:
             raise
 
+def test_post_lists():
+    """Test that the post list endpoints serve a page from one projection query"""
+    print("Testing Post Lists...")
+    from sqlalchemy import event
+    app = create_test_app()
+    from routes.posts import Session, engine
+
+    session = Session()
+    industry = IndustryModel(name="Aerospace")
+    session.add(industry)
+    session.commit()
+    companies = [CompanyModel(ticker=ticker, name=f"{ticker} Corp", industry_id=industry.id) for ticker in ("BA", "LMT")]
+    session.add_all(companies)
+    session.commit()
+    now = datetime.utcnow()
+    posts = [SentimentPostModel(company_id=companies[i % 2].id, content=f"aero post {i}", sentiment="positive",
+                                confidence=60.0 + i, source="news", author="test_user", engagement=i,
+                                original_url=f"https://example.com/{i}", timestamp=now - timedelta(minutes=i))
+             for i in range(6)]
+    session.add_all(posts)
+    session.commit()
+    expected = {str(post.id): post.to_dict() for post in posts}
+    session.close()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        # A company page is one query, however many posts (and company references) it holds
+        response = client.get('/posts/company/ba')
+        assert response.status_code == 200 and len(statements) == 1
+        page = response.get_json()
+        assert [post["content"] for post in page] == ["aero post 0", "aero post 2", "aero post 4"]
+        # Same shape and values as the ORM serializer, nested company included
+        assert all(post == expected[post["id"]] for post in page)
+
+        # Industry pages are limited and paged by cursor, one query each
+        statements.clear()
+        response = client.get('/posts/industry/aerospace', query_string={'limit': '4'})
+        assert len(statements) == 1 and len(response.get_json()) == 4
+        rest = client.get('/posts/industry/AEROSPACE', query_string={'cursor': response.headers['X-Next-Cursor']})
+        assert len(statements) == 2 and 'X-Next-Cursor' not in rest.headers
+        assert [post["content"] for post in response.get_json() + rest.get_json()] == [f"aero post {i}" for i in range(6)]
+        assert client.get('/posts/industry/aerospace', query_string={'limit': '100000'}).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    assert client.get('/posts/company/NOPE').status_code == 404
+    assert client.get('/posts/industry/aerospace', query_string={'limit': 'many'}).status_code == 400
+
+    print("✅ Post Lists test passed!")
+
+def test_response_formats():
+    """Test field projection and JSON, MessagePack and Arrow negotiation on post lists"""
+    print("Testing Response Formats...")
+    import json
+    app = create_test_app()
+    from routes.posts import Session
+    from services import response_format
+
+    session = Session()
+    industry = IndustryModel(name="Finance")
+    session.add(industry)
+    session.commit()
+    company = CompanyModel(ticker="JPM", name="JPMorgan Chase", industry_id=industry.id)
+    session.add(company)
+    session.commit()
+    now = datetime.utcnow()
+    session.add_all([SentimentPostModel(company_id=company.id, content=f"bank post {i}", sentiment="neutral",
+                                        confidence=55.5, source="news", author="test_user", engagement=i,
+                                        timestamp=now - timedelta(minutes=i)) for i in range(3)])
+    session.commit()
+    company_id = str(company.id)
+    session.close()
+    client = app.test_client()
+    url = '/posts/company/JPM'
+
+    # Without fields or a format the original shape is kept
+    plain = client.get(url)
+    assert plain.mimetype == 'application/json' and plain.headers['Vary'] == 'Accept'
+    full = plain.get_json()
+    assert len(full) == 3 and full[0]["company"]["ticker"] == "JPM"
+
+    # Projection keeps the requested fields and lists each company once
+    projected = client.get(url, query_string={'fields': 'id,sentiment,company', 'limit': '2'})
+    body = projected.get_json()
+    assert set(body) == {"next_cursor", "posts", "companies"} and body["next_cursor"] == projected.headers['X-Next-Cursor']
+    assert body["posts"] == [{"id": post["id"], "sentiment": "neutral", "company_id": company_id} for post in full[:2]]
+    assert body["companies"] == {company_id: full[0]["company"]}
+    assert list(client.get(url, query_string={'fields': 'content'}).get_json()["companies"]) == []
+    assert client.get(url, query_string={'fields': 'id,password'}).status_code == 400
+
+    # MessagePack, by Accept header or ?format=, decodes to the projected JSON payload
+    expected = client.get(url, query_string={'fields': ','.join(response_format.POST_FIELDS)}).get_json()
+    packed = client.get(url, headers={'Accept': 'application/msgpack'})
+    assert packed.mimetype == 'application/msgpack'
+    assert response_format.msgpack.unpackb(packed.data) == expected
+    assert response_format.msgpack.unpackb(client.get(url, query_string={'format': 'msgpack'}).data) == expected
+
+    # Arrow carries the posts as a table and the rest of the payload in schema metadata
+    # (pyarrow is optional)
+    if response_format.pyarrow is not None:
+        arrow = client.get('/posts', query_string={'company_ids': company_id, 'fields': 'id,engagement,confidence'},
+                           headers={'Accept': 'application/vnd.apache.arrow.stream, application/json;q=0.5'})
+        assert arrow.mimetype == 'application/vnd.apache.arrow.stream'
+        table = response_format.pyarrow.ipc.open_stream(arrow.data).read_all()
+        assert table.column_names == ["id", "engagement", "confidence"]
+        assert table.column("engagement").to_pylist() == [0, 1, 2] and table.column("confidence").to_pylist() == [55.5] * 3
+        meta = json.loads(table.schema.metadata[b'meta'])
+        assert meta["has_more"] is False and meta["companies"] == {}
+
+    # Formats that can't be produced get 406 with the alternatives
+    refused = client.get(url, headers={'Accept': 'text/csv'})
+    assert refused.status_code == 406 and refused.get_json()["available"] == sorted(response_format.available_formats().values())
+    assert client.get(url, query_string={'format': 'xml'}).status_code == 406
+
+    print("✅ Response Formats test passed!")
+
+def test_facets():
+    """Test drill-down facet counts from the rollups, the SQLite UNION and PostgreSQL GROUPING SETS"""
+    print("Testing Facets...")
+    from sqlalchemy.dialects import postgresql
+    from models.models import init_db
+    from services import facet_service
+    from services.facet_service import facet_counts
+
+    engine = create_engine('sqlite://')
+    init_db(engine)
+    session = sessionmaker(bind=engine)()
+    tech, energy = IndustryModel(name="Technology"), IndustryModel(name="Energy")
+    session.add_all([tech, energy])
+    session.commit()
+    aapl, xom = CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=tech.id), CompanyModel(ticker="XOM", name="Exxon Mobil", industry_id=energy.id)
+    session.add_all([aapl, xom])
+    session.commit()
+    now = datetime.utcnow() - timedelta(minutes=5)
+    plan = [(aapl, "reddit", "positive"), (aapl, "reddit", "negative"), (aapl, "news", "positive"),
+            (xom, "reddit", "neutral"), (xom, "news", "negative"), (xom, "news", "negative")]
+    posts = [SentimentPostModel(company_id=company.id, content=f"oil and chips {i}", sentiment=sentiment, confidence=80.0,
+                                source=source, author="test_user", engagement=0, timestamp=now)
+             for i, (company, source, sentiment) in enumerate(plan)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+
+    # Each facet ignores its own filter, so the alternatives stay visible; total honours every filter
+    expected = {
+        "source": {"reddit": 1, "news": 1},
+        "sentiment": {"positive": 1, "negative": 1},
+        "industry": {"technology": 1},
+        "company": {"AAPL": 1, "XOM": 0},
+    }
+    filters = dict(sources=["reddit"], sentiments=["positive"], company_ids=[str(aapl.id)], hours_back=24)
+    for search in (None, "chips"):
+        result = facet_counts(session, search_query=search, **filters)
+        assert result["from_rollups"] == (search is None) and result["total"] == 1
+        assert result["facets"] == {facet: {k: v for k, v in counts.items() if v} for facet, counts in expected.items()}, search
+
+        result = facet_counts(session, search_query=search, sources=["news"], hours_back=24)
+        assert result["facets"]["source"] == {"reddit": 3, "news": 3} and result["total"] == 3
+        assert result["facets"]["company"] == {"AAPL": 1, "XOM": 2}
+        assert result["facets"]["sentiment"] == {"positive": 1, "negative": 2}
+
+        assert facet_counts(session, search_query=search)["total"] == 6
+    session.close()
+
+    # PostgreSQL: one GROUPING SETS scan, shared filters in WHERE, each facet's others in its FILTER clause
+    captured = []
+    fake_session = Mock()
+    fake_session.get_bind.return_value.dialect.name = 'postgresql'
+    fake_session.execute.side_effect = lambda stmt: captured.append(stmt) or Mock(mappings=lambda: [])
+    facet_service.facet_counts(fake_session, search_query="chips", **filters)
+    sql = str(captured[0].compile(dialect=postgresql.dialect()))
+    assert "GROUPING SETS" in sql and sql.count("FILTER (WHERE") == 4
+    where = sql[sql.index("FROM"):sql.index("GROUP BY")]
+    assert "ILIKE" in where and "timestamp >=" in where and " IN (" not in where
+    select_list = sql[:sql.index("FROM")]
+    source_count = select_list[select_list.index("AS company,") + len("AS company,"):select_list.index("AS source_count")]
+    assert "sentiment IN" in source_count and "company_id IN" in source_count and "source IN" not in source_count
+    industry_count = select_list[select_list.index("AS sentiment_count"):select_list.index("AS industry_count")]
+    assert all(f"{column} IN" in industry_count for column in ("source", "sentiment", "company_id"))
+
+    print("✅ Facets test passed!")
+
+def test_post_pagination():
+    """Test keyset pagination of /posts and its estimated and exact totals"""
+    print("Testing Post Pagination...")
+    app = create_test_app()  # routes.posts needs the test database configured
+    from routes.posts import Session
+    import uuid
+    from services.post_query_service import decode_cursor, encode_cursor
+
+    session = Session()
+    industry = session.query(IndustryModel).first()
+    company = CompanyModel(ticker="PAGE", name="Pagination Corp.", industry_id=industry.id)
+    session.add(company)
+    session.commit()
+    company_id = str(company.id)
+
+    # Three posts share a timestamp, so their order falls to the id tie-breaker
+    now = datetime.utcnow().replace(microsecond=0)
+    offsets = [0, 1, 1, 1, 2, 3, 4]
+    posts = [SentimentPostModel(company_id=company.id, content=f"post {i}", sentiment="positive" if i % 2 else "negative",
+                                confidence=80.0, source="reddit", author="test_user", engagement=1,
+                                timestamp=now - timedelta(minutes=minutes))
+             for i, minutes in enumerate(offsets)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+    expected = [str(p.id) for p in sorted(posts, key=lambda p: (p.timestamp, str(p.id)), reverse=True)]
+    session.close()
+
+    client = app.test_client()
+    def posts_page(**args):
+        response = client.get('/posts', query_string={'company_ids': company_id, **args})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()
+
+    # Walking the cursors visits every post once, in (timestamp, id) order, at any page size
+    for limit in (1, 2, 3, 7):
+        seen, cursor = [], None
+        while True:
+            args = {'limit': str(limit)}
+            if cursor:
+                args['cursor'] = cursor
+            page = posts_page(**args)
+            seen += [post["id"] for post in page["posts"]]
+            cursor = page["next_cursor"]
+            assert page["has_more"] == (cursor is not None)
+            if cursor is None:
+                break
+        assert seen == expected, limit
+
+    # A cursor between tied posts resumes right after it
+    tied = expected[1:4]
+    cursor = encode_cursor(now - timedelta(minutes=1), tied[0])
+    assert decode_cursor(cursor) == (now - timedelta(minutes=1), uuid.UUID(tied[0]))
+    assert [post["id"] for post in posts_page(cursor=cursor, limit='2')["posts"]] == tied[1:]
+
+    # Tampered or malformed cursors are rejected with a 400
+    for bad in ("not-a-cursor", cursor[:-3], encode_cursor(now, company_id)[:-1] + "!"):
+        response = client.get('/posts', query_string={'company_ids': company_id, 'cursor': bad})
+        assert response.status_code == 400, bad
+        assert response.get_json() == {"error": "Invalid parameter provided"}
+
+    # Without a search, estimates come from the rollups; with one SQLite has no
+    # planner estimate, so the total is counted exactly instead
+    page = posts_page(total='estimate', sentiments='positive')
+    assert page["total"] == 3 and page["total_is_estimate"] is True
+    page = posts_page(total='exact', sentiments='positive')
+    assert page["total"] == 3 and page["total_is_estimate"] is False
+    page = posts_page(total='estimate', search='post')
+    assert page["total"] == 7 and page["total_is_estimate"] is False
+    assert "total" not in posts_page(limit='1')
+    response = client.get('/posts', query_string={'company_ids': company_id, 'total': 'approximate'})
+    assert response.status_code == 400
+
+    print("✅ Post Pagination test passed!")
+
+def test_sentiment_rollups():
+    """Test incrementally maintained sentiment rollups"""
+    print("Testing Sentiment Rollups...")
+
+    session, company = create_test_session()
+    now = datetime.utcnow().replace(second=30, microsecond=0)
+
+    def make_post(sentiment, minutes_ago, source="reddit", engagement=10):
+        return SentimentPostModel(
+            company_id=company.id,
+            content=f"{sentiment} post {minutes_ago}",
+            sentiment=sentiment,
+            confidence=80.0,
+            source=source,
+            author="test_user",
+            engagement=engagement,
+            timestamp=now - timedelta(minutes=minutes_ago)
+        )
+
+    batch = [make_post("positive", 5), make_post("negative", 90), make_post("neutral", 200, source="news")]
+    session.add_all(batch)
+    apply_posts_to_rollups(session, batch)
+    session.commit()
+
+    # A late-arriving post lands in its own (older) bucket
+    late = [make_post("positive", 95)]
+    session.add_all(late)
+    apply_posts_to_rollups(session, late)
+    session.commit()
+
+    totals = query_rollup_totals(session, company_ids=[company.id])[0]
+    assert totals['post_count'] == 4
+    assert abs(average_score(totals) - 0.25) < 1e-9
+
+    # Windows mixing minute and hour buckets resolve to minute precision
+    last_two_hours = query_rollup_totals(session, since=now - timedelta(minutes=120))[0]
+    assert last_two_hours['post_count'] == 3
+    recent = query_rollup_totals(session, since=now - timedelta(minutes=10), sources=["reddit"])[0]
+    assert recent['post_count'] == 1 and recent['positive_count'] == 1
+
+    by_source = {row['source']: row for row in query_rollup_totals(session, group_by=['source'])}
+    assert by_source['news']['post_count'] == 1
+
+    # Rebuilding from raw posts reproduces the incremental result
+    assert rebuild_rollups(session) == 4
+    assert query_rollup_totals(session)[0] == totals
+
+    session.close()
+    print("✅ Sentiment Rollups test passed!")
+
+def test_sentiment_timeseries():
+    """Test bucketed sentiment time series and LTTB downsampling"""
+    print("Testing Sentiment Timeseries...")
+
+    # LTTB keeps the endpoints and the spike
+    points = [(i, 0.0) for i in range(100)]
+    points[37] = (37, 5.0)
+    kept = lttb(points, 10)
+    assert len(kept) == 10 and kept[0] == 0 and kept[-1] == 99 and 37 in kept
+    assert lttb(points, 500) == list(range(100))
+
+    assert parse_bucket('15m') == 900 and parse_bucket('2h') == 7200
+    try:
+        parse_bucket('30s')
+        assert False, "sub-minute buckets should be rejected"
+    except ValueError:
+        pass
+
+    session, company = create_test_session()
+    now = datetime(2024, 1, 2, 12, 0, 0)
+    posts = [
+        SentimentPostModel(company_id=company.id, content=f"post {i}", sentiment=sentiment,
+                           confidence=80.0, source="reddit", author="test_user", engagement=0,
+                           timestamp=now - timedelta(minutes=minutes_ago))
+        for i, (sentiment, minutes_ago) in enumerate([("positive", 5), ("negative", 20), ("positive", 25), ("neutral", 70)])
+    ]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+
+    series = build_timeseries(session, hours_back=2, bucket_seconds=1800, moving_average=2, now=now)
+    counts = [point["count"] for point in series["points"]]
+    assert counts == [0, 1, 0, 3, 0]
+    assert series["points"][3]["sentiment"] == 1 / 3
+    # The empty final bucket has no score but the moving average carries over
+    assert series["points"][4]["sentiment"] is None
+    assert series["points"][4]["moving_average"] == 1 / 3
+
+    # An unknown weighting is rejected up front, so the endpoint answers 400 rather than echoing it or failing
+    try:
+        build_timeseries(session, hours_back=2, weighting='bogus', now=now)
+        assert False, "unknown weighting accepted"
+    except ValueError:
+        pass
+    session.close()
+    client = create_test_app().test_client()
+    response = client.get('/sentiment/timeseries', query_string={'weighting': 'bogus'})
+    assert response.status_code == 400 and response.get_json() == {"error": "Invalid parameter provided"}
+    assert client.get('/sentiment/timeseries', query_string={'weighting': 'engagement'}).status_code == 200
+
+    print("✅ Sentiment Timeseries test passed!")
+
+def test_ingest_stats():
+    """Test ingest-maintained stats counters"""
+    print("Testing Ingest Stats...")
+
+    session, company = create_test_session()
+    now = datetime.utcnow()
+    posts = [
+        SentimentPostModel(company_id=company.id, content=f"post {i}", sentiment=sentiment,
+                           confidence=confidence, source=source, author=author, engagement=0,
+                           timestamp=now - timedelta(days=days_ago))
+        for i, (sentiment, confidence, source, author, days_ago) in enumerate([
+            ("positive", 90.0, "reddit", "alice", 0),
+            ("negative", 70.0, "reddit", "alice", 10),
+            ("neutral", 50.0, "news", "bob", 10),
+        ])
+    ]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    apply_posts_to_stats(session, posts)
+    session.commit()
+
+    stats = get_ingest_stats(session)
+    assert stats["total_posts"] == 3 and stats["unique_authors"] == 2
+    assert stats["by_source"] == {"reddit": 2, "news": 1}
+    assert stats["by_industry"] == {"technology": 3}
+    assert abs(stats["avg_confidence"] - 70.0) < 1e-9
+    assert len(stats["posts_per_hour"]) == 24 and stats["posts_per_hour"][-1]["count"] == 1
+
+    # Expiring posts decrements counters; bob has no posts left
+    cutoff = now - timedelta(days=7)
+    remove_expired_from_stats(session, cutoff)
+    session.query(SentimentPostModel).filter(SentimentPostModel.timestamp < cutoff).delete()
+    session.commit()
+    stats = get_ingest_stats(session)
+    assert stats["total_posts"] == 1 and stats["unique_authors"] == 1
+    assert stats["by_sentiment"] == {"positive": 1}
+
+    # Rebuilding from raw posts reproduces the incremental result
+    rebuild_stats(session)
+    assert get_ingest_stats(session) == stats
+
+    session.close()
+    print("✅ Ingest Stats test passed!")
+
+def test_dashboard_snapshot():
+    """Test the dashboard snapshot's ETag and first build"""
+    print("Testing Dashboard Snapshot...")
+    import hashlib
+    import json
+    import threading
+    import time
+    from services.dashboard_service import DashboardSnapshot
+
+    content = {"market": {"count": 1}}
+    builds = []
+
+    def builder(_session):
+        builds.append(1)
+        time.sleep(0.05)
+        return dict(content)
+
+    snapshot = DashboardSnapshot(lambda: Mock(), builder=builder)
+
+    # Concurrent first requests build once
+    threads = [threading.Thread(target=snapshot.get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+
+    # The ETag hashes exactly the served bytes, version and generated_at included
+    body, etag, version = snapshot.get()
+    assert etag == hashlib.sha1(body).hexdigest() and json.loads(body)["version"] == version == 1
+
+    # An unchanged rebuild keeps the snapshot; new content gets a new body and ETag
+    snapshot.rebuild()
+    assert snapshot.get() == (body, etag, 1)
+    content["market"] = {"count": 2}
+    snapshot.rebuild()
+    new_body, new_etag, new_version = snapshot.get()
+    assert new_version == 2 and new_etag == hashlib.sha1(new_body).hexdigest() != etag
+
+    print("✅ Dashboard Snapshot test passed!")
+
+def test_single_flight():
+    """Test coalescing of identical concurrent computations"""
+    print("Testing Single Flight...")
+    import json
+    import tempfile
+    import threading
+    import time
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    def run_concurrently(flights, count):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker(flight):
+            barrier.wait()
+            results.append(flight.do(('/sentiment/market', ()), compute))
+
+        threads = [threading.Thread(target=worker, args=(flights[i % len(flights)],)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    # Threads in one process share the leader's result
+    results = run_concurrently([SingleFlight()], 8)
+    assert len(calls) == 1
+    assert all(result == {"value": 42} for result, _ in results)
+    assert sum(1 for _, shared in results if shared) == 7
+
+    # Two "workers" coalesce through the file lock and result file
+    calls.clear()
+    with tempfile.TemporaryDirectory() as lock_dir:
+        workers = [SingleFlight(lock_dir=lock_dir, encode=lambda r: json.dumps(r).encode(), decode=json.loads) for _ in range(2)]
+        results = run_concurrently(workers, 8)
+        assert len(calls) == 1
+        assert all(result == {"value": 42} for result, _ in results)
+
+        # A later flight computes afresh instead of reusing the old result file
+        workers[0].do(('/sentiment/market', ()), compute)
+        assert len(calls) == 2
+
+        # Old lock and result files are swept, but not a lock another flight holds
+        assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(lock_dir)) == ['lock', 'result']
+        held = workers[1]._open_locked(os.path.join(lock_dir, 'held.lock'))
+        assert workers[0].sweep(time.time() + 1) == 2
+        assert os.listdir(lock_dir) == ['held.lock']
+        held.close()
+
+        # With no TTL the leader sweeps its own files once it's done
+        sweeping = SingleFlight(lock_dir=lock_dir, encode=lambda r: json.dumps(r).encode(), decode=json.loads,
+                                file_ttl_seconds=0)
+        time.sleep(0.01)
+        assert sweeping.do(('/sentiment/market', ()), compute) == ({"value": 42}, False)
+        assert os.listdir(lock_dir) == []
+
+    print("✅ Single Flight test passed!")
+
+def test_admission_control():
+    """Test per-class concurrency limits and load shedding"""
+    print("Testing Admission Control...")
+
+    controller = AdmissionController(
+        {"light": {"concurrency": 2}, "heavy": {"concurrency": 1, "statement_timeout_ms": 1000}},
+        queue_size=0,
+        max_wait_seconds=0.05
+    )
+
+    controller.acquire("heavy")
+    try:
+        controller.acquire("heavy")
+        assert False, "second heavy request should be shed"
+    except Overloaded as e:
+        assert e.endpoint_class == "heavy" and e.retry_after == 1
+
+    # A saturated heavy class doesn't hold up light requests
+    controller.acquire("light")
+    controller.release("light")
+
+    controller.release("heavy")
+    controller.acquire("heavy")
+    controller.release("heavy")
+    assert controller.stats()["heavy"]["rejected"] == 1
+
+    with controller.budget("heavy") as budget:
+        assert budget.timeout_ms == 1000 and not budget.exceeded
+
+    print("✅ Admission Control test passed!")
+
+def test_hot_store():
+    """Test the in-memory hot tier against the database"""
+    print("Testing Hot Store...")
+
+    session, company = create_test_session()
+    now = datetime.utcnow()
+    posts = [
+        SentimentPostModel(company_id=company.id, content=f"post {i}", sentiment=sentiment,
+                           confidence=60.0 + i, source=source, author="test_user", engagement=i,
+                           timestamp=now - timedelta(minutes=minutes_ago))
+        for i, (sentiment, source, minutes_ago) in enumerate([
+            ("positive", "reddit", 5), ("negative", "reddit", 5), ("neutral", "news", 30),
+            ("positive", "news", 90), ("negative", "reddit", 600), ("positive", "reddit", 2000),
+        ])
+    ]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+
+    store = HotPostStore(window_hours=24)
+    assert store.latest(10) is None  # not loaded yet
+    assert store.load(session) == 5  # the 2000-minute-old post is outside the window
+
+    # Pages come back newest first with ties broken by id, as from the database
+    expected = sorted(
+        (p for p in posts if p.timestamp >= now - timedelta(hours=24)),
+        key=lambda p: (p.timestamp, str(p.id)), reverse=True
+    )
+    page, cursor, _ = store.latest(3, hours_back=24)
+    assert [post['id'] for post in page] == [str(p.id) for p in expected[:3]] and cursor
+    rest, cursor, _ = store.latest(3, hours_back=24, cursor=cursor)
+    assert [post['id'] for post in rest] == [str(p.id) for p in expected[3:]] and cursor is None
+    assert store.count(hours_back=24, sources=["reddit"]) == 3
+    # The full window isn't held for 48h, and the page can't be filled from it
+    assert store.latest(10, hours_back=48) is None and store.count(hours_back=48) is None
+
+    # Aggregates match raw-post aggregation
+    for group_by in (None, ['source']):
+        hot = aggregate_sentiment(session, hours_back=6, group_by=group_by, weighting='confidence', hot_store=store)
+        db = aggregate_sentiment(session, hours_back=6, group_by=group_by, weighting='confidence', exact=True)
+        key = lambda row: row.get('source') or ''
+        assert sorted(hot, key=key) == sorted(db, key=key)
+
+    # Bus events are merged by id, so replays don't double count
+    store.add_posts(fetch_post_events(session, [p.id for p in posts[:2]]), ingest_seq=99)
+    assert store.count(hours_back=24) == 5 and store.ingest_seq == 99
+
+    # Without a feed the store stops answering; a tailer heartbeat revives it
+    import time
+    from services.ingest_bus import IngestBus
+    bus = IngestBus()
+    fed = HotPostStore(window_hours=24, bus=bus, max_feed_age_seconds=0.2)
+    fed.load(session)
+    assert fed.count(hours_back=24) == 5
+    time.sleep(0.3)
+    assert fed.latest(1) is None and fed.count(hours_back=24) is None
+    assert fed.aggregate_totals(hours_back=6) is None
+    bus.heartbeat()
+    assert fed.count(hours_back=24) == 5
+
+    # An overflowing ring still serves its newest posts, but not whole-window counts
+    small = HotPostStore(window_hours=24, company_capacity=2)
+    small.load(session)
+    page, _, _ = small.latest(1)
+    assert page[0]['id'] == str(expected[0].id)
+    assert small.count(hours_back=24) is None
+
+    session.close()
+    print("✅ Hot Store test passed!")
+
+def test_sliding_windows():
+    """Test rolling window totals against the rollups"""
+    print("Testing Sliding Windows...")
+
+    session, company = create_test_session()
+    now = datetime.utcnow()
+
+    def make_post(sentiment, minutes_ago, source="reddit"):
+        return SentimentPostModel(company_id=company.id, content=f"{sentiment} post {minutes_ago}", sentiment=sentiment,
+                                  confidence=80.0, source=source, author="test_user", engagement=3,
+                                  timestamp=now - timedelta(minutes=minutes_ago))
+
+    posts = [make_post("positive", 1), make_post("negative", 30), make_post("neutral", 300, source="news"),
+             make_post("negative", 3000), make_post("positive", 20000)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+
+    aggregator = SlidingWindowAggregator()
+    assert aggregator.window_totals('market') is None  # not rebuilt yet
+    aggregator.load(session)
+
+    # Every tracked series matches the rollups, window by window
+    for series, company_ids, sources in [(('market', None), None, None), (('company', company.id), [company.id], None),
+                                         (('industry', 'Technology'), None, None), (('source', 'news'), None, ['news'])]:
+        totals = aggregator.window_totals(*series)
+        expected = rollup_window_totals(session, company_ids=company_ids, sources=sources)
+        assert {name: t['post_count'] for name, t in totals.items()} == {name: t['post_count'] for name, t in expected.items()}
+    counts = {name: t['post_count'] for name, t in aggregator.window_totals('market').items()}
+    assert counts == {'5m': 1, '1h': 2, '24h': 3, '7d': 4}
+
+    summaries = window_summaries(aggregator.window_totals('market'))
+    assert summaries['5m']['sentiment'] == 1.0 and summaries['1h']['delta'] == 0.0 - summaries['24h']['sentiment']
+    assert 'delta' not in summaries['7d']
+
+    # Events the rebuild already counted are skipped; new ones land in every window
+    aggregator.add_posts(fetch_post_events(session, [posts[0].id]))
+    assert aggregator.window_totals('market')['5m']['post_count'] == 1
+    event = fetch_post_events(session, [posts[1].id])[0]
+    event.update(id="new", ingest_seq=aggregator.loaded_seq + 1, timestamp=now.isoformat())
+    aggregator.add_posts([event])
+    assert {name: t['post_count'] for name, t in aggregator.window_totals('company', company.id).items()} == \
+        {'5m': 2, '1h': 3, '24h': 4, '7d': 5}
+
+    # Buckets leave each window as the clock moves on
+    aggregator._advance(aggregator._series, aggregator._head + 90)
+    counts = {name: t['post_count'] for name, t in aggregator.window_totals('market').items()}
+    assert counts['5m'] == 0 and counts['1h'] == 0 and counts['24h'] == 4
+
+    # Once the ingest bus goes quiet, callers get None and sum the rollups instead
+    import time
+    from services.ingest_bus import IngestBus
+    bus = IngestBus()
+    aggregator = SlidingWindowAggregator(bus=bus, max_feed_age_seconds=10)
+    aggregator.load(session)
+    assert aggregator.current and aggregator.window_totals('market') is not None
+    aggregator._loaded_at = time.monotonic() - 60
+    assert not aggregator.current and aggregator.window_totals('market') is None
+    bus.heartbeat()
+    assert aggregator.window_totals('market')['7d']['post_count'] == 4
+    session.close()
+
+    # Windows past an hour keep hour buckets, so a series holds 61 + 169 buckets, not 10080;
+    # they start at the top of the hour, for the aggregator and the rollups alike
+    session, company = create_test_session()
+    aggregator = SlidingWindowAggregator()
+    assert aggregator.ring_slots == {1: 61, 60: 169}
+    now = datetime.utcnow()
+    starts = window_starts(now)
+    assert starts['24h'].minute == 0 and starts['7d'].minute == 0 and starts['7d'] <= now - timedelta(days=7) + timedelta(minutes=1)
+    assert starts['1h'] == now.replace(second=0, microsecond=0) - timedelta(minutes=59)
+    edges = [starts[name] + offset for name in ('1h', '24h', '7d') for offset in (timedelta(0), -timedelta(minutes=1))]
+    posts = [SentimentPostModel(company_id=company.id, content=f"edge {i}", sentiment="positive", confidence=80.0,
+                                source="reddit", author="test_user", engagement=0, timestamp=when)
+             for i, when in enumerate(edges)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+    aggregator.load(session)
+    counts = {name: t['post_count'] for name, t in aggregator.window_totals('market').items()}
+    assert counts == {name: t['post_count'] for name, t in rollup_window_totals(session).items()}
+    assert counts == {'5m': 0, '1h': 1, '24h': 3, '7d': 5}
+    series = aggregator._series[('market', None)]
+    assert sum(buckets.nbytes for buckets, _ in series.rings.values()) < 16 * 1024
+
+    # Live posts land in both rings; a whole hour later the 1h window is empty and the rest unchanged
+    event = fetch_post_events(session, [posts[0].id])[0]
+    event.update(id="live", ingest_seq=aggregator.loaded_seq + 1, timestamp=now.isoformat())
+    aggregator.add_posts([event])
+    aggregator._advance(aggregator._series, aggregator._head + 60)
+    counts = {name: t['post_count'] for name, t in aggregator.window_totals('market').items()}
+    assert counts['1h'] == 0 and counts['24h'] == 3 and counts['7d'] == 5
+
+    session.close()
+    print("✅ Sliding Windows test passed!")
+
+def test_sentiment_index():
+    """Test the time-decayed sentiment index and its checkpoints"""
+    print("Testing Sentiment Index...")
+
+    session, company = create_test_session()
+    ensure_ingest_seq_schema(session.get_bind())
+    now = datetime.utcnow()
+
+    def make_post(sentiment, hours_ago, engagement=0, confidence=100.0):
+        return SentimentPostModel(company_id=company.id, content=f"{sentiment} post {hours_ago}", sentiment=sentiment,
+                                  confidence=confidence, source="reddit", author="test_user", engagement=engagement,
+                                  timestamp=now - timedelta(hours=hours_ago))
+
+    # An hour-old positive post outweighs an equal negative post two half-lives older
+    posts = [make_post("positive", 1), make_post("negative", 13)]
+    session.add_all(posts)
+    session.commit()
+
+    index = DecayedSentimentIndex(half_life_hours=6)
+    assert index.get('market') is None  # not loaded yet
+    assert index.load(session) == 2
+    result = index.get('company', company.id)
+    assert abs(result["index"] - 0.6) < 1e-3  # (1 - 0.25) / (1 + 0.25), at an hour's decay each
+    assert index.get('industry', 'TECHNOLOGY')["index"] == result["index"]
+    assert abs(result["effective_posts"] - 1.25 * 0.5 ** (1 / 6)) < 1e-3
+
+    # Engagement outweighs volume, and replayed events are skipped by ingest_seq
+    viral = make_post("negative", 0, engagement=9)
+    session.add(viral)
+    session.commit()
+    events = fetch_post_events(session, [p.id for p in posts + [viral]])
+    index.add_posts(events)
+    index.add_posts(events)
+    assert index.get('market')["index"] < -0.5
+    assert index.applied_seq == viral.ingest_seq
+
+    # A restart resumes from the checkpoint plus the posts ingested after it
+    assert index.checkpoint(session) == 3
+    late = make_post("positive", 0)
+    session.add(late)
+    session.commit()
+    restored = DecayedSentimentIndex(half_life_hours=6)
+    assert restored.load(session) == 1
+    index.add_posts(fetch_post_events(session, [late.id]))
+    assert abs(restored.get('market')["index"] - index.get('market')["index"]) < 1e-6
+
+    # Re-checkpointing overwrites rows in place; a worker that is behind doesn't clobber them
+    assert index.checkpoint(session) == 3
+    lagging = DecayedSentimentIndex(half_life_hours=6)
+    lagging.load(session)
+    lagging.applied_seq = viral.ingest_seq
+    assert lagging.checkpoint(session) == 3
+    rows = session.query(SentimentIndexCheckpointModel).all()
+    assert len(rows) == 3 and all(row.ingest_seq == late.ingest_seq for row in rows)
+
+    # A different half-life can't reuse the checkpoint and rebuilds from every post
+    assert DecayedSentimentIndex(half_life_hours=1).load(session) == 4
+
+    # With the bus quiet the index stops answering until it reads the new posts itself
+    import time
+    from services.ingest_bus import IngestBus
+    bus = IngestBus()
+    fed = DecayedSentimentIndex(half_life_hours=6, bus=bus, max_feed_age_seconds=10)
+    fed.load(session)
+    before = fed.get('market')["effective_posts"]
+    unseen = make_post("positive", 0)
+    session.add(unseen)
+    session.commit()
+    fed._caught_up_at = time.monotonic() - 60
+    assert not fed.current and fed.get('market') is None and fed.get_many('company', [company.id]) is None
+    assert fed.catch_up(session) == 1 and fed.catch_up(session) == 0
+    assert fed.applied_seq == unseen.ingest_seq
+    assert fed.get('market')["effective_posts"] - before > 0.99
+
+    session.close()
+    print("✅ Sentiment Index test passed!")
+
+def test_anomaly_detector():
+    """Test streaming spike and shift detection"""
+    print("Testing Anomaly Detector...")
+
+    detector = AnomalyDetector(bucket_minutes=5, lateness_seconds=0, warmup_buckets=12)
+    bucket = timedelta(minutes=5)
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=10)
+    start -= timedelta(minutes=start.minute % 5)
+    # Replay a past timeline: start with nothing closed before it
+    detector._closed_through = detector._bucket(start) - 1
+    detector.ready = True
+
+    def post(ticker, sentiment, when, source="reddit"):
+        return {"company_id": ticker.lower(), "company": {"ticker": ticker}, "industry": "technology",
+                "source": source, "sentiment": sentiment, "timestamp": when.isoformat()}
+
+    def run_bucket(i, volumes):
+        when = start + i * bucket + timedelta(seconds=30)
+        detector.add_posts([post(ticker, sentiment, when) for ticker, (count, sentiment) in volumes.items() for _ in range(count)])
+        return detector.tick(now=start + (i + 1) * bucket)
+
+    # A steady baseline raises nothing, even past the warm-up
+    for i in range(20):
+        assert run_bucket(i, {"AAPL": (6, "positive"), "MSFT": (2, "positive")}) == []
+
+    # A sudden burst of negative posts is a volume spike and a sentiment drop
+    signals = run_bucket(20, {"AAPL": (30, "negative"), "MSFT": (2, "positive")})
+    spikes = {(s["source"], s["metric"], s["direction"]) for s in signals if s["kind"] == "spike" and s["ticker"] == "AAPL"}
+    assert spikes == {("reddit", "volume", "up"), ("all", "volume", "up"), ("reddit", "sentiment", "down"), ("all", "sentiment", "down")}
+    assert all(s["ticker"] == "AAPL" for s in signals)
+
+    # A sustained, moderate rise never spikes but is caught as a shift
+    shifts = []
+    for i in range(21, 33):
+        signals = run_bucket(i, {"MSFT": (6, "positive")})
+        assert not [s for s in signals if s["ticker"] == "MSFT" and s["kind"] == "spike"]
+        shifts.extend(s for s in signals if s["ticker"] == "MSFT" and s["kind"] == "shift")
+    assert shifts and shifts[0]["metric"] == "volume" and shifts[0]["direction"] == "up"
+
+    # Posts for closed buckets are counted as late, not folded in
+    detector.add_posts([post("AAPL", "positive", start)])
+    assert detector.late_posts == 1
+
+    # The feed pages forward from since_id without skipping
+    first = detector.signals(since_id=0, limit=2, oldest_first=True)
+    rest = detector.signals(since_id=first[-1]["id"], limit=1000, oldest_first=True)
+    assert [s["id"] for s in first + rest] == list(range(1, detector.last_id + 1))
+    assert detector.signals(tickers=["MSFT"], kinds=["shift"])[0]["id"] == shifts[-1]["id"]
+
+    # A ticker averaging one post per bucket doesn't spike on a handful
+    for i in range(33, 53):
+        run_bucket(i, {"TSLA": (1, "positive")})
+    assert not [s for s in run_bucket(53, {"TSLA": (4, "positive")}) if s["ticker"] == "TSLA"]
+    assert [s for s in run_bucket(54, {"TSLA": (12, "positive")}) if s["ticker"] == "TSLA" and s["kind"] == "spike"]
+
+    # A detector whose bus has gone quiet drops the buckets it closes rather
+    # than reading them as zero volume and alarming on every series
+    import time
+    from services.ingest_bus import IngestBus
+    bus = IngestBus()
+    quiet = AnomalyDetector(bucket_minutes=5, lateness_seconds=0, warmup_buckets=12, bus=bus, max_feed_age_seconds=10)
+    quiet._closed_through = quiet._bucket(start) - 1
+    quiet.ready = True
+    for i in range(20):
+        quiet.add_posts([post("AAPL", "positive", start + i * bucket + timedelta(seconds=30)) for _ in range(10)])
+        bus.heartbeat()
+        assert quiet.tick(now=start + (i + 1) * bucket) == []
+    baseline = quiet._series[("aapl", "reddit")].baselines["volume"]
+    observed = (baseline.count, baseline.mean)
+    bus.fed_at = time.monotonic() - 60
+    assert not quiet.current
+    assert quiet.tick(now=start + 25 * bucket) == []
+    assert (baseline.count, baseline.mean) == observed
+    # Once fed again, the skipped buckets don't count against the next one
+    bus.heartbeat()
+    quiet.add_posts([post("AAPL", "positive", start + 25 * bucket + timedelta(seconds=30)) for _ in range(10)])
+    assert quiet.tick(now=start + 26 * bucket) == [] and baseline.count == observed[0] + 1
+
+    # Once started, signals are stored with database ids; two workers that
+    # detect the same signal store it once and share its id
+    import tempfile
+    import uuid
+    from services.anomaly_detector import query_signals, last_signal_id, save_signals
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'signals.sqlite')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        company_id = str(uuid.uuid4())
+        stored = [dict(signal, id=None, company_id=company_id) for signal in detector.signals(limit=1000, oldest_first=True)]
+        session = Session()
+        save_signals(session, stored)
+        replayed = [dict(signal, id=None, z=0.0) for signal in stored]
+        save_signals(session, replayed)
+        assert [s["id"] for s in replayed] == [s["id"] for s in stored] == list(range(1, len(stored) + 1))
+        assert last_signal_id(session) == len(stored)
+        first = query_signals(session, since_id=0, limit=2, oldest_first=True)
+        rest = query_signals(session, since_id=first[-1]["id"], limit=1000, oldest_first=True)
+        assert [s["id"] for s in first + rest] == [s["id"] for s in stored]
+        assert rest[-1]["z"] == stored[-1]["z"] and rest[-1]["bucket_start"] == stored[-1]["bucket_start"]
+        assert query_signals(session, tickers=["MSFT"], kinds=["shift"])[0]["id"] == max(
+            s["id"] for s in stored if s["ticker"] == "MSFT" and s["kind"] == "shift")
+        session.close()
+        engine.dispose()
+
+    print("✅ Anomaly Detector test passed!")
+
+def test_alert_engine():
+    """Test indexed alert rules and webhook delivery against a local receiver"""
+    print("Testing Alert Engine...")
+
+    import json
+    import tempfile
+    import threading
+    import uuid
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received = []
+    # Status codes to answer with, in order; 200 once exhausted
+    responses = [500]
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            status = responses.pop(0) if responses else 200
+            received.append((status, self.headers['X-Alert-Delivery-Id'], int(self.headers['X-Alert-Attempt']), body))
+            self.send_response(status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+
+    db_dir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{db_dir}/alerts.db", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    # Internal targets are refused unless allowlisted, at creation and at send time
+    for internal in ("http://127.0.0.1/hook", "http://localhost:8080/hook", "http://169.254.169.254/latest/meta-data",
+                     "http://10.1.2.3/hook", "http://[::ffff:192.168.0.1]/hook", "ftp://example.com/hook"):
+        try:
+            WebhookDispatcher().check_url(internal)
+            assert False, f"{internal} accepted"
+        except ValueError:
+            pass
+    try:
+        WebhookDispatcher(allowed_hosts=["hooks.example.com"]).check_url("https://example.org/hook")
+        assert False, "host outside the allowlist accepted"
+    except ValueError:
+        pass
+    WebhookDispatcher(allowed_hosts=["example.com"]).check_url("https://hooks.example.com/hook")
+    unguarded = WebhookDispatcher(workers=1)
+    unguarded.start()
+    unguarded.enqueue("internal", uuid.uuid4(), url, {})
+    assert unguarded.drain(timeout=10)
+    assert unguarded.stats["failed"] == 1 and received == []
+    unguarded.stop()
+
+    dispatcher = WebhookDispatcher(session_factory=Session, workers=2, max_attempts=3, backoff_seconds=0.01,
+                                   allowed_hosts=["127.0.0.1"])
+    dispatcher.start()
+    windows = SlidingWindowAggregator()
+    windows.ready = True
+    alert_engine = AlertEngine(dispatcher, window_aggregator=windows)
+
+    # Many rules for other companies must not be checked against these posts
+    rules = [AlertRule(uuid.uuid4(), f"rule {i}", url, {"type": "post", "field": "engagement", "op": ">", "value": 0},
+                       ticker=f"T{i}") for i in range(20000)]
+    aerospace = AlertRule(uuid.uuid4(), "aerospace buzz", url,
+                          {"type": "post", "field": "engagement", "op": ">", "value": 5000}, industry="Aerospace")
+    nvda = AlertRule(uuid.uuid4(), "NVDA turns negative", url,
+                     {"type": "window", "metric": "negative_share", "window": "1h", "op": ">", "value": 0.6, "min_posts": 5},
+                     ticker="NVDA")
+    alert_engine.set_rules(rules + [aerospace, nvda])
+
+    def post(ticker, industry, sentiment, engagement=10):
+        return {"id": str(uuid.uuid4()), "company_id": ticker.lower(), "company": {"ticker": ticker}, "industry": industry,
+                "source": "reddit", "sentiment": sentiment, "confidence": 80.0, "engagement": engagement,
+                "timestamp": datetime.utcnow().isoformat()}
+
+    viral = post("BA", "aerospace", "positive", engagement=6000)
+    batch = [viral, post("BA", "aerospace", "positive", engagement=100)] + [post("NVDA", "technology", "negative") for _ in range(4)]
+    windows.add_posts(batch)
+    alert_engine.add_posts(batch)
+    # Below min_posts the window rule doesn't fire; the fifth post crosses it
+    assert alert_engine.stats["fired"] == 1
+    more = [post("NVDA", "technology", "negative")]
+    windows.add_posts(more)
+    alert_engine.add_posts(more)
+    assert alert_engine.stats["fired"] == 2
+    assert alert_engine.stats["evaluated"] < 20
+
+    # Still negative: no new alert until the condition clears
+    windows.add_posts(more)
+    alert_engine.add_posts(more)
+    assert alert_engine.stats["fired"] == 2
+
+    # Clearing and turning negative again within the cooldown stays quiet
+    for sentiment, count in (("positive", 10), ("negative", 20)):
+        flip = [post("NVDA", "technology", sentiment) for _ in range(count)]
+        windows.add_posts(flip)
+        alert_engine.add_posts(flip)
+    assert alert_engine.stats["fired"] == 2
+
+    # Replayed posts are deduplicated
+    alert_engine.add_posts([viral])
+    assert dispatcher.stats["duplicates"] == 1
+
+    assert dispatcher.drain(timeout=10)
+    delivered = [r for r in received if r[0] == 200]
+    assert len(delivered) == 2
+    # The first delivery failed with a 500 and was retried
+    assert received[0][0] == 500 and any(r[1] == received[0][1] and r[2] == 2 for r in delivered)
+    bodies = {r[3]["rule"]["name"]: r[3] for r in delivered}
+    assert bodies["aerospace buzz"]["post"]["id"] == viral["id"]
+    assert bodies["NVDA turns negative"]["value"] == 1.0
+
+    # Another process firing the same alert finds it already claimed
+    other = WebhookDispatcher(session_factory=Session, workers=1, allowed_hosts=["127.0.0.1"])
+    other.start()
+    assert other.enqueue(f"{aerospace.id}:{viral['id']}", aerospace.id, url, {})
+    assert other.drain(timeout=10)
+    assert other.stats["duplicates"] == 1 and len(received) == 3
+
+    session = Session()
+    statuses = [(d.status, d.attempts) for d in session.query(AlertDeliveryModel).all()]
+    session.close()
+    assert sorted(statuses) == [("delivered", 1), ("delivered", 2)]
+
+    # Client errors aren't retried
+    responses.append(404)
+    dispatcher.enqueue("gone", nvda.id, url, {})
+    assert dispatcher.drain(timeout=10)
+    assert dispatcher.stats["failed"] == 1 and len(received) == 4
+
+    # A window rule's cooldown runs from its last firing, in whichever process,
+    # so crossing a clock-hour boundary doesn't let it fire again
+    rule_id = uuid.uuid4()
+    boundary = datetime(2026, 1, 1, 10, 59, 59)
+    dispatcher.enqueue("w1", rule_id, url, {}, cooldown=("NVDA", 3600), fired_at=boundary)
+    assert dispatcher.drain(timeout=10)
+    other.enqueue("w2", rule_id, url, {}, cooldown=("NVDA", 3600), fired_at=boundary + timedelta(seconds=1))
+    assert other.drain(timeout=10)
+    assert len(received) == 5 and other.stats["duplicates"] == 2
+    other.enqueue("w3", rule_id, url, {}, cooldown=("NVDA", 3600), fired_at=boundary + timedelta(hours=1))
+    assert other.drain(timeout=10)
+    assert len(received) == 6
+
+    # Retention prunes old deliveries
+    session = Session()
+    assert prune_alert_deliveries(session, datetime.utcnow() + timedelta(seconds=1)) == 5
+    session.commit()
+    assert session.query(AlertDeliveryModel).count() == 0
+    session.close()
+
+    dispatcher.stop()
+    other.stop()
+    server.shutdown()
+    print("✅ Alert Engine test passed!")
+
+def test_sketches():
+    """Test mergeable percentile and unique-author sketches"""
+    print("Testing Sketches...")
+
+    import numpy as np
+    rng = np.random.default_rng(7)
+
+    # Quantiles stay within the relative accuracy, however the values are split
+    values = rng.lognormal(mean=3, sigma=2, size=20000)
+    whole, first, second = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (first if i % 2 else second).add(value)
+    first.merge(second)
+    assert first.bins == whole.bins
+    restored = DDSketch.from_bytes(whole.to_bytes())
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method='lower')
+        assert abs(restored.quantile(q) - exact) <= 0.011 * exact
+    zeros = DDSketch()
+    for value in (0, 0, 0, 5):
+        zeros.add(value)
+    assert zeros.quantile(0.5) == 0.0 and DDSketch().quantile(0.5) is None
+
+    # Distinct counts are within a few standard errors, and merging dedups
+    authors_a, authors_b = HyperLogLog(), HyperLogLog()
+    for i in range(10000):
+        authors_a.add(f"reddit:user{i}")
+        authors_b.add(f"reddit:user{i + 5000}")
+    authors_a.merge(authors_b)
+    assert abs(authors_a.count() - 15000) < 15000 * 4 * authors_a.standard_error
+    small = HyperLogLog()
+    for name in ("a", "b", "c", "a"):
+        small.add(name)
+    assert small.count() == 3
+    assert len(small.to_bytes()) < 32
+    assert HyperLogLog.from_bytes(authors_a.to_bytes()).count() == authors_a.count()
+
+    # Hourly rows merge into any window
+    session, company = create_test_session()
+    now = datetime.utcnow()
+    posts = [
+        {"company_id": company.id, "source": "reddit", "author": f"user{i % 40}", "confidence": 50.0 + i % 50,
+         "engagement": i, "timestamp": now - timedelta(hours=i % 5, minutes=1)}
+        for i in range(200)
+    ]
+    apply_posts_to_sketches(session, posts[:120])
+    apply_posts_to_sketches(session, posts[120:])
+    session.commit()
+    summary = merge_sketches(session, company_ids=[company.id], since=now - timedelta(hours=6)).summary()
+    assert summary["post_count"] == 200 and summary["unique_authors"] == 40
+    assert abs(summary["engagement"]["p50"] - 99) <= 1.0
+    assert abs(summary["confidence"]["p90"] - 94) <= 0.95
+    recent = merge_sketches(session, since=now - timedelta(minutes=30), group_by_company=True)
+    assert 0 < recent[str(company.id)].confidence.count < 200
+
+    assert prune_sketches(session, now + timedelta(hours=2)) > 0
+    assert merge_sketches(session).confidence.count == 0
+
+    print("✅ Sketches test passed!")
+
+def test_trending():
+    """Test Count-Min / Space-Saving heavy hitters merged across ingest workers"""
+    print("Testing Trending...")
+
+    import numpy as np
+    rng = np.random.default_rng(11)
+    stream = [f"item{i}" for i in rng.zipf(1.3, size=20000) if i < 5000]
+    exact = {}
+    for item in stream:
+        exact[item] = exact.get(item, 0) + 1
+
+    # Neither structure undercounts, and every item above total / capacity is tracked
+    counts, top = CountMinSketch(), SpaceSaving(capacity=50)
+    for item in stream:
+        counts.add(item)
+        top.add(item)
+    assert all(counts.estimate(item) >= count for item, count in exact.items())
+    heavy = {item for item, count in exact.items() if count > len(stream) / 50}
+    assert heavy <= set(top.counts)
+    assert all(count >= exact[item] for item, count, _ in top.top(10))
+    restored = CountMinSketch.from_bytes(counts.to_bytes())
+    assert restored.estimate("item1") == counts.estimate("item1")
+    assert SpaceSaving.from_json(top.to_json()).top(5) == top.top(5)
+
+    items = extract_items({"content": "Buying $nvda and $AAPL today, NVIDIA earnings look strong https://x.co/abc",
+                           "source": "reddit", "author": "trader1"})
+    assert items["cashtags"] == ["AAPL", "NVDA"]
+    assert items["authors"] == ["reddit:trader1"]
+    assert "earnings" in items["terms"] and "today" not in items["terms"] and "nvda" not in items["terms"]
+
+    # Two ingest workers count disjoint posts; readers merge their rows
+    session, company = create_test_session()
+    now = datetime.utcnow()
+
+    def post(content, author, minutes_ago):
+        return {"content": content, "source": "stocktwits", "author": author, "timestamp": now - timedelta(minutes=minutes_ago)}
+
+    apply_posts_to_trending(session, [post("$NVDA earnings beat", f"a{i}", 1) for i in range(30)], worker="w1")
+    apply_posts_to_trending(session, [post("$NVDA guidance raised", f"b{i}", 2) for i in range(20)]
+                            + [post("$TSLA deliveries", "b0", 300) for _ in range(40)], worker="w2")
+    apply_posts_to_trending(session, [post("$NVDA earnings", "a0", 2)], worker="w1")
+    apply_posts_to_trending(session, [post("$OLD stale", "z", 60 * 30)], worker="w1")
+    session.commit()
+
+    tracker = TrendingTracker()
+    assert tracker.get('1h') is None
+    tracker.refresh(session)
+    hour = tracker.get('1h')
+    assert hour["cashtags"]["posts"] == 51
+    assert hour["cashtags"]["items"][0] == {**hour["cashtags"]["items"][0], "item": "NVDA", "count": 51}
+    assert hour["cashtags"]["items"][0]["lift"] > 1
+    assert hour["authors"]["items"][0] == {**hour["authors"]["items"][0], "item": "stocktwits:a0", "count": 2}
+    assert hour["terms"]["items"][0]["item"] == "earnings"
+    day = tracker.get('24h')
+    assert [entry["item"] for entry in day["cashtags"]["items"][:2]] == ["NVDA", "TSLA"]
+    assert "OLD" not in [entry["item"] for entry in day["cashtags"]["items"]]
+
+    assert prune_trending(session, now + timedelta(hours=1)) > 0
+    tracker.refresh(session)
+    assert tracker.get('24h')["cashtags"]["items"] == []
+
+    # The data access layer counts and prunes trending like the collector
+    from models.models import TrendingSketchModel
+    store = SentimentPost('sqlite://')
+    industry = IndustryModel(name="Technology")
+    store.session.add(industry)
+    store.session.commit()
+    apple = CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=industry.id)
+    store.session.add(apple)
+    store.session.commit()
+    store.create_post(str(apple.id), "Buying $AAPL into earnings", "positive", 80.0, "reddit", "trader1", 3,
+                      timestamp=now - timedelta(days=3))
+    assert store.session.query(TrendingSketchModel).count() == 0  # older than the 24h window
+    store.create_post(str(apple.id), "Buying $AAPL into earnings", "positive", 80.0, "reddit", "trader1", 3)
+    assert store.session.query(TrendingSketchModel).count() > 0
+    store.session.query(TrendingSketchModel).update({"slice_start": now - timedelta(days=2)})
+    store.delete_old_posts(days_old=1)
+    assert store.session.query(TrendingSketchModel).count() == 0
+
+    print("✅ Trending test passed!")
+
+def test_live_stream():
+    """Test live-stream filtering, slow-client eviction and the subscriber limits"""
+    print("Testing Live Stream...")
+    from services.live_stream import LiveStreamBroadcaster
+
+    aggregate_calls = []
+
+    def load_aggregates(company_ids):
+        aggregate_calls.append(company_ids)
+        return [{"ticker": "AAPL", "industry": "Technology", "company_id": "aapl"},
+                {"ticker": "XOM", "industry": "Energy", "company_id": "xom"}]
+
+    broadcaster = LiveStreamBroadcaster(buffer_size=3, max_subscribers=3, aggregate_loader=load_aggregates)
+    tech = broadcaster.subscribe(industries=["technology"], sentiments=["negative"])
+    energy = broadcaster.subscribe(tickers=["xom"])
+
+    def post(post_id, ticker, industry, sentiment):
+        return {"id": post_id, "company_id": ticker.lower(), "company": {"ticker": ticker},
+                "industry": industry, "source": "reddit", "sentiment": sentiment}
+
+    # Each client only gets its matching posts, then one aggregates event per batch
+    broadcaster.publish_posts([post("1", "AAPL", "technology", "negative"),
+                               post("2", "AAPL", "technology", "positive"),
+                               post("3", "XOM", "energy", "negative")])
+    assert aggregate_calls == [["aapl", "xom"]]
+    tech_messages = [tech.queue.get_nowait() for _ in range(tech.queue.qsize())]
+    assert len(tech_messages) == 2
+    assert tech_messages[0].startswith("id: 1\nevent: post\n")
+    assert tech_messages[1].startswith("event: aggregates\n") and '"XOM"' not in tech_messages[1]
+    energy_messages = [energy.queue.get_nowait() for _ in range(energy.queue.qsize())]
+    assert [m.split("\n")[0] for m in energy_messages] == ["id: 3", "event: aggregates"]
+
+    # A client that stops reading is evicted once its buffer fills; the others keep streaming
+    broadcaster.publish_posts([post(str(i), "XOM", "energy", "negative") for i in range(4, 8)])
+    assert energy.evicted and broadcaster.evicted_count == 1
+    assert broadcaster.subscriber_count == 1
+    assert not tech.evicted and tech.queue.get_nowait().startswith("event: aggregates\n")
+
+    # The subscriber limit, and a lower per-call limit for blocking workers
+    assert broadcaster.subscribe(limit=1) is None
+    assert broadcaster.subscribe() is not None and broadcaster.subscribe() is not None
+    assert broadcaster.subscribe() is None
+
+    # Flask's test server isn't multithreaded, so by default it refuses to pin a worker to a stream
+    app = create_test_app()
+    response = app.test_client().get('/stream/posts')
+    assert response.status_code == 503 and response.headers['Retry-After'] == '30'
+
+    print("✅ Live Stream test passed!")
+
+def test_ingest_changes():
+    """Test the /posts/changes feed and the tailer against interleaved writers"""
+    print("Testing Ingest Changes...")
+    import tempfile
+    import threading
+    import time
+    from models.models import init_db, lock_ingest
+    create_test_app()  # routes.posts needs the test database configured
+    from routes.posts import post_changes
+    from services.ingest_bus import IngestBus
+    from services.post_query_service import decode_ingest_cursor, encode_ingest_cursor
+    from tasks.ingest_tailer import IngestTailer
+    from werkzeug.datastructures import MultiDict
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'changes.sqlite')}",
+                               connect_args={'check_same_thread': False, 'timeout': 10})
+        init_db(engine)
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        industry = IndustryModel(name="Technology")
+        session.add(industry)
+        session.commit()
+        company = CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=industry.id)
+        session.add(company)
+        session.commit()
+        company_id = company.id
+
+        def new_post(content, source="reddit"):
+            return SentimentPostModel(company_id=company_id, content=content, sentiment="positive", confidence=80.0,
+                                      source=source, author="test_user", engagement=1, timestamp=datetime.utcnow())
+
+        session.add_all([new_post("first"), new_post("second", source="news"), new_post("third")])
+        session.commit()
+
+        # Paging forward from the start returns every post once, oldest first
+        def drain(since, **filters):
+            rows = []
+            while True:
+                page = post_changes(session, MultiDict({'since': since, 'limit': '2', **filters}))
+                rows += page["rows"]
+                since = page["next_cursor"]
+                if not page["has_more"]:
+                    return rows, since
+
+        fields = post_changes(session, MultiDict())["fields"]
+        content = lambda rows: [row[fields.index('content')] for row in rows]
+        rows, cursor = drain(encode_ingest_cursor(0))
+        assert content(rows) == ["first", "second", "third"]
+        assert content(drain(encode_ingest_cursor(0), sources="news")[0]) == ["second"]
+        assert post_changes(session, MultiDict({'since': cursor}))["rows"] == []
+        try:
+            post_changes(session, MultiDict({'since': 'not-a-cursor'}))
+            assert False, "tampered cursor accepted"
+        except ValueError:
+            pass
+
+        bus = IngestBus()
+        published = []
+        bus.subscribe(published.extend)
+        tailer = IngestTailer(Session, bus=bus)
+        tailer.poll_once()
+
+        # Writer A holds an uncommitted post; writer B must queue behind it,
+        # so B's post can never become visible while A's is still in flight
+        writer_a = Session()
+        lock_ingest(writer_a)
+        writer_a.add(new_post("from A"))
+        writer_a.flush()
+
+        def write_b():
+            writer_b = Session()
+            lock_ingest(writer_b)
+            writer_b.add(new_post("from B"))
+            writer_b.commit()
+            writer_b.close()
+
+        thread = threading.Thread(target=write_b)
+        thread.start()
+        time.sleep(0.3)
+        assert thread.is_alive()
+        page = post_changes(session, MultiDict({'since': cursor}))
+        assert page["rows"] == [] and decode_ingest_cursor(page["next_cursor"]) == decode_ingest_cursor(cursor)
+        assert tailer.poll_once() == 0
+
+        writer_a.commit()
+        writer_a.close()
+        thread.join(10)
+        assert content(drain(cursor)[0]) == ["from A", "from B"]
+        assert tailer.poll_once() == 2
+        assert [post["content"] for post in published] == ["from A", "from B"]
+
+        session.close()
+        engine.dispose()
+
+    print("✅ Ingest Changes test passed!")
+
+def test_search():
+    """Test the FTS5 search path on SQLite and the tsvector/ILIKE SQL on PostgreSQL"""
+    print("Testing Search...")
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from models.models import init_db
+    from services import search_service
+    from services.search_service import search_filter, search_rank_order
+
+    engine = create_engine('sqlite://')
+    init_db(engine)
+    session = sessionmaker(bind=engine)()
+    industry = IndustryModel(name="Technology")
+    session.add(industry)
+    session.commit()
+    company = CompanyModel(ticker="AAPL", name="Apple Inc.", industry_id=industry.id)
+    session.add(company)
+    session.commit()
+    contents = ["Apple earnings beat estimates", "earnings earnings earnings season", "New iPhone launch",
+                'Quote "marks" and 100% gains', "AI chips rally"]
+    posts = [SentimentPostModel(company_id=company.id, content=content, sentiment="positive", confidence=80.0,
+                                source="reddit", author="test_user", engagement=1, timestamp=datetime.utcnow())
+             for content in contents]
+    session.add_all(posts)
+    session.commit()
+
+    def search(query, ranked=False):
+        stmt = select(SentimentPostModel.content).where(search_filter(query, 'sqlite'))
+        if ranked:
+            stmt = stmt.order_by(*search_rank_order(query, 'sqlite'))
+        return [row[0] for row in session.execute(stmt)]
+
+    # Trigram matches are case-insensitive substrings, like the ILIKE they replace
+    assert sorted(search("EARNINGS")) == sorted(contents[:2])
+    assert search("phon") == ["New iPhone launch"]
+    # Relevance puts the post that repeats the term first
+    assert search("earnings", ranked=True)[0] == "earnings earnings earnings season"
+    # Quotes and LIKE wildcards are matched literally, not as query syntax
+    assert search('"marks"') == [contents[3]]
+    assert search("100%") == [contents[3]] and search("0%") == [contents[3]]
+    # Queries too short for a trigram fall back to a substring match
+    assert sorted(search("AI")) == ["AI chips rally", contents[3]] and search_rank_order("AI", 'sqlite') == []
+    # The triggers keep the index in sync with updates and deletes
+    posts[2].content = "Vision headset launch"
+    session.delete(posts[4])
+    session.commit()
+    assert search("iPhone") == [] and search("headset") == ["Vision headset launch"] and search("chips") == []
+    session.close()
+
+    # PostgreSQL uses the tsvector column once migrated, and plain ILIKE before
+    def postgres_sql(clause):
+        return str(clause.compile(dialect=postgresql.dialect()))
+    try:
+        search_service.set_search_vector_available(True)
+        sql = postgres_sql(search_filter("rate cut", 'postgresql'))
+        assert "search_vector @@ websearch_to_tsquery" in sql and "ILIKE" in sql
+        assert "ts_rank_cd" in postgres_sql(search_rank_order("rate cut", 'postgresql')[0])
+        search_service.set_search_vector_available(False)
+        sql = postgres_sql(search_filter("rate cut", 'postgresql'))
+        assert "search_vector" not in sql and "ILIKE" in sql
+        assert search_rank_order("rate cut", 'postgresql') == []
+    finally:
+        search_service.set_search_vector_available(False)
+
+    print("✅ Search test passed!")
+
+def test_export():
+    """Test streamed NDJSON/CSV exports, gzip negotiation and admission slot release"""
+    print("Testing Export...")
+    import csv
+    import gzip
+    import io
+    import json
+    app = create_test_app()
+    from routes.posts import Session, admission
+    from services import export_service
+
+    session = Session()
+    industry = session.query(IndustryModel).filter_by(name="Technology").one()
+    company = CompanyModel(ticker="EXPT", name="Export Test Corp", industry_id=industry.id)
+    session.add(company)
+    session.commit()
+    now = datetime.utcnow()
+    session.add_all([SentimentPostModel(company_id=company.id, content=f'export, "post" {i}', sentiment="neutral",
+                                        confidence=70.0, source="news", author="test_user", engagement=i,
+                                        timestamp=now - timedelta(minutes=i)) for i in range(25)])
+    session.commit()
+    session.close()
+    client = app.test_client()
+
+    def free_export_slots():
+        semaphore = admission.classes['export'].semaphore
+        taken = 0
+        while semaphore.acquire(blocking=False):
+            taken += 1
+        for _ in range(taken):
+            semaphore.release()
+        return taken
+
+    slots = free_export_slots()
+
+    # NDJSON is written in chunks as rows arrive, newest first
+    chunk_bytes = export_service._CHUNK_BYTES
+    export_service._CHUNK_BYTES = 512
+    try:
+        response = client.get('/export/posts', query_string={'ticker': 'expt'}, buffered=False)
+        assert response.status_code == 200 and response.is_streamed
+        assert response.mimetype == 'application/x-ndjson' and 'Content-Encoding' not in response.headers
+        assert free_export_slots() == slots - 1  # held while the body streams
+        chunks = list(response.response)
+        response.close()
+    finally:
+        export_service._CHUNK_BYTES = chunk_bytes
+    assert len(chunks) > 1
+    rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+    assert [row["engagement"] for row in rows] == list(range(25))
+    assert set(rows[0]) == set(export_service.EXPORT_FIELDS) and rows[0]["ticker"] == "EXPT"
+    assert free_export_slots() == slots
+
+    # CSV with gzip, when the client accepts it
+    response = client.get('/export/posts', query_string={'ticker': 'EXPT', 'format': 'csv', 'sentiments': 'neutral'},
+                          headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip' and response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Content-Disposition'].endswith('.csv"')
+    table = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode('utf-8'))))
+    assert table[0] == list(export_service.EXPORT_FIELDS) and len(table) == 26
+    assert table[1][export_service.EXPORT_FIELDS.index('content')] == 'export, "post" 0'
+    response.close()  # the server's close, which runs call_on_close
+
+    # A client that disconnects without reading the body still gives its slot back
+    response = client.get('/export/posts', query_string={'ticker': 'EXPT'}, buffered=False)
+    assert free_export_slots() == slots - 1
+    response.close()
+    assert free_export_slots() == slots
+
+    # A failure mid-stream aborts the body instead of ending it cleanly, for gzip too,
+    # and still gives the slot back
+    import routes.export as export_routes
+    def failing_rows(session, stmt, batch_size):
+        for i, row in enumerate(stream_rows(session, stmt, batch_size=batch_size)):
+            if i == 10:
+                raise RuntimeError("connection lost")
+            yield row
+    stream_rows = export_routes.stream_rows
+    export_routes.stream_rows = failing_rows
+    export_service._CHUNK_BYTES = 512  # so the headers and a first chunk go out before the failure
+    try:
+        for headers in ({}, {'Accept-Encoding': 'gzip'}):
+            response = client.get('/export/posts', query_string={'ticker': 'EXPT'}, headers=headers, buffered=False)
+            assert response.status_code == 200
+            received = []
+            try:
+                for chunk in response.response:
+                    received.append(chunk)
+                assert False, "truncated export ended cleanly"
+            except RuntimeError:
+                pass
+            assert received
+            response.close()
+            assert free_export_slots() == slots
+    finally:
+        export_routes.stream_rows = stream_rows
+        export_service._CHUNK_BYTES = chunk_bytes
+
+    # Bad parameters answer 400 and don't leak the slot
+    assert client.get('/export/posts', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/export/posts', query_string={'hours_back': 'soon'}).status_code == 400
+    assert free_export_slots() == slots
+
+    print("✅ Export test passed!")
+
+def test_asgi():
+    """Test that the native ASGI routes match Flask and fall back to it when they should"""
+    print("Testing ASGI...")
+    flask_app = create_test_app()  # asgi builds its engines from the test database URL
+    from starlette.testclient import TestClient
+    from asgi import _wants_flask, create_asgi_app
+    from routes.posts import Session
+
+    session = Session()
+    company = session.query(CompanyModel).filter_by(ticker="AAPL").one()
+    now = datetime.utcnow()
+    session.add_all([SentimentPostModel(company_id=company.id, content=f"asgi post {i}", sentiment=sentiment,
+                                        confidence=75.0, source="reddit", author="test_user", engagement=i,
+                                        timestamp=now - timedelta(minutes=i))
+                     for i, sentiment in enumerate(["positive", "negative", "neutral", "positive"])])
+    session.commit()
+    session.close()
+
+    # The query string is parsed, not substring-matched
+    def wants_flask(query, accept=None):
+        headers = [(b'accept', accept)] if accept else []
+        return _wants_flask({'type': 'http', 'query_string': query, 'headers': headers})
+
+    assert wants_flask(b'fields=id,content') and wants_flask(b'limit=5&format=msgpack')
+    assert wants_flask(b'%66ields=id') and wants_flask(b'format=csv&format=json')
+    assert not wants_flask(b'') and not wants_flask(b'format=json') and not wants_flask(b'fields=&format=')
+    assert not wants_flask(b'search=fields%3Did') and not wants_flask(b'prefields=id&sources=reformat%3Dx')
+    assert wants_flask(b'', accept=b'application/x-msgpack') and not wants_flask(b'', accept=b'application/json')
+
+    # Native responses match Flask's, status and body
+    asgi_client = TestClient(create_asgi_app(flask_app))
+    flask_client = flask_app.test_client()
+    for path in ('/posts?limit=3&tickers=AAPL', '/posts?limit=2&total=exact&search=fields%3Dx',
+                 '/posts?cursor=not-a-cursor', '/sentiment/market?hours_back=1', '/sentiment/company/AAPL',
+                 '/sentiment/company/NOPE', '/posts/changes?since=not-a-cursor'):
+        native, flask = asgi_client.get(path), flask_client.get(path)
+        assert native.status_code == flask.status_code, path
+        native_body, flask_body = native.json(), flask.get_json()
+        if isinstance(flask_body, dict):
+            # Read independently, so the ingest position may differ if something was ingested in between
+            native_body.pop("ingest_cursor", None)
+            flask_body.pop("ingest_cursor", None)
+        assert native_body == flask_body, path
+
+    # Projections fall through to Flask, which moves companies into a map
+    projected = asgi_client.get('/posts', params={'fields': 'id,content', 'limit': '2'}).json()
+    assert set(projected) >= {"posts", "companies"} and set(projected["posts"][0]) == {"id", "content"}
+
+    print("✅ ASGI test passed!")
+
+def test_rollup_parity():
+    """Test that rollup-backed aggregates match aggregating the raw posts"""
+    print("Testing Rollup Parity...")
+    import random
+    from services.aggregation_service import aggregate_sentiment, posts_aggregate_query
+    from services.rollup_service import rollup_totals_query
+
+    session, company = create_test_session()
+    energy = IndustryModel(name="Energy")
+    session.add(energy)
+    session.commit()
+    other = CompanyModel(ticker="XOM", name="Exxon Mobil", industry_id=energy.id)
+    session.add(other)
+    session.commit()
+
+    # Four hours of posts at random seconds, plus posts exactly on hour and minute boundaries
+    rng = random.Random(7)
+    start = datetime(2024, 3, 1, 10, 0)
+    offsets = [timedelta(seconds=rng.randrange(4 * 3600)) for _ in range(300)]
+    offsets += [timedelta(hours=1), timedelta(hours=2, minutes=17), timedelta(hours=3, minutes=42) - timedelta(microseconds=1)]
+    posts = [SentimentPostModel(company_id=rng.choice([company.id, other.id]), content=f"post {i}",
+                                sentiment=rng.choice(["positive", "neutral", "negative"]),
+                                confidence=round(rng.uniform(50, 100), 2), source=rng.choice(["reddit", "news", "twitter"]),
+                                author="test_user", engagement=rng.choice([None, 0, 3, 40]), timestamp=start + offset)
+             for i, offset in enumerate(offsets)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+
+    sum_columns = [column.name for column in posts_aggregate_query().selected_columns]
+
+    def rows(stmt):
+        return {tuple(str(v) for k, v in row.items() if k not in sum_columns): row
+                for row in session.execute(stmt).mappings()}
+
+    def assert_same(rollup_stmt, raw_stmt):
+        rollup_rows, raw_rows = rows(rollup_stmt), rows(raw_stmt)
+        assert rollup_rows.keys() == raw_rows.keys()
+        for key, raw in raw_rows.items():
+            for column in sum_columns:
+                assert abs(float(rollup_rows[key][column]) - float(raw[column])) < 1e-6, (key, column)
+
+    post = SentimentPostModel
+    # Minute-aligned windows: ragged hours at both edges, whole hours, inside one hour, open-ended
+    windows = [(start + timedelta(minutes=17), start + timedelta(hours=3, minutes=42)),
+               (start + timedelta(hours=1), start + timedelta(hours=3)),
+               (start + timedelta(hours=2, minutes=5), start + timedelta(hours=2, minutes=50)),
+               (start + timedelta(hours=1, minutes=1), None),
+               (None, start + timedelta(hours=2, minutes=17))]
+    for since, until in windows:
+        raw = posts_aggregate_query(group_by=['source'])
+        if since:
+            raw = raw.where(post.timestamp >= since)
+        if until:
+            raw = raw.where(post.timestamp < until)
+        assert_same(rollup_totals_query(since=since, until=until, group_by=['source']), raw)
+        raw = posts_aggregate_query(company_ids=[other.id], sources=["news"])
+        if since:
+            raw = raw.where(post.timestamp >= since)
+        if until:
+            raw = raw.where(post.timestamp < until)
+        assert_same(rollup_totals_query(company_ids=[other.id], sources=["news"], since=since, until=until), raw)
+
+    # Grouped summaries over all retained data agree between the two paths
+    for group_by in (['company'], ['industry', 'source'], []):
+        exact = aggregate_sentiment(session, group_by=group_by, exact=True)
+        rolled = aggregate_sentiment(session, group_by=group_by)
+        assert len(exact) == len(rolled) > 0
+        key = lambda summary: tuple(str(summary.get(k)) for k in ('company_id', 'industry', 'source'))
+        for a, b in zip(sorted(exact, key=key), sorted(rolled, key=key)):
+            assert a.keys() == b.keys() and key(a) == key(b)
+            for field, value in a.items():
+                assert value == b[field] or abs(value - b[field]) < 1e-9, (field, value, b[field])
+
+    # A window starting mid-minute is minute-precise: rollups include the whole first minute
+    since = start + timedelta(hours=1, seconds=30)
+    early = SentimentPostModel(company_id=company.id, content="early", sentiment="positive", confidence=90.0,
+                               source="reddit", author="test_user", engagement=0, timestamp=since - timedelta(seconds=10))
+    session.add(early)
+    apply_posts_to_rollups(session, [early])
+    session.commit()
+    rolled = session.execute(rollup_totals_query(since=since)).mappings().one()
+    raw = session.execute(posts_aggregate_query().where(post.timestamp >= since)).mappings().one()
+    assert rolled['post_count'] - raw['post_count'] == sum(1 for p in posts + [early]
+                                                           if since.replace(second=0) <= p.timestamp < since)
+
+    session.close()
+    print("✅ Rollup Parity test passed!")
+
+def test_batch_company_sentiment():
+    """Test /sentiment/companies against the per-company endpoint"""
+    print("Testing Batch Company Sentiment...")
+    from sqlalchemy import event
+    app = create_test_app()
+    from routes.posts import Session, engine
+
+    session = Session()
+    industry = IndustryModel(name="Retail")
+    session.add(industry)
+    session.commit()
+    companies = [CompanyModel(ticker=ticker, name=f"{ticker} Inc.", industry_id=industry.id) for ticker in ("WMT", "COST", "TGT")]
+    session.add_all(companies)
+    session.commit()
+    now = datetime.utcnow()
+    # TGT has no posts; WMT has an old post outside a 2-hour window
+    plan = [("WMT", "positive", 1), ("WMT", "negative", 1), ("WMT", "positive", 5), ("COST", "negative", 1)]
+    by_ticker = {company.ticker: company for company in companies}
+    posts = [SentimentPostModel(company_id=by_ticker[ticker].id, content=f"{ticker} {i}", sentiment=sentiment,
+                                confidence=80.0, source="reddit" if i % 2 else "news", author="test_user", engagement=i,
+                                timestamp=now - timedelta(hours=hours))
+             for i, (ticker, sentiment, hours) in enumerate(plan)]
+    session.add_all(posts)
+    apply_posts_to_rollups(session, posts)
+    session.commit()
+    tgt_id = str(by_ticker["TGT"].id)
+    session.close()
+    client = app.test_client()
+
+    # One POST returns every company in the caller's order, with unknown tickers listed as missing
+    statements = []
+    count_statement = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        result = client.post('/sentiment/companies', json={"tickers": ["tgt", "WMT", "NOPE", "COST"], "weighting": "confidence"}).get_json()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    assert len(statements) == 2  # resolve the companies, then one grouped aggregate
+    assert [company["ticker"] for company in result["companies"]] == ["TGT", "WMT", "COST"]
+    assert result["missing"] == ["NOPE"]
+    assert result["companies"][0] == {"company_id": tgt_id, "sentiment": None, "count": 0,
+                                      "ticker": "TGT", "name": "TGT Inc.", "industry": "retail"}
+
+    # Each entry matches the single-company endpoint under the same parameters
+    for query in ({}, {'hours_back': '2', 'weighting': 'engagement'}, {'sources': 'news', 'exact': 'true'}):
+        batch = client.get('/sentiment/companies', query_string={'industry': 'retail', **query}).get_json()
+        assert [company["ticker"] for company in batch["companies"]] == ["COST", "TGT", "WMT"]
+        for company in batch["companies"]:
+            single = client.get(f"/sentiment/company/{company['ticker']}", query_string=query).get_json()
+            for key in ("ticker", "name", "industry"):
+                company.pop(key)
+            single.pop("company_id", None)
+            company.pop("company_id")
+            assert company == single, (query, company, single)
+    wmt = client.get('/sentiment/companies', query_string={'tickers': 'WMT', 'hours_back': '2'}).get_json()["companies"][0]
+    assert wmt["count"] == 2 and wmt["sentiment"] == 0
+
+    # Rolling windows on request (source-filtered, so summed from the rollups this test wrote)
+    windowed = client.get('/sentiment/companies', query_string={'tickers': 'COST', 'windows': 'true', 'sources': 'reddit'}).get_json()
+    assert windowed["companies"][0]["windows"]["1h"]["count"] == 0 and windowed["companies"][0]["windows"]["24h"]["count"] == 1
+
+    assert client.get('/sentiment/companies').status_code == 400
+    assert client.post('/sentiment/companies', data="tickers=WMT").status_code == 400
+
+    # Admission reads "exact" from a POST body as well as the query string
+    from routes.posts import companies_class
+    for kwargs, expected in [({'method': 'POST', 'json': {"tickers": ["WMT"], "exact": True}}, 'heavy'),
+                             ({'method': 'POST', 'json': {"tickers": ["WMT"], "exact": "false"}}, 'standard'),
+                             ({'method': 'POST', 'query_string': {'exact': 'true'}, 'json': {"tickers": ["WMT"]}}, 'heavy'),
+                             ({'method': 'POST', 'data': "tickers=WMT"}, 'standard'),
+                             ({'query_string': {'tickers': 'WMT', 'exact': 'true'}}, 'heavy')]:
+        with app.test_request_context('/sentiment/companies', **kwargs):
+            assert companies_class() == expected, kwargs
+    assert client.get('/sentiment/companies', query_string={'tickers': 'NOPE'}).get_json() == {"companies": [], "missing": ["NOPE"]}
+
+    print("✅ Batch Company Sentiment test passed!")
+
 if __name__ == "__main__":
     print("🚀 Starting Backend Test Suite\n")
     print("=" * 50)
@@ -298,7 +2084,31 @@ if __name__ == "__main__":
         test_reddit_service,
         test_stocktwits_service,
         test_news_service,
-        test_database_model
+        test_database_model,
+        test_post_lists,
+        test_response_formats,
+        test_facets,
+        test_post_pagination,
+        test_sentiment_rollups,
+        test_sentiment_timeseries,
+        test_ingest_stats,
+        test_dashboard_snapshot,
+        test_single_flight,
+        test_admission_control,
+        test_hot_store,
+        test_sliding_windows,
+        test_sentiment_index,
+        test_anomaly_detector,
+        test_alert_engine,
+        test_sketches,
+        test_trending,
+        test_live_stream,
+        test_ingest_changes,
+        test_search,
+        test_export,
+        test_asgi,
+        test_rollup_parity,
+        test_batch_company_sentiment
     ]
     
     passed = 0
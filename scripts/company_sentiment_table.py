@@ -7,16 +7,24 @@ from config import Config
 print('| Industry | Ticker | Name | Sentiment | Count |')
 print('|---|---|---|---|---|')
 
+tickers = [company['ticker'] for companies in Config.COMPANIES.values() for company in companies]
+
+# One round trip for every company
+try:
+    r = requests.post('http://localhost:5001/sentiment/companies', json={"tickers": tickers})
+    results = {row['ticker']: row for row in r.json()['companies']}
+except Exception as e:
+    results = None
+
 for industry, companies in Config.COMPANIES.items():
     for company in companies:
         ticker = company['ticker']
         name = company['name']
-        try:
-            r = requests.get(f'http://localhost:5001/sentiment/company/{ticker}')
-            data = r.json()
-            sentiment = data.get('sentiment')
-            count = data.get('count')
-        except Exception as e:
+        if results is None:
             sentiment = 'ERR'
             count = 'ERR'
-        print(f'| {industry} | {ticker} | {name} | {sentiment} | {count} |') 
\ No newline at end of file
+        else:
+            data = results.get(ticker, {})
+            sentiment = data.get('sentiment')
+            count = data.get('count')
+        print(f'| {industry} | {ticker} | {name} | {sentiment} | {count} |')